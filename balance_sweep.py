@@ -0,0 +1,317 @@
+"""
+COMP 163 - Project 3: Quest Chronicles
+Balance Sweep Module
+
+Name: Vanessa Gray
+
+Command line tool that simulates battles over a grid of
+(class, level, enemy type, gear strength bonus) and reports win rates.
+
+Results are cached per grid cell. A cell's cache key includes a hash of the
+combat formulas and a hash of that cell's enemy stats, so changing one enemy
+only recomputes the cells that fight it.
+
+Usage:
+    python balance_sweep.py --classes Warrior Mage --levels 1-10 \
+        --enemies goblin orc dragon --gear 0 5 10 --sims 200 --csv report.csv
+"""
+
+import argparse
+import csv
+import hashlib
+import inspect
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import character_manager
+import combat_system
+import inventory_system
+
+# Default location of the per-cell result cache
+DEFAULT_CACHE_FILE = "data/sweep_cache.json"
+
+# Functions and classes whose source defines the combat outcome
+FORMULA_SOURCES = [
+    combat_system.calculate_damage,
+    combat_system.apply_damage,
+    combat_system.use_special_ability,
+    combat_system.warrior_power_strike,
+    combat_system.mage_fireball,
+    combat_system.rogue_critical_strike,
+    combat_system.cleric_heal,
+    combat_system.power_strike_damage,
+    combat_system.fireball_damage,
+    combat_system.critical_strike_damage,
+    combat_system.build_damage_table,
+    combat_system.auto_player_action,
+    combat_system.start_cooldown,
+    combat_system.is_ability_ready,
+    combat_system.new_cooldown_state,
+    combat_system.SimpleBattle,
+    inventory_system.get_effective_stats,
+    character_manager.create_character,
+    character_manager.gain_experience
+]
+
+# Columns of every report row, in order
+REPORT_FIELDS = ["class", "level", "enemy", "gear", "battles", "wins",
+                 "win_rate", "avg_turns", "avg_health_left"]
+
+# ============================================================================
+# CACHE KEYS
+# ============================================================================
+
+def get_formula_hash():
+    """
+    Hash everything that affects how a battle plays out, except enemy stats
+
+    Returns: Hex digest string
+    """
+    digest = hashlib.sha256()
+
+    for source in FORMULA_SOURCES + [build_character]: # build_character is defined below
+        digest.update(inspect.getsource(source).encode())
+
+    for character_class in sorted(combat_system.ABILITY_REGISTRY):
+        ability = combat_system.ABILITY_REGISTRY[character_class]
+        digest.update(f"{character_class}:{ability.name}:{ability.cooldown}:{ability.area}:"
+                      f"{ability.crits}".encode())
+        for function in (ability.effect, ability.damage): # Often lambdas at the registration
+            digest.update(get_function_source(function).encode())
+
+    return digest.hexdigest()
+
+def get_function_source(function):
+    """
+    Returns: Source text of a function ("" for None; its bytecode if the
+             source is not available, e.g. functions defined interactively)
+    """
+    if function is None:
+        return ""
+    try:
+        return inspect.getsource(function)
+    except (OSError, TypeError):
+        return function.__code__.co_code.hex()
+
+def get_enemy_hash(enemy_type):
+    """
+    Hash one enemy type's stats
+
+    Returns: Hex digest string
+    """
+    stats = json.dumps(combat_system.ENEMY_TYPES[enemy_type], sort_keys=True)
+    return hashlib.sha256(stats.encode()).hexdigest()
+
+def get_cell_key(formula_hash, enemy_hash, character_class, level, enemy_type, gear, simulations, seed):
+    """
+    Build the cache key for one grid cell
+
+    Returns: String key
+    """
+    parts = [formula_hash, enemy_hash, character_class, level, enemy_type, gear, simulations, seed]
+    return hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()
+
+def load_cache(cache_file):
+    """
+    Read cached cell results
+
+    Returns: Dictionary of {cell_key: report row}; empty if the file is missing or unreadable
+    """
+    if cache_file is None or not os.path.exists(cache_file):
+        return {}
+
+    try:
+        with open(cache_file, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache, cache_file):
+    """Write cached cell results"""
+    directory = os.path.dirname(cache_file)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    with open(cache_file, "w") as f:
+        json.dump(cache, f)
+
+# ============================================================================
+# SIMULATION
+# ============================================================================
+
+# Equipment slot holding a cell's gear strength bonus
+GEAR_SLOT = "weapon"
+
+def build_character(character_class, level, gear):
+    """
+    Create a character of a class, level it up, and equip a gear strength bonus
+
+    The bonus is equipped like a weapon, so it reaches battles through
+    get_effective_stats just as real gear does.
+
+    Returns: Character dictionary
+    """
+    character = character_manager.create_character(f"{character_class}{level}", character_class)
+
+    while character['level'] < level:
+        needed = character['level'] * 100 - character['experience']
+        character_manager.gain_experience(character, needed)
+
+    if gear:
+        inventory_system.get_equipment(character)[GEAR_SLOT] = f"gear_strength_{gear}"
+        character['equipment_effects'][GEAR_SLOT] = inventory_system.compile_item_effect(f"strength:{gear}")
+        inventory_system.gear_changed(character)
+    return character
+
+def simulate_cell(character_class, level, enemy_stats, gear, simulations, seed):
+    """
+    Run the battles for one grid cell
+
+    Args:
+        enemy_stats: Enemy dictionary to copy for every battle
+        simulations: Number of battles
+        seed: Seed of the first battle; battle i uses seed + i
+
+    Returns: Report row dictionary (without the 'enemy' column)
+    """
+    wins = 0
+    turns = 0
+    health_left = 0
+    null_log = combat_system.BattleLog(combat_system.NullSink())
+
+    for i in range(simulations):
+        character = build_character(character_class, level, gear)
+        enemy = dict(enemy_stats)
+
+        battle = combat_system.SimpleBattle(character, enemy, log=null_log, seed=seed + i,
+                                            action_provider=combat_system.auto_player_action)
+        result = battle.start_battle()
+
+        if result['winner'] == 'player':
+            wins += 1
+            health_left += character['health']
+        turns += battle.turn_counter + 1
+
+    return {
+        "class": character_class,
+        "level": level,
+        "gear": gear,
+        "battles": simulations,
+        "wins": wins,
+        "win_rate": round(wins / simulations, 4) if simulations else 0.0,
+        "avg_turns": round(turns / simulations, 2) if simulations else 0.0,
+        "avg_health_left": round(health_left / wins, 2) if wins else 0.0
+    }
+
+def run_sweep(classes, levels, enemy_types, gear_bonuses, simulations=100, seed=0,
+              workers=None, cache_file=DEFAULT_CACHE_FILE):
+    """
+    Simulate every cell of the grid, reusing cached cells that have not changed
+
+    Args:
+        workers: Worker processes (None = one per CPU, 1 = run in this process)
+        cache_file: JSON cache path, or None to disable caching
+
+    Returns: Tuple of (rows, stats) where rows is a list of report dictionaries
+             in grid order and stats is {'computed': int, 'cached': int}
+    Raises: InvalidTargetError if an enemy type is not recognized
+    """
+    formula_hash = get_formula_hash()
+    cache = load_cache(cache_file)
+
+    cells = []
+    for enemy_type in enemy_types:
+        combat_system.create_enemy(enemy_type) # Validate early
+        enemy_hash = get_enemy_hash(enemy_type)
+        for character_class in classes:
+            for level in levels:
+                for gear in gear_bonuses:
+                    key = get_cell_key(formula_hash, enemy_hash, character_class, level,
+                                       enemy_type, gear, simulations, seed)
+                    cells.append((key, character_class, level, enemy_type, gear))
+
+    missing = [cell for cell in cells if cell[0] not in cache]
+    jobs = [(character_class, level, combat_system.create_enemy(enemy_type), gear, simulations, seed)
+            for key, character_class, level, enemy_type, gear in missing]
+
+    if workers == 1 or len(jobs) <= 1:
+        rows = [simulate_cell(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = list(pool.map(simulate_cell, *zip(*jobs)))
+
+    for (key, character_class, level, enemy_type, gear), row in zip(missing, rows):
+        row["enemy"] = enemy_type
+        cache[key] = row
+
+    if cache_file is not None and missing:
+        save_cache(cache, cache_file)
+
+    report = [{field: cache[cell[0]][field] for field in REPORT_FIELDS} for cell in cells]
+    return report, {'computed': len(missing), 'cached': len(cells) - len(missing)}
+
+# ============================================================================
+# REPORTS
+# ============================================================================
+
+def write_csv_report(rows, filename):
+    """Write report rows to a CSV file"""
+    with open(filename, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def write_json_report(rows, filename):
+    """Write report rows to a JSON file"""
+    with open(filename, "w") as f:
+        json.dump(rows, f, indent=2)
+
+def parse_levels(text):
+    """
+    Parse a level list such as "1-5" or "1,3,6"
+
+    Returns: List of ints
+    """
+    levels = []
+    for part in text.split(","):
+        if "-" in part:
+            low, high = part.split("-", 1)
+            levels.extend(range(int(low), int(high) + 1))
+        else:
+            levels.append(int(part))
+    return levels
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Simulate win rates over a combat balance grid.")
+    parser.add_argument("--classes", nargs="+", default=["Warrior", "Mage", "Rogue", "Cleric"])
+    parser.add_argument("--levels", type=parse_levels, default=parse_levels("1-10"))
+    parser.add_argument("--enemies", nargs="+", default=sorted(combat_system.ENEMY_TYPES))
+    parser.add_argument("--gear", nargs="+", type=int, default=[0])
+    parser.add_argument("--sims", type=int, default=100, help="battles per cell")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache", default=DEFAULT_CACHE_FILE)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--csv", help="write the report as CSV")
+    parser.add_argument("--json", help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    rows, stats = run_sweep(args.classes, args.levels, args.enemies, args.gear,
+                            simulations=args.sims, seed=args.seed, workers=args.workers,
+                            cache_file=None if args.no_cache else args.cache)
+
+    if args.csv:
+        write_csv_report(rows, args.csv)
+    if args.json:
+        write_json_report(rows, args.json)
+    if not args.csv and not args.json:
+        for row in rows:
+            print(f"{row['class']:8} L{row['level']:<3} {row['enemy']:8} +{row['gear']:<3} "
+                  f"win {row['win_rate']:.1%}  turns {row['avg_turns']}")
+
+    print(f"{len(rows)} cells: {stats['computed']} computed, {stats['cached']} from cache")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+COMP 163 - Project 3: Quest Chronicles
+Battle Scheduler Module
+
+Name: Vanessa Gray
+
+Runs many SimpleBattles at once on an asyncio event loop.
+
+Each battle is a coroutine that waits for the player's actions on its own
+queue. If no action arrives before the turn timeout, the player makes a
+basic attack. Battles give up the event loop after every round so one busy
+battle cannot starve the others.
+"""
+
+import asyncio
+import time
+
+import combat_system
+from custom_exceptions import (
+    CombatError,
+    CombatNotActiveError
+)
+
+# Seconds a player has to choose an action before auto-attacking
+DEFAULT_TURN_TIMEOUT = 30.0
+
+# Action used when a turn times out
+TIMEOUT_ACTION = '1'
+
+VALID_ACTIONS = ('1', '2', '3')
+
+# ============================================================================
+# ASYNC BATTLE
+# ============================================================================
+
+class AsyncBattle:
+    """
+    A SimpleBattle driven by actions put on an asyncio queue
+    """
+
+    def __init__(self, battle_id, battle, turn_timeout=DEFAULT_TURN_TIMEOUT):
+        """
+        Args:
+            battle_id: Key the scheduler uses for this battle
+            battle: SimpleBattle to drive (its action_provider is replaced)
+            turn_timeout: Seconds to wait for each action
+        """
+        self.battle_id = battle_id
+        self.battle = battle
+        self.turn_timeout = turn_timeout
+        self.actions = asyncio.Queue()
+        self.result = None
+
+        self.pending_action = TIMEOUT_ACTION
+        battle.action_provider = self.take_pending_action
+
+    def take_pending_action(self, battle):
+        """Action provider for the wrapped SimpleBattle"""
+        return self.pending_action
+
+    def submit_action(self, action):
+        """Queue the player's next action ('1', '2' or '3')"""
+        self.actions.put_nowait(action)
+
+    async def wait_for_action(self):
+        """
+        Wait for the next valid action, ignoring invalid ones
+
+        Returns: Tuple of (action, timed_out)
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.turn_timeout
+
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return TIMEOUT_ACTION, True
+
+            try:
+                action = await asyncio.wait_for(self.actions.get(), remaining)
+            except asyncio.TimeoutError:
+                return TIMEOUT_ACTION, True
+
+            if action in VALID_ACTIONS:
+                return action, False
+
+    async def run(self, metrics):
+        """
+        Play the battle to the end
+
+        Args:
+            metrics: SchedulerMetrics updated after every turn
+
+        Returns: Battle results dictionary from SimpleBattle
+        Raises: CharacterDeadError if character is already dead
+        """
+        battle = self.battle
+        battle.begin_battle()
+
+        result = None
+        while battle.combat_active:
+            turn_started = time.perf_counter()
+            self.pending_action, timed_out = await self.wait_for_action()
+
+            result = battle.play_round()
+            metrics.record_turn(time.perf_counter() - turn_started, timed_out)
+
+            await asyncio.sleep(0) # Let every other battle take a turn
+
+        self.result = battle.finish_battle(result)
+        return self.result
+
+# ============================================================================
+# SCHEDULER
+# ============================================================================
+
+class SchedulerMetrics:
+    """Running totals for a BattleScheduler"""
+
+    def __init__(self):
+        self.active_battles = 0
+        self.completed_battles = 0
+        self.turns = 0
+        self.timeouts = 0
+        self.total_turn_latency = 0.0
+
+    def record_turn(self, latency, timed_out):
+        """Add one finished turn"""
+        self.turns += 1
+        self.total_turn_latency += latency
+        if timed_out:
+            self.timeouts += 1
+
+    def summary(self):
+        """
+        Returns: Dictionary with active_battles, completed_battles, turns,
+                 timeouts and average_turn_latency (seconds)
+        """
+        average = self.total_turn_latency / self.turns if self.turns else 0.0
+        return {
+            'active_battles': self.active_battles,
+            'completed_battles': self.completed_battles,
+            'turns': self.turns,
+            'timeouts': self.timeouts,
+            'average_turn_latency': average
+        }
+
+class BattleScheduler:
+    """
+    Runs many AsyncBattles concurrently on the current event loop
+    """
+
+    def __init__(self, turn_timeout=DEFAULT_TURN_TIMEOUT):
+        """
+        Args:
+            turn_timeout: Seconds each player gets per turn before auto-attacking
+        """
+        self.turn_timeout = turn_timeout
+        self.battles = {}
+        self.tasks = {}
+        self.results = {}
+        self.metrics = SchedulerMetrics()
+
+    def start_battle(self, battle_id, character, enemy, **battle_options):
+        """
+        Create a battle and schedule it on the running event loop
+
+        Args:
+            battle_id: Unique key for the battle
+            battle_options: Extra SimpleBattle arguments (log, seed, record, ...);
+                            log defaults to a NullSink log
+
+        Returns: The AsyncBattle
+        Raises: CombatError if battle_id is already running
+        """
+        if battle_id in self.battles:
+            raise CombatError(f"Battle '{battle_id}' is already running.")
+
+        if 'log' not in battle_options:
+            battle_options['log'] = combat_system.BattleLog(combat_system.NullSink())
+
+        battle = combat_system.SimpleBattle(character, enemy, **battle_options)
+        async_battle = AsyncBattle(battle_id, battle, self.turn_timeout)
+
+        self.battles[battle_id] = async_battle
+        self.metrics.active_battles += 1
+        self.tasks[battle_id] = asyncio.ensure_future(self.run_battle(async_battle))
+
+        return async_battle
+
+    async def run_battle(self, async_battle):
+        """Run one battle and move it from active to completed"""
+        try:
+            result = await async_battle.run(self.metrics)
+            self.results[async_battle.battle_id] = result
+            return result
+        finally:
+            self.metrics.active_battles -= 1
+            self.metrics.completed_battles += 1
+            del self.battles[async_battle.battle_id]
+
+    def submit_action(self, battle_id, action):
+        """
+        Queue a player action for a running battle
+
+        Raises: CombatNotActiveError if no battle with that id is running
+        """
+        if battle_id not in self.battles:
+            raise CombatNotActiveError(f"Battle '{battle_id}' is not active.")
+
+        self.battles[battle_id].submit_action(action)
+
+    async def wait_all(self):
+        """
+        Wait for every scheduled battle to finish
+
+        Returns: Dictionary of {battle_id: battle results}
+        """
+        if self.tasks:
+            await asyncio.gather(*self.tasks.values())
+        self.tasks = {}
+        return self.results
+
+    def get_metrics(self):
+        """
+        Returns: Metrics summary dictionary (see SchedulerMetrics.summary)
+        """
+        return self.metrics.summary()
+
+# ============================================================================
+# TESTING
+# ============================================================================
+
+if __name__ == "__main__":
+    print("=== BATTLE SCHEDULER TEST ===")
+
+    # import character_manager
+    #
+    # async def demo():
+    #     scheduler = BattleScheduler(turn_timeout=0.01)
+    #     for i in range(1000):
+    #         hero = character_manager.create_character(f"Hero{i}", "Warrior")
+    #         scheduler.start_battle(i, hero, combat_system.create_enemy("goblin"), seed=i)
+    #     await scheduler.wait_all()
+    #     print(scheduler.get_metrics())
+    #
+    # asyncio.run(demo())
@@ -0,0 +1,119 @@
+"""
+COMP 163 - Project 3: Quest Chronicles
+Combat Benchmark
+
+Times headless seeded battles (every class against every enemy type) so the
+combat hot loop can be compared before and after a change. Battle i always
+uses seed i, so every run does exactly the same work. --decisions times the
+default expectimax enemy AI instead (one search per decision).
+
+Usage:
+    python benchmarks/combat_benchmark.py [--battles 20000] [--repeat 5] [--profile] [--phases]
+    python benchmarks/combat_benchmark.py --decisions 10000 [--repeat 5]
+"""
+
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import character_manager
+import combat_profiler
+import combat_system
+
+CLASSES = ["Warrior", "Mage", "Rogue", "Cleric"]
+ENEMIES = ["goblin", "orc"]
+
+def run_battles(count, profiler=None):
+    """
+    Fight count seeded battles with the auto action policy
+    
+    Args:
+        profiler: Optional CombatProfiler passed to every battle
+
+    Returns: Number of player wins (used as a checksum between runs)
+    """
+    log = combat_system.BattleLog(combat_system.NullSink())
+    wins = 0
+
+    for i in range(count):
+        character = character_manager.create_character("Bench", CLASSES[i % len(CLASSES)])
+        enemy = combat_system.create_enemy(ENEMIES[i % len(ENEMIES)])
+
+        battle = combat_system.SimpleBattle(character, enemy, log=log, seed=i,
+                                            action_provider=combat_system.auto_player_action,
+                                            profiler=profiler)
+        if battle.start_battle()['winner'] == 'player':
+            wins += 1
+
+    return wins
+
+def run_decisions(count):
+    """
+    Make count expectimax decisions for a hurt orc facing a Rogue
+    
+    Returns: Number of heal decisions (used as a checksum between runs)
+    """
+    character = character_manager.create_character("Bench", "Rogue")
+    enemy = combat_system.create_enemy("orc")
+    enemy['health'] = enemy['max_health'] // 2
+    battle = combat_system.SimpleBattle(character, enemy, log=combat_system.BattleLog(combat_system.NullSink()),
+                                        seed=0)
+    search = combat_system.ExpectimaxAI()
+
+    heals = 0
+    for _ in range(count):
+        action, target = search.decide(battle, enemy, [character], combat_system.ENEMY_MAX_HEALS)
+        if action == "heal":
+            heals += 1
+    return heals
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark headless combat.")
+    parser.add_argument("--battles", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--profile", action="store_true", help="print the top functions by time")
+    parser.add_argument("--phases", action="store_true", help="print per-phase timings from CombatProfiler")
+    parser.add_argument("--decisions", type=int, default=0, help="time this many expectimax decisions")
+    args = parser.parse_args()
+
+    if args.decisions:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            heals = run_decisions(args.decisions)
+            timings.append(time.perf_counter() - start)
+
+        best = min(timings)
+        print(f"{args.decisions} expectimax decisions, {heals} heals")
+        print(f"best of {args.repeat}: {best:.3f}s ({args.decisions / best:,.0f} decisions/s)")
+        return
+
+    if args.phases:
+        profiler = combat_profiler.CombatProfiler()
+        run_battles(args.battles, profiler)
+        print(profiler.to_prometheus(), end="")
+        return
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.runcall(run_battles, args.battles)
+        pstats.Stats(profiler).sort_stats("tottime").print_stats(12)
+        return
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        wins = run_battles(args.battles)
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    print(f"{args.battles} battles, {wins} wins")
+    print(f"best of {args.repeat}: {best:.3f}s ({args.battles / best:,.0f} battles/s)")
+
+if __name__ == "__main__":
+    main()
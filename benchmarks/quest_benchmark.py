@@ -0,0 +1,99 @@
+"""
+COMP 163 - Project 3: Quest Chronicles
+Quest Benchmark
+
+Builds a synthetic quest dictionary (100,000 quests by default, each
+requiring a random earlier quest) and times building the quest index and
+get_quests_by_level range queries against the old full scan. The quests and
+queries come from a fixed seed, so every run does exactly the same work.
+
+Usage:
+    python benchmarks/quest_benchmark.py [--quests 100000] [--queries 1000] [--repeat 3]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import quest_handler
+
+MAX_LEVEL = 100
+
+def make_quests(count, seed=0):
+    """
+    Build a quest dictionary in the game_data.load_quests format
+
+    Returns: Dictionary of {quest_id: quest_data}
+    """
+    rng = random.Random(seed)
+    quests = {}
+
+    for i in range(count):
+        prerequisite = "NONE" if i < 50 or rng.random() < 0.05 else f"quest_{rng.randrange(i)}"
+        quests[f"quest_{i}"] = {
+            'quest_id': f"quest_{i}",
+            'title': f"Quest {i}",
+            'description': "Generated",
+            'reward_xp': rng.randint(10, 500),
+            'reward_gold': rng.randint(5, 250),
+            'required_level': rng.randint(1, MAX_LEVEL),
+            'prerequisite': prerequisite
+        }
+    return quests
+
+def scan_by_level(quest_data_dict, min_level, max_level):
+    """The original get_quests_by_level: check every quest"""
+    return [quest_data for quest_data in quest_data_dict.values()
+            if min_level <= quest_data['required_level'] <= max_level]
+
+def make_queries(count, seed=1):
+    """Returns: List of (min_level, max_level) pairs, half of them a single level"""
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        low = rng.randint(1, MAX_LEVEL)
+        queries.append((low, low if i % 2 else min(low + rng.randint(1, 5), MAX_LEVEL)))
+    return queries
+
+def run_queries(function, quests, queries):
+    """Returns: Total number of quests returned (used as a checksum)"""
+    return sum(len(function(quests, low, high)) for low, high in queries)
+
+def best_time(repeat, function, *args):
+    """Returns: (best seconds, result of the last call)"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the quest index.")
+    parser.add_argument("--quests", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    quests = make_quests(args.quests)
+    queries = make_queries(args.queries)
+
+    build, index = best_time(args.repeat, quest_handler.build_quest_index, quests)
+    print(f"{args.quests} quests: index built in {build:.3f}s (depth up to {max(index.depth.values())})")
+
+    indexed, indexed_total = best_time(args.repeat, run_queries, quest_handler.get_quests_by_level,
+                                       quests, queries)
+    scanned, scanned_total = best_time(args.repeat, run_queries, scan_by_level, quests, queries)
+    assert indexed_total == scanned_total, "index and scan disagree"
+
+    print(f"{args.queries} level queries ({indexed_total} quests returned)")
+    print(f"  indexed: {indexed:.4f}s ({args.queries / indexed:,.0f} queries/s)")
+    print(f"  scan:    {scanned:.4f}s ({args.queries / scanned:,.0f} queries/s)")
+    print(f"  speedup: {scanned / indexed:.1f}x")
+
+if __name__ == "__main__":
+    main()
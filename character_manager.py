@@ -10,11 +10,16 @@ This module handles character creation, loading, and saving.
 """
 
 import os
+
+from game_data import compile_item_effect, format_item_effect
+from inventory_system import Inventory, get_effective_stats, record_event
+from quest_handler import QuestSet, get_quest_set, get_quest_id_table
 from custom_exceptions import (
     InvalidCharacterClassError,
     CharacterNotFoundError,
     SaveFileCorruptedError,
     InvalidSaveDataError,
+    InvalidDataFormatError,
     CharacterDeadError
 )
 
@@ -94,8 +99,10 @@ def save_character(character, save_directory="data/save_games"):
     EXPERIENCE: 0
     GOLD: 100
     INVENTORY: item1,item2,item3
-    ACTIVE_QUESTS: quest1,quest2
-    COMPLETED_QUESTS: quest1,quest2
+    QUEST_IDS: first_steps,goblin_hunter (quest IDs by number, for remapping the sets)
+    ACTIVE_QUESTS: ~bitset.checksum (see quest_handler.QuestSet.to_code)
+    COMPLETED_QUESTS: ~bitset.checksum
+    QUEST_STATS: total_xp=250;total_gold=175;completed=3;bands=1-5:3;version=1a2b3c4d
     
     Returns: True if successful
     Raises: PermissionError, IOError (let them propagate or handle)
@@ -119,9 +126,14 @@ def save_character(character, save_directory="data/save_games"):
             f.write(f"MAGIC: {character['magic']}\n")
             f.write(f"EXPERIENCE: {character['experience']}\n")
             f.write(f"GOLD: {character['gold']}\n")
-            f.write(f"INVENTORY: {','.join(character['inventory'])}\n")
-            f.write(f"ACTIVE_QUESTS: {','.join(character['active_quests'])}\n")
-            f.write(f"COMPLETED_QUESTS: {','.join(character['completed_quests'])}\n")
+            f.write(f"INVENTORY: {','.join(character['inventory'])}\n") # Inventory iterates in list form
+            active = get_quest_set(character, 'active_quests')
+            completed = get_quest_set(character, 'completed_quests')
+            f.write(f"QUEST_IDS: {','.join(get_quest_id_table(active, completed))}\n")
+            f.write(f"ACTIVE_QUESTS: {active.to_code()}\n")
+            f.write(f"COMPLETED_QUESTS: {completed.to_code()}\n")
+            f.write(f"EQUIPMENT: {format_equipment(character)}\n")
+            f.write(f"QUEST_STATS: {format_quest_stats(character)}\n")
         return True 
     
 # Handle file errors
@@ -157,6 +169,8 @@ def load_character(character_name, save_directory="data/save_games"):
         raise SaveFileCorruptedError(f"Could not read save file for '{character_name}'.")
    
     character = {} # Parse lines into character dictionary
+    quest_codes = {} # Compact quest sets, decoded once QUEST_IDS has been read
+    saved_quest_ids = None
 
     for line in lines: # Parse each line
         if line.strip() == "":
@@ -178,14 +192,34 @@ def load_character(character_name, save_directory="data/save_games"):
                 value = int(value) # Convert to integer
             except ValueError:
                 raise InvalidSaveDataError(f"{key} must be an integer.")
+        elif key in ["active_quests", "completed_quests"] and value.startswith("~"):
+            quest_codes[key] = value # Compact quest bitset
+            continue
+        elif key == "quest_ids":
+            saved_quest_ids = value.split(",") if value else []
+            continue
         elif key in ["inventory", "active_quests", "completed_quests"]:
             if value == "": # Empty list case
                 value = [] # Set to empty list
             else:
                 value = value.split(",")    
+        elif key == "equipment":
+            parse_equipment(character, value) # Fills equipment and equipment_effects
+            continue
+        elif key == "quest_stats":
+            if value:
+                value = parse_quest_stats(value)
+            else:
+                continue # Worked out from the quest history when first needed
 
         character[key] = value # Add to character dictionary
 
+    for key, code in quest_codes.items():
+        try:
+            character[key] = QuestSet.from_code(code, saved_quest_ids)
+        except ValueError as e:
+            raise InvalidSaveDataError(f"{key}: {e}")
+
     # Validate loaded character data
     validate_character_data(character)
     
@@ -269,7 +303,8 @@ def gain_experience(character, xp_amount):
         character['max_health'] += 15
         character['strength'] += 4
         character['magic'] += 3
-        character['health'] = character['max_health']
+        character['stat_version'] = character.get('stat_version', 0) + 1 # Stats changed
+        character['health'] = get_effective_stats(character)['max_health']
         level_up_xp = character['level'] * 100
 
 # Return new level
@@ -289,6 +324,7 @@ def add_gold(character, amount):
     if new_gold < 0:
         raise ValueError("Not enough gold.")
     character['gold'] = new_gold # Update gold
+    record_event(character, "gold", gold_delta=amount)
     return character['gold']
 
 
@@ -300,12 +336,13 @@ def heal_character(character, amount):
     
     Returns: Actual amount healed
     """
-    # Calculate actual healing (don't exceed max_health)
+    # Calculate actual healing (don't exceed max_health, including gear bonuses)
     # Update character health
+    max_health = get_effective_stats(character)['max_health']
     before_heal = character['health'] + amount # Potential health after healing
-    if before_heal > character['max_health']: # Exceeds max health
-        current_healed = character['max_health'] - character['health'] # Actual healed amount
-        character['health'] = character['max_health'] # Set to max health
+    if before_heal > max_health: # Exceeds max health
+        current_healed = max_health - character['health'] # Actual healed amount
+        character['health'] = max_health # Set to max health
     else:
         current_healed = amount # Full amount healed
         character['health'] += amount # Update health
@@ -333,8 +370,85 @@ def revive_character(character):
         return False
     
     if character['health'] <= 0: # Character is dead
-        character['health'] = character['max_health'] // 2
+        character['health'] = get_effective_stats(character)['max_health'] // 2
         return True
+
+
+def format_equipment(character):
+    """
+    Encode equipped items for a save file
+    
+    Returns: String like "weapon=iron_sword=strength:5;ring=ruby_ring=strength:2,max_health:5"
+    """
+    effects = character.get('equipment_effects', {})
+    return ";".join(f"{slot}={item_id}={format_item_effect(effects[slot])}"
+                    for slot, item_id in character.get('equipment', {}).items())
+
+def parse_equipment(character, value):
+    """
+    Decode a save file EQUIPMENT line into equipment and equipment_effects
+    
+    Raises: InvalidSaveDataError if an entry is malformed
+    """
+    equipment = {}
+    effects = {}
+
+    for entry in value.split(";"):
+        if entry == "":
+            continue
+
+        parts = entry.split("=", 2)
+        if len(parts) != 3:
+            raise InvalidSaveDataError(f"Invalid equipment entry: {entry}")
+        slot, item_id, effect = parts
+
+        try:
+            effects[slot] = compile_item_effect(effect)
+        except InvalidDataFormatError:
+            raise InvalidSaveDataError(f"Invalid equipment effect: {effect}")
+        equipment[slot] = item_id
+
+    character['equipment'] = equipment
+    character['equipment_effects'] = effects
+
+def format_quest_stats(character):
+    """
+    Encode the running quest statistics for a save file
+    
+    Returns: String like "total_xp=250;total_gold=175;completed=3;bands=1-5:3;version=1a2b3c4d"
+             (empty if they have not been worked out yet)
+    """
+    stats = character.get('quest_stats')
+    if stats is None:
+        return ""
+    bands = ",".join(f"{band}:{count}" for band, count in stats['by_band'].items())
+    text = (f"total_xp={stats['total_xp']};total_gold={stats['total_gold']};"
+            f"completed={stats['completed']};bands={bands}")
+    if stats.get('version') is not None: # Unknown for older saves not read since loading
+        text += f";version={stats['version']:08x}"
+    return text
+
+def parse_quest_stats(value):
+    """
+    Decode a save file QUEST_STATS line
+    
+    Returns: Statistics dictionary (see quest_handler.get_quest_stats)
+    Raises: InvalidSaveDataError if the line is malformed
+    """
+    try:
+        fields = dict(entry.split("=", 1) for entry in value.split(";"))
+        by_band = {}
+        for entry in fields['bands'].split(","):
+            if entry:
+                band, count = entry.rsplit(":", 1)
+                by_band[band] = int(count)
+        version = fields.get('version') # Older saves: recounted when first read
+        return {'total_xp': int(fields['total_xp']), 'total_gold': int(fields['total_gold']),
+                'completed': int(fields['completed']), 'by_band': by_band,
+                'version': None if version is None else int(version, 16)}
+    except (KeyError, ValueError):
+        raise InvalidSaveDataError(f"Invalid quest statistics: {value}")
+
 # ============================================================================
 # VALIDATION
 # ============================================================================
@@ -376,7 +490,7 @@ def validate_character_data(character):
     ]
     # Validate list fields
     for field in list_fields:
-        if not isinstance(character[field], list): # Check if list
+        if not isinstance(character[field], (list, Inventory, QuestSet)): # Check if list (or counted inventory / quest set)
             raise InvalidSaveDataError(f"{field} must be a list.")
     return True
     
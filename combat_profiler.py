@@ -0,0 +1,154 @@
+"""
+COMP 163 - Project 3: Quest Chronicles
+Combat Profiler Module
+
+Name: Vanessa Gray
+
+Opt-in timing and action counters for SimpleBattle.
+
+Pass a CombatProfiler to SimpleBattle(..., profiler=...) to time each battle
+phase and count actions. Every thread writes to its own shard, so battles on
+different threads never share a lock; shards are merged when a summary is
+read. Battles without a profiler only pay a single `is None` check per turn.
+"""
+
+import threading
+
+# Battle phases timed by SimpleBattle, in the order they run
+PROFILE_PHASES = ("player_turn", "enemy_turn", "check_battle_end", "rewards")
+
+# ============================================================================
+# PROFILER
+# ============================================================================
+
+class ProfileShard:
+    """Timings and counters written by one thread"""
+
+    def __init__(self):
+        self.phases = {phase: [0, 0.0] for phase in PROFILE_PHASES} # phase -> [calls, seconds]
+        self.actions = {} # (side, action) -> count
+        self.battles = 0
+
+class CombatProfiler:
+    """
+    Collects per-phase timings and action counts from profiled battles
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.shards = []
+
+    def get_shard(self):
+        """
+        Get the calling thread's shard, creating it on first use
+
+        Returns: ProfileShard
+        """
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            shard = ProfileShard()
+            self.local.shard = shard
+            self.shards.append(shard) # list.append is atomic
+        return shard
+
+    def add_time(self, phase, seconds):
+        """Add one timed call of a battle phase"""
+        timing = self.get_shard().phases[phase]
+        timing[0] += 1
+        timing[1] += seconds
+
+    def count_action(self, side, action):
+        """Count one action taken by 'player' or 'enemy'"""
+        actions = self.get_shard().actions
+        key = (side, action)
+        actions[key] = actions.get(key, 0) + 1
+
+    def count_battle(self):
+        """Count one finished battle"""
+        self.get_shard().battles += 1
+
+    def reset(self):
+        """Forget everything recorded so far"""
+        self.local = threading.local()
+        self.shards = []
+
+    def summary(self):
+        """
+        Merge every thread's shard
+
+        Returns: Dictionary with:
+                 'battles': int,
+                 'phases': {phase: {'calls': int, 'seconds': float, 'mean': float}},
+                 'actions': {'side:action': int}
+        """
+        phases = {phase: [0, 0.0] for phase in PROFILE_PHASES}
+        actions = {}
+        battles = 0
+
+        for shard in list(self.shards):
+            battles += shard.battles
+            for phase, (calls, seconds) in shard.phases.items():
+                phases[phase][0] += calls
+                phases[phase][1] += seconds
+            for (side, action), count in shard.actions.items():
+                key = f"{side}:{action}"
+                actions[key] = actions.get(key, 0) + count
+
+        return {
+            'battles': battles,
+            'phases': {
+                phase: {
+                    'calls': calls,
+                    'seconds': seconds,
+                    'mean': seconds / calls if calls else 0.0
+                }
+                for phase, (calls, seconds) in phases.items()
+            },
+            'actions': dict(sorted(actions.items()))
+        }
+
+    def to_prometheus(self, prefix="combat"):
+        """
+        Export the summary in the Prometheus text exposition format
+
+        Returns: String of metric lines
+        """
+        summary = self.summary()
+        lines = [
+            f"# TYPE {prefix}_battles_total counter",
+            f"{prefix}_battles_total {summary['battles']}",
+            f"# TYPE {prefix}_phase_seconds_total counter"
+        ]
+        for phase, timing in summary['phases'].items():
+            lines.append(f'{prefix}_phase_seconds_total{{phase="{phase}"}} {timing["seconds"]:.9f}')
+
+        lines.append(f"# TYPE {prefix}_phase_calls_total counter")
+        for phase, timing in summary['phases'].items():
+            lines.append(f'{prefix}_phase_calls_total{{phase="{phase}"}} {timing["calls"]}')
+
+        lines.append(f"# TYPE {prefix}_actions_total counter")
+        for key, count in summary['actions'].items():
+            side, action = key.split(":", 1)
+            lines.append(f'{prefix}_actions_total{{side="{side}",action="{action}"}} {count}')
+
+        return "\n".join(lines) + "\n"
+
+# ============================================================================
+# TESTING
+# ============================================================================
+
+if __name__ == "__main__":
+    print("=== COMBAT PROFILER TEST ===")
+
+    # import character_manager
+    # import combat_system
+    #
+    # profiler = CombatProfiler()
+    # for i in range(1000):
+    #     hero = character_manager.create_character("Hero", "Warrior")
+    #     battle = combat_system.SimpleBattle(hero, combat_system.create_enemy("goblin"),
+    #                                         log=combat_system.BattleLog(), seed=i,
+    #                                         action_provider=combat_system.auto_player_action,
+    #                                         profiler=profiler)
+    #     battle.start_battle()
+    # print(profiler.to_prometheus())
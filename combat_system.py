@@ -9,17 +9,61 @@ AI Usage: AI was used to help generate the initial structure and functions of th
 Handles combat mechanics
 """
 
+import heapq
+import json
+import os
+import random
+import time
+from array import array
+from collections import deque
+from itertools import islice
+
+from inventory_system import get_effective_stats, record_event
+
 from custom_exceptions import (
+    CombatError,
     InvalidTargetError,
     CombatNotActiveError,
     CharacterDeadError,
-    AbilityOnCooldownError
+    AbilityOnCooldownError,
+    InvalidSaveDataError
 )
 
 # ============================================================================
 # ENEMY DEFINITIONS
 # ============================================================================
 
+# Base stats for every enemy type create_enemy can build
+ENEMY_TYPES = {
+    "goblin": {
+        "name": "Goblin",
+        "health": 50,
+        "max_health": 50,
+        "strength": 8,
+        "magic": 2,
+        "xp_reward": 25,
+        "gold_reward": 10
+    },
+    "orc": {
+        "name": "Orc",
+        "health": 80,
+        "max_health": 80,
+        "strength": 12,
+        "magic": 5,
+        "xp_reward": 50,
+        "gold_reward": 25
+    },
+    "dragon": {
+        "name": "Dragon",
+        "health": 200,
+        "max_health": 200,
+        "strength": 25,
+        "magic": 15,
+        "xp_reward": 200,
+        "gold_reward": 100
+    }
+}
+
 def create_enemy(enemy_type):
     """
     Create an enemy based on type
@@ -34,42 +78,11 @@ def create_enemy(enemy_type):
     """
     # enemy creation
     # Return dictionary with: name, health, max_health, strength, magic, xp_reward, gold_reward
-    
-    enemy = {
-
-        "goblin": {
-            "name": "Goblin",  
-            "health": 50,
-            "max_health": 50,
-            "strength": 8,
-            "magic": 2,
-            "xp_reward": 25,
-            "gold_reward": 10
-        },
-        "orc": {
-            "name": "Orc",
-            "health": 80,
-            "max_health": 80,
-            "strength": 12,
-            "magic": 5,
-            "xp_reward": 50,
-            "gold_reward": 25
-        },
-        "dragon": {
-            "name": "Dragon",
-            "health": 200,
-            "max_health": 200,
-            "strength": 25,
-            "magic": 15,
-            "xp_reward": 200,
-            "gold_reward": 100
-        }
-    }
 
-    if enemy_type not in enemy:
+    if enemy_type not in ENEMY_TYPES:
         raise InvalidTargetError(f"Enemy type '{enemy_type}' is not recognized.")
     
-    standard = enemy[enemy_type]
+    standard = ENEMY_TYPES[enemy_type]
 
     norm = {
         "name": standard["name"],
@@ -82,25 +95,292 @@ def create_enemy(enemy_type):
     }
     return norm
 
-def get_random_enemy_for_level(character_level):
+# ============================================================================
+# SPAWN TABLES
+# ============================================================================
+
+# Level bands for random encounters: (min_level, max_level, [(enemy_type, weight), ...])
+# A max_level of None means the band covers every level above min_level.
+SPAWN_TABLES = [
+    (1, 2, [("goblin", 9), ("orc", 1)]),
+    (3, 5, [("goblin", 2), ("orc", 7), ("dragon", 1)]),
+    (6, None, [("orc", 3), ("dragon", 7)])
+]
+
+def build_alias_table(weights):
+    """
+    Build Walker alias tables for a list of weights
+    
+    Args:
+        weights: List of positive numbers
+    
+    Returns: Tuple of (probabilities, aliases), both lists of len(weights)
+    Raises: ValueError if weights is empty or sums to zero
+    """
+    count = len(weights)
+    total = sum(weights)
+
+    if count == 0 or total <= 0:
+        raise ValueError("Spawn weights must contain at least one positive weight.")
+
+    # Scale every weight so the average column holds exactly 1.0
+    scaled = [weight * count / total for weight in weights]
+    probabilities = [1.0] * count
+    aliases = list(range(count))
+
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+    while small and large: # Pair each light column with a heavy one
+        light = small.pop()
+        heavy = large.pop()
+
+        probabilities[light] = scaled[light]
+        aliases[light] = heavy
+
+        scaled[heavy] -= 1.0 - scaled[light]
+        if scaled[heavy] < 1.0:
+            small.append(heavy)
+        else:
+            large.append(heavy)
+
+    # Whatever is left over is 1.0 up to rounding error
+    for i in small + large:
+        probabilities[i] = 1.0
+
+    return probabilities, aliases
+
+def build_spawn_samplers(spawn_tables):
+    """
+    Precompute an alias sampler for every level covered by the spawn tables
+    
+    Args:
+        spawn_tables: List of (min_level, max_level, [(enemy_type, weight), ...])
+    
+    Returns: List indexed by level; each entry is (enemy_types, probabilities, aliases).
+             The last entry covers every level past the end of the list.
+    Raises: InvalidTargetError if a table names an unknown enemy type
+            ValueError if the bands leave a gap or have no open-ended band
+    """
+    bands = sorted(spawn_tables, key=lambda band: band[0])
+
+    if not bands or bands[-1][1] is not None:
+        raise ValueError("The last spawn band must cover all higher levels (max_level None).")
+
+    samplers = [None] # Level 0 is never used; index 0 is a placeholder
+    
+    for min_level, max_level, entries in bands:
+        if min_level != len(samplers):
+            raise ValueError(f"Spawn bands must be contiguous; expected level {len(samplers)}, got {min_level}.")
+        
+        enemy_types = []
+        weights = []
+        for enemy_type, weight in entries:
+            if enemy_type not in ENEMY_TYPES:
+                raise InvalidTargetError(f"Enemy type '{enemy_type}' is not recognized.")
+            enemy_types.append(enemy_type)
+            weights.append(weight)
+
+        probabilities, aliases = build_alias_table(weights)
+        sampler = (tuple(enemy_types), tuple(probabilities), tuple(aliases))
+
+        last_level = min_level if max_level is None else max_level
+        samplers.extend([sampler] * (last_level - min_level + 1))
+
+    samplers[0] = samplers[1] # Treat level 0 and below like level 1
+    return samplers
+
+# Built once at import; call load_spawn_tables to swap in new tables
+_spawn_samplers = build_spawn_samplers(SPAWN_TABLES)
+
+def load_spawn_tables(spawn_tables):
+    """
+    Replace the active spawn tables and rebuild the per-level samplers
+    
+    Returns: True if loaded
+    Raises: InvalidTargetError, ValueError (see build_spawn_samplers)
+    """
+    global _spawn_samplers, SPAWN_TABLES
+
+    _spawn_samplers = build_spawn_samplers(spawn_tables)
+    SPAWN_TABLES = spawn_tables
+    return True
+
+def pick_enemy_type_for_level(character_level, rng=random):
+    """
+    Pick an enemy type for a level from the spawn tables in O(1)
+    
+    Args:
+        character_level: Character's level
+        rng: Object with random() and randrange(), e.g. random.Random
+    
+    Returns: Enemy type string (e.g. "goblin")
+    """
+    if character_level < len(_spawn_samplers):
+        enemy_types, probabilities, aliases = _spawn_samplers[max(character_level, 0)]
+    else:
+        enemy_types, probabilities, aliases = _spawn_samplers[-1]
+
+    column = rng.randrange(len(enemy_types))
+    if rng.random() < probabilities[column]:
+        return enemy_types[column]
+    return enemy_types[aliases[column]]
+
+def get_random_enemy_for_level(character_level, rng=random):
     """
     Get an appropriate enemy for character's level
     
-    Level 1-2: Goblins
-    Level 3-5: Orcs
-    Level 6+: Dragons
+    Enemies are drawn from SPAWN_TABLES:
+    Level 1-2: Mostly goblins, occasionally an orc
+    Level 3-5: Mostly orcs, some goblins, rarely a dragon
+    Level 6+: Mostly dragons, some orcs
     
     Returns: Enemy dictionary
     """
     # level-appropriate enemy selection
-   
+    return create_enemy(pick_enemy_type_for_level(character_level, rng))
+
+# ============================================================================
+# BATTLE LOG
+# ============================================================================
+
+# Field order of every battle event tuple
+BATTLE_EVENT_FIELDS = ("turn", "actor", "action", "target", "amount", "hp_after")
+
+def format_battle_event(event):
+    """
+    Turn a battle event tuple into a readable message
+    
+    Returns: Message string (without the ">>> " prefix)
+    """
+    turn, actor, action, target, amount, hp_after = event
 
-    if character_level <= 2:
-        return create_enemy("goblin")
-    elif 3 <= character_level <= 5:
-        return create_enemy("orc")
+    if action == "start":
+        return f"Battle started between {actor} and {target}!"
+    elif action == "attack":
+        return f"{actor} attacks {target} for {amount} damage!"
+    elif action == "special":
+        return f"{actor} used their special ability on {target} for {amount} damage!"
+    elif action == "heal":
+        return f"{actor} healed for {amount} health points."
+    elif action == "escape":
+        return f"{actor} successfully escaped the battle!"
+    elif action == "escape_failed":
+        return f"{actor} failed to escape!"
+    elif action == "defeated":
+        return f"{actor} has been defeated!"
+    elif action == "cooldown":
+        return f"{actor}'s special ability is not ready yet!"
     else:
-        return create_enemy("dragon")
+        return f"{actor} used {action} on {target} ({amount})."
+
+class ConsoleSink:
+    """Battle log sink that prints formatted events, one print per batch"""
+
+    def write(self, events):
+        """Print a batch of events"""
+        print("\n".join(f">>> {format_battle_event(event)}" for event in events))
+
+    def close(self):
+        """Nothing to release for the console"""
+        pass
+
+class JsonLinesSink:
+    """Battle log sink that appends one JSON object per event to a file"""
+
+    def __init__(self, filename):
+        """Remember the target file; it is opened on the first write"""
+        self.filename = filename
+        self.file = None
+
+    def write(self, events):
+        """Append a batch of events with a single file write"""
+        if self.file is None:
+            self.file = open(self.filename, "a")
+
+        lines = [json.dumps(dict(zip(BATTLE_EVENT_FIELDS, event))) + "\n" for event in events]
+        self.file.write("".join(lines))
+        self.file.flush()
+
+    def close(self):
+        """Close the underlying file if it was opened"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class NullSink:
+    """Battle log sink that discards everything (headless simulations)"""
+
+    def write(self, events):
+        """Drop the batch"""
+        pass
+
+    def close(self):
+        """Nothing to release"""
+        pass
+
+class BattleLog:
+    """
+    In-memory ring buffer of structured battle events
+    
+    Each event is a tuple laid out as BATTLE_EVENT_FIELDS. Recording an event
+    is a tuple append; events reach the sink in batches of flush_every or when
+    flush() is called (SimpleBattle flushes at the end of every battle).
+    """
+
+    def __init__(self, sink=None, capacity=1024, flush_every=256):
+        """
+        Args:
+            sink: Object with write(events) and close(); defaults to NullSink
+            capacity: Number of most recent events kept in memory
+            flush_every: Pending event count that triggers a flush
+        """
+        if flush_every < 1 or flush_every > capacity:
+            raise ValueError("flush_every must be between 1 and capacity.")
+
+        self.sink = sink if sink is not None else NullSink()
+        self.flush_every = flush_every
+        self.buffer = deque(maxlen=capacity)
+        self.pending = 0
+
+    def record(self, turn, actor, action, target=None, amount=0, hp_after=None):
+        """Append an event to the buffer, flushing when a batch is full"""
+        self.buffer.append((turn, actor, action, target, amount, hp_after))
+        self.pending += 1
+
+        if self.pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """Send every event recorded since the last flush to the sink"""
+        if self.pending == 0:
+            return
+        
+        buffered = len(self.buffer)
+        events = list(islice(self.buffer, max(buffered - self.pending, 0), buffered))
+        self.pending = 0
+        self.sink.write(events)
+
+    def events(self):
+        """
+        Get the buffered events
+        
+        Returns: List of event tuples, oldest first
+        """
+        return list(self.buffer)
+
+    def close(self):
+        """Flush pending events and close the sink"""
+        self.flush()
+        self.sink.close()
+
+def console_battle_log():
+    """
+    Create the battle log used by interactive games
+    
+    Returns: BattleLog that prints every event as soon as it is recorded
+    """
+    return BattleLog(ConsoleSink(), capacity=256, flush_every=1)
 
 # ============================================================================
 # COMBAT SYSTEM
@@ -113,8 +393,26 @@ class SimpleBattle:
     Manages combat between character and enemy
     """
     
-    def __init__(self, character, enemy):
-        """Initialize battle with character and enemy"""
+    def __init__(self, character, enemy, log=None, seed=None, rng=None,
+                 action_provider=None, record=False, enemy_ai=None, profiler=None):
+        """
+        Initialize battle with character and enemy
+        
+        Args:
+            log: BattleLog receiving battle events (defaults to console output)
+            seed: Seed for this battle's random.Random (a fresh one is drawn if None)
+            rng: Pre-built random source; overrides seed when given
+            action_provider: Callable taking the battle and returning '1', '2' or '3';
+                             if None the player is prompted with input()
+            record: If True, keep a replay of the battle in self.replay (not allowed
+                    with rng: a replay can only re-create the battle from its seed)
+            enemy_ai: Enemy AI policy name, object or settings dictionary (see
+                      get_enemy_ai); None keeps the classic always-attack behavior
+            profiler: combat_profiler.CombatProfiler timing each phase, or None
+        
+        Raises: ValueError if record is True and an rng is given, or the enemy_ai
+                cannot be recorded (see AlwaysAttackAI.settings)
+        """
         #initialization
         # Store character and enemy
         # Set combat_active flag
@@ -123,13 +421,35 @@ class SimpleBattle:
         self.enemy = enemy
         self.combat_active = True
         self.turn_counter = 0
+        self.log = log if log is not None else console_battle_log()
+
+        # Every battle owns its random source so it can be replayed exactly
+        if record and rng is not None:
+            raise ValueError("Recorded battles need a seed; an injected rng cannot be replayed.")
+        if rng is None:
+            if seed is None:
+                seed = random.getrandbits(32)
+            rng = random.Random(seed)
+        self.seed = seed
+        self.rng = rng
+
+        self.action_provider = action_provider
+        self.cooldowns = new_cooldown_state() # Turn each ability is ready again, by slot
+        self.damage_table = None # See get_damage_table
+        self.damage_version = None
+
+        self.enemy_ai = get_enemy_ai(enemy_ai) if enemy_ai is not None else None
+        self.enemy_heals_left = ENEMY_MAX_HEALS
+        self.replay = create_replay(character, enemy, seed, self.enemy_ai) if record else None
+        self.profiler = profiler
     
     def start_battle(self):
         """
         Start the combat loop
         
         Returns: Dictionary with battle results:
-                {'winner': 'player'|'enemy', 'xp_gained': int, 'gold_gained': int}
+                {'winner': 'player'|'enemy'|'none', 'xp_gained': int, 'gold_gained': int,
+                 'seed': int or None}
         
         Raises: CharacterDeadError if character is already dead
         """
@@ -137,53 +457,122 @@ class SimpleBattle:
         # Check character isn't dead
         # Loop until someone dies
         # Award XP and gold if player wins
+        self.begin_battle()
+
+        result = None
+        while self.combat_active: # Battle loop
+            result = self.play_round()
+
+        return self.finish_battle(result)
+
+    def begin_battle(self):
+        """
+        Check the character can fight and log the start of the battle
+        
+        Raises: CharacterDeadError if character is already dead
+        """
         if self.character['health'] <= 0: # Check if character is dead
             raise CharacterDeadError("Character is already dead and cannot fight.") 
         else:
-            print("Battle started between " + self.character['name'] + " and " + self.enemy['name'] + "!")
+            self.log.record(self.turn_counter, self.character['name'], "start", self.enemy['name'])
 
-        while self.combat_active: # Battle loop
+    def play_round(self):
+        """
+        Play one round: the player's turn, then the enemy's if the battle goes on
+        
+        Returns: 'player' or 'enemy' if the round ended the battle, None otherwise
+                 (combat_active is also False after a successful escape)
+        """
+        result = self.play_turn("player", self.player_turn) # Player's turn
 
-            self.player_turn() # Player's turn
-            result = self.check_battle_end() # Check if battle ended
+        if not self.combat_active: 
+            return result
 
-            if not self.combat_active: 
-                break
-            if result:
-                break
+        result = self.play_turn("enemy", self.enemy_turn)
+        if result:
+            return result
 
-            self.enemy_turn()
-            result = self.check_battle_end()
-            if result:
-                break
+        self.turn_counter += 1 # Increment turn counter
+        return None
+
+    def play_turn(self, side, turn):
+        """
+        Take one side's turn and check whether it ended the battle
+        
+        With a profiler, both phases are timed and the action the turn
+        returned is counted.
+        
+        Args:
+            side: 'player' or 'enemy'
+            turn: self.player_turn or self.enemy_turn
+        
+        Returns: Result of check_battle_end
+        """
+        profiler = self.profiler
+        if profiler is None:
+            turn()
+            return self.check_battle_end()
 
-            self.turn_counter += 1 # Increment turn counter
+        clock = time.perf_counter
+        started = clock()
+        action = turn()
+        ended = clock()
+        result = self.check_battle_end()
+        profiler.add_time(f"{side}_turn", ended - started)
+        profiler.add_time("check_battle_end", clock() - ended)
+        profiler.count_action(side, action)
+        return result
+
+    def finish_battle(self, result):
+        """
+        Flush the log and apply rewards once the battle is over
+        
+        Args:
+            result: Last value returned by play_round
+        
+        Returns: Battle results dictionary (see start_battle)
+        """
+        self.log.flush() # Push any batched events out to the sink
 
         if result == 'player': # Player won
+            started = time.perf_counter() if self.profiler is not None else 0.0
             rewards = get_victory_rewards(self.enemy) # Get rewards
 
-            self.character['xp'] += rewards['xp']
+            self.character['experience'] += rewards['xp']
             self.character['gold'] += rewards['gold']
+            record_event(self.character, "gold", gold_delta=rewards['gold'])
+            if self.profiler is not None:
+                self.profiler.add_time("rewards", time.perf_counter() - started)
 
-            return {
+            outcome = {
                 'winner': 'player',
                 'xp_gained': rewards['xp'],
-                'gold_gained': rewards['gold']
+                'gold_gained': rewards['gold'],
+                'seed': self.seed
             }
         
         elif result == 'enemy':
-            return {
+            outcome = {
                 'winner': 'enemy',
                 'xp_gained': 0,
-                'gold_gained': 0
+                'gold_gained': 0,
+                'seed': self.seed
             }
         
         else:
-            return {
+            outcome = {
                 'winner': 'none',
                 'xp_gained': 0,
-                'gold_gained': 0
+                'gold_gained': 0,
+                'seed': self.seed
             }
+
+        if self.replay is not None: # Remember how the battle ended
+            self.replay['final'] = get_replay_final_state(self, outcome)
+        if self.profiler is not None:
+            self.profiler.count_battle()
+
+        return outcome
     
     def player_turn(self):
         """
@@ -194,6 +583,7 @@ class SimpleBattle:
         2. Special Ability (if available)
         3. Try to Run
         
+        Returns: The action taken ('attack', 'special', 'heal', 'escape' or 'escape_failed')
         Raises: CombatNotActiveError if called outside of battle
         """
         # player turn
@@ -205,38 +595,127 @@ class SimpleBattle:
             raise CombatNotActiveError("Cannot take player turn when combat is not active.")
         
         else:
-            print(f"\n{self.character['name']}'s turn!")
-            print("Choose an action:")
-            print("1. Basic Attack")
-            print("2. Special Ability")
-            print("3. Try to Run")
+            choice = self.choose_action()
 
-            choice = input("Enter the number of your choice: ")
+            if self.replay is not None and choice in ('1', '2', '3'):
+                self.replay['actions'] += choice # Record the action taken
 
             if choice == '1': # Basic attack
-                damage = self.calculate_damage(self.character, self.enemy)
-                self.apply_damage(self.enemy, damage)
-                display_battle_log(f"{self.character['name']} attacks {self.enemy['name']} for {damage} damage!")
+                return self.basic_attack()
             elif choice == '2': # Special ability
-               use_special_ability(self.character, self.enemy)
-               print(f"{self.character['name']} used their special ability!")
+                try:
+                    return self.special_attack()
+                except AbilityOnCooldownError: # Not ready yet, attack instead
+                    self.log.record(self.turn_counter, self.character['name'], "cooldown")
+                    return self.basic_attack()
 
             elif choice == '3': # Try to run
-                escaped = self.attempt_escape()
-                if escaped:
-                    display_battle_log(f"{self.character['name']} successfully escaped the battle!")
-                else:
-                    display_battle_log(f"{self.character['name']} failed to escape!")
+                action = "escape" if self.attempt_escape() else "escape_failed"
+                self.log.record(self.turn_counter, self.character['name'], action)
+                return action
             else: 
                 print("Invalid choice. Please select a valid action.")
-                self.player_turn()  # Retry turn
+                return self.player_turn()  # Retry turn
     
+    def basic_attack(self):
+        """
+        Hit the enemy with the precomputed basic damage and log it
+        
+        Returns: 'attack'
+        """
+        damage = self.get_damage_table()[0]
+        apply_damage(self.enemy, damage)
+        self.log.record(self.turn_counter, self.character['name'], "attack",
+                        self.enemy['name'], damage, self.enemy['health'])
+        return "attack"
+
+    def special_attack(self):
+        """
+        Use the character's special ability and log it
+        
+        Abilities with a damage formula use the precomputed damage table;
+        others (e.g. Heal) run their effect function.
+        
+        Returns: 'heal' for healing abilities, otherwise 'special'
+        Raises: AbilityOnCooldownError if the ability is not ready
+                InvalidTargetError if the class has no registered ability
+        """
+        character = self.character
+        enemy = self.enemy
+        ability = ABILITY_REGISTRY.get(character['class'])
+
+        if ability is not None and ability.damage is not None:
+            start_cooldown(ability, self.cooldowns, self.turn_counter)
+            table = self.get_damage_table()
+
+            # Same roll as rogue_critical_strike so replays match either path
+            if ability.crits and self.rng.randint(0, 1) == 1:
+                damage = table[2]
+            else:
+                damage = table[1]
+
+            apply_damage(enemy, damage)
+            self.log.record(self.turn_counter, character['name'], "special",
+                            enemy['name'], damage, enemy['health'])
+            return "special"
+
+        enemy_before = enemy['health']
+        health_before = character['health']
+        use_special_ability(character, enemy, self.rng, self.cooldowns, self.turn_counter)
+
+        if character['health'] > health_before: # Healing ability
+            self.log.record(self.turn_counter, character['name'], "heal", character['name'],
+                            character['health'] - health_before, character['health'])
+            return "heal"
+
+        self.log.record(self.turn_counter, character['name'], "special", enemy['name'],
+                        enemy_before - enemy['health'], enemy['health'])
+        return "special"
+
+    def get_damage_table(self):
+        """
+        Get the precomputed damage numbers for this matchup
+        
+        Built on first use and rebuilt when the character's 'stat_version'
+        changes (inventory_system bumps it whenever an item changes a stat,
+        e.g. drinking an elixir mid-battle).
+        
+        Returns: Tuple (basic, special, crit, enemy_basic); special and crit are
+                 None when the class ability has no damage formula
+        """
+        version = self.character.get('stat_version', 0)
+
+        if version != self.damage_version or self.damage_table is None:
+            self.damage_table = build_damage_table(self.character, self.enemy)
+            self.damage_version = version
+        return self.damage_table
+
+    def choose_action(self):
+        """
+        Get the player's action for this turn
+        
+        Uses action_provider when one was given, otherwise prompts the player.
+        
+        Returns: Choice string ('1', '2' or '3' when valid)
+        """
+        if self.action_provider is not None:
+            return self.action_provider(self)
+
+        print(f"\n{self.character['name']}'s turn!")
+        print("Choose an action:")
+        print("1. Basic Attack")
+        print("2. Special Ability")
+        print("3. Try to Run")
+
+        return input("Enter the number of your choice: ")
+
     def enemy_turn(self):
         """
         Handle enemy's turn - simple AI
         
-        Enemy always attacks
+        Enemy always attacks unless an enemy_ai policy decides to heal
         
+        Returns: The action taken ('attack' or 'heal')
         Raises: CombatNotActiveError if called outside of battle
         """
         # enemy turn
@@ -245,15 +724,26 @@ class SimpleBattle:
         # Apply to character
         if not self.combat_active: # Check combat active
             raise CombatNotActiveError("Cannot take enemy turn when combat is not active.")
+
+        if self.enemy_ai is not None:
+            action, target = self.enemy_ai.decide(self, self.enemy, [self.character], self.enemy_heals_left)
+            if action == "heal":
+                self.enemy_heals_left -= 1
+                amount = enemy_heal(self.enemy)
+                self.log.record(self.turn_counter, self.enemy['name'], "heal",
+                                self.enemy['name'], amount, self.enemy['health'])
+                return "heal"
         
-        damage = self.calculate_damage(self.enemy, self.character) # Calculate damage
-        self.apply_damage(self.character, damage) # Apply damage to character
-        display_battle_log(f"{self.enemy['name']} attacks {self.character['name']} for {damage} damage!")
+        damage = self.get_damage_table()[3] # Precomputed enemy damage
+        apply_damage(self.character, damage) # Apply damage to character
+        self.log.record(self.turn_counter, self.enemy['name'], "attack",
+                        self.character['name'], damage, self.character['health'])
 
         if self.character['health'] <= 0: # Check if character is dead
             self.character['health'] = 0 
             self.combat_active = False  
-            display_battle_log(f"{self.character['name']} has been defeated!")
+            self.log.record(self.turn_counter, self.character['name'], "defeated")
+        return "attack"
     
     def calculate_damage(self, attacker, defender):
         """
@@ -265,12 +755,7 @@ class SimpleBattle:
         Returns: Integer damage amount
         """
         # damage calculation
-        damage = attacker['strength'] - (defender['strength'] // 4)
-
-        if damage < 1:
-            damage = 1  
-        
-        return damage
+        return calculate_damage(attacker, defender)
     
     def apply_damage(self, target, damage):
         """
@@ -279,8 +764,7 @@ class SimpleBattle:
         Reduces health, prevents negative health
         """
         # damage application
-        if target['health'] - damage < 0:
-            target['health'] = 0
+        apply_damage(target, damage)
     
     def check_battle_end(self):
         """
@@ -310,9 +794,7 @@ class SimpleBattle:
         #  escape attempt
         # Use random number or simple calculation
         # If successful, set combat_active to False
-        import random
-
-        possibility = random.randint(0, 1) # 50% chance
+        possibility = self.rng.randint(0, 1) # 50% chance
 
         if possibility == 1:
             self.combat_active = False
@@ -320,15 +802,737 @@ class SimpleBattle:
         
         return False
 
+# ============================================================================
+# GROUP BATTLES
+# ============================================================================
+
+# Largest party a GroupBattle accepts
+MAX_PARTY_SIZE = 4
+
+# Sides in the initiative heap
+PARTY_SIDE = 0
+ENEMY_SIDE = 1
+
+def target_first(candidates, rng):
+    """Target policy: the first living combatant"""
+    return candidates[0]
+
+def target_weakest(candidates, rng):
+    """Target policy: the combatant with the least health"""
+    return min(candidates, key=lambda combatant: combatant['health'])
+
+def target_strongest(candidates, rng):
+    """Target policy: the combatant with the most strength"""
+    return max(candidates, key=lambda combatant: combatant['strength'])
+
+def target_random(candidates, rng):
+    """Target policy: any living combatant"""
+    return candidates[rng.randrange(len(candidates))]
+
+# Policy name -> function(candidates, rng) returning one of the candidates
+TARGET_POLICIES = {
+    "first": target_first,
+    "weakest": target_weakest,
+    "strongest": target_strongest,
+    "random": target_random
+}
+
+def get_target_policy(policy):
+    """
+    Resolve a target policy name (or pass a policy function through)
+    
+    Raises: InvalidTargetError if the name is not in TARGET_POLICIES
+    """
+    if callable(policy):
+        return policy
+    if policy not in TARGET_POLICIES:
+        raise InvalidTargetError(f"Target policy '{policy}' is not recognized.")
+    return TARGET_POLICIES[policy]
+
+class GroupBattle:
+    """
+    Turn-based combat between a party of characters and a group of enemies
+    
+    Every round each living combatant acts once, in initiative order popped
+    from a heap. Party members attack or use their registered special
+    ability (area abilities hit every living enemy); enemies basic attack.
+    """
+
+    def __init__(self, party, enemies, log=None, seed=None, rng=None,
+                 party_policy="first", enemy_policy="random", action_provider=None,
+                 enemy_ai=None):
+        """
+        Initialize battle with a party and a group of enemies
+        
+        Args:
+            party: List of up to MAX_PARTY_SIZE character dictionaries
+            enemies: List of enemy dictionaries
+            log: BattleLog receiving battle events (defaults to a NullSink log)
+            seed / rng: Random source, as in SimpleBattle
+            party_policy: Target policy name or function used by the party
+            enemy_policy: Target policy name or function used by the enemies
+            action_provider: Callable(battle, party_index) returning '1' or '2';
+                             if None members use their ability whenever it is ready
+            enemy_ai: Enemy AI policy name or object; overrides enemy_policy when given
+        
+        Raises: CombatError if the party is empty or too large
+                InvalidTargetError if there are no enemies or a policy is unknown
+        """
+        if not party or len(party) > MAX_PARTY_SIZE:
+            raise CombatError(f"A party needs between 1 and {MAX_PARTY_SIZE} characters.")
+        if not enemies:
+            raise InvalidTargetError("A group battle needs at least one enemy.")
+
+        self.party = party
+        self.enemies = enemies
+        self.combat_active = True
+        self.turn_counter = 0
+        self.log = log if log is not None else BattleLog(NullSink())
+
+        if rng is None:
+            if seed is None:
+                seed = random.getrandbits(32)
+            rng = random.Random(seed)
+        self.seed = seed
+        self.rng = rng
+
+        self.party_policy = get_target_policy(party_policy)
+        self.enemy_policy = get_target_policy(enemy_policy)
+        self.action_provider = action_provider
+        self.cooldowns = [new_cooldown_state() for _ in party]
+        self.enemy_ai = get_enemy_ai(enemy_ai) if enemy_ai is not None else None
+        self.enemy_heals_left = [ENEMY_MAX_HEALS] * len(enemies)
+
+        # Living counts per side, kept up to date as combatants fall
+        self.alive = [sum(1 for c in party if c['health'] > 0),
+                      sum(1 for e in enemies if e['health'] > 0)]
+        self.defeated = {id(c) for c in party + enemies if c['health'] <= 0}
+
+    def start_battle(self):
+        """
+        Fight until one side is defeated
+        
+        Returns: Dictionary with battle results:
+                {'winner': 'party'|'enemies', 'xp_gained': int, 'gold_gained': int,
+                 'seed': int or None, 'rounds': int}
+                 xp/gold are per surviving party member
+        
+        Raises: CharacterDeadError if every party member is already dead
+        """
+        if self.alive[PARTY_SIDE] == 0:
+            raise CharacterDeadError("Every party member is already dead and cannot fight.")
+
+        self.log.record(self.turn_counter, self.party[0]['name'], "start",
+                        ", ".join(enemy['name'] for enemy in self.enemies))
+
+        result = None
+        while self.combat_active:
+            result = self.play_round()
+
+        return self.finish_battle(result)
+
+    def roll_initiative(self):
+        """
+        Build this round's turn order
+        
+        Initiative = strength // 2 + 1d10; higher goes first, party wins ties.
+        
+        Returns: Heap of (-initiative, side, index) for every living combatant
+        """
+        order = []
+        for side, group in ((PARTY_SIDE, self.party), (ENEMY_SIDE, self.enemies)):
+            for index, combatant in enumerate(group):
+                if combatant['health'] > 0:
+                    stats = get_effective_stats(combatant) if side == PARTY_SIDE else combatant
+                    initiative = stats['strength'] // 2 + self.rng.randint(1, 10)
+                    order.append((-initiative, side, index))
+
+        heapq.heapify(order)
+        return order
+
+    def play_round(self):
+        """
+        Let every living combatant act once in initiative order
+        
+        Returns: 'party' or 'enemies' if the round ended the battle, None otherwise
+        """
+        order = self.roll_initiative()
+
+        while order:
+            _, side, index = heapq.heappop(order)
+
+            if side == PARTY_SIDE:
+                if self.party[index]['health'] > 0: # May have fallen this round
+                    self.party_turn(index)
+            elif self.enemies[index]['health'] > 0:
+                self.enemy_turn(index)
+
+            result = self.check_battle_end()
+            if result:
+                return result
+
+        self.turn_counter += 1
+        return None
+
+    def choose_action(self, index):
+        """
+        Get a party member's action for this turn
+        
+        Returns: '1' (basic attack) or '2' (special ability)
+        """
+        if self.action_provider is not None:
+            return self.action_provider(self, index)
+
+        if is_ability_ready(self.party[index], self.cooldowns[index], self.turn_counter):
+            return '2'
+        return '1'
+
+    def party_turn(self, index):
+        """Handle one party member's turn"""
+        character = self.party[index]
+        targets = [enemy for enemy in self.enemies if enemy['health'] > 0]
+
+        if self.choose_action(index) == '2':
+            ability = ABILITY_REGISTRY.get(character['class'])
+            if ability is not None and ability.area:
+                hit = targets
+            else:
+                hit = [self.party_policy(targets, self.rng)]
+
+            health_before = [target['health'] for target in hit]
+            own_health = character['health']
+
+            try:
+                use_special_ability(character, hit[0], self.rng, self.cooldowns[index], self.turn_counter)
+            except AbilityOnCooldownError: # Not ready yet, attack instead
+                self.log.record(self.turn_counter, character['name'], "cooldown")
+            else:
+                for target in hit[1:]: # Area abilities hit everyone else too
+                    ability.effect(character, target, self.rng)
+
+                if character['health'] > own_health:
+                    self.log.record(self.turn_counter, character['name'], "heal", character['name'],
+                                    character['health'] - own_health, character['health'])
+
+                for target, before in zip(hit, health_before):
+                    if target['health'] < before:
+                        self.log.record(self.turn_counter, character['name'], "special", target['name'],
+                                        before - target['health'], target['health'])
+                        self.check_defeated(ENEMY_SIDE, target)
+                return
+
+        target = self.party_policy(targets, self.rng)
+        damage = calculate_damage(get_effective_stats(character), target)
+        apply_damage(target, damage)
+        self.log.record(self.turn_counter, character['name'], "attack", target['name'], damage, target['health'])
+        self.check_defeated(ENEMY_SIDE, target)
+
+    def enemy_turn(self, index):
+        """Handle one enemy's turn - basic attack on a target picked by enemy_policy or enemy_ai"""
+        enemy = self.enemies[index]
+        targets = [character for character in self.party if character['health'] > 0]
+
+        if self.enemy_ai is None:
+            target = self.enemy_policy(targets, self.rng)
+        else:
+            positions = [position for position, character in enumerate(self.party) if character['health'] > 0]
+            action, target = self.enemy_ai.decide(self, enemy, targets, self.enemy_heals_left[index],
+                                                  positions)
+            if action == "heal":
+                self.enemy_heals_left[index] -= 1
+                amount = enemy_heal(enemy)
+                self.log.record(self.turn_counter, enemy['name'], "heal", enemy['name'], amount, enemy['health'])
+                return
+
+        damage = calculate_damage(enemy, get_effective_stats(target))
+        apply_damage(target, damage)
+        self.log.record(self.turn_counter, enemy['name'], "attack", target['name'], damage, target['health'])
+        self.check_defeated(PARTY_SIDE, target)
+
+    def check_defeated(self, side, combatant):
+        """Update the living count when a hit knocks a combatant out"""
+        if combatant['health'] <= 0 and id(combatant) not in self.defeated:
+            self.defeated.add(id(combatant))
+            self.alive[side] -= 1
+            self.log.record(self.turn_counter, combatant['name'], "defeated")
+
+    def check_battle_end(self):
+        """
+        Check if battle is over
+        
+        Returns: 'party' if all enemies dead, 'enemies' if the party is dead, None if ongoing
+        """
+        if self.alive[ENEMY_SIDE] == 0:
+            self.combat_active = False
+            return 'party'
+        
+        if self.alive[PARTY_SIDE] == 0:
+            self.combat_active = False
+            return 'enemies'
+        
+        return None
+
+    def finish_battle(self, result):
+        """
+        Flush the log and split rewards between surviving party members
+        
+        Returns: Battle results dictionary (see start_battle)
+        """
+        self.log.flush()
+
+        xp_each = 0
+        gold_each = 0
+        if result == 'party':
+            survivors = [character for character in self.party if character['health'] > 0]
+            total_xp = sum(enemy['xp_reward'] for enemy in self.enemies)
+            total_gold = sum(enemy['gold_reward'] for enemy in self.enemies)
+            xp_each = total_xp // len(survivors)
+            gold_each = total_gold // len(survivors)
+
+            for character in survivors:
+                character['experience'] += xp_each
+                character['gold'] += gold_each
+                record_event(character, "gold", gold_delta=gold_each)
+
+        return {
+            'winner': result if result else 'none',
+            'xp_gained': xp_each,
+            'gold_gained': gold_each,
+            'seed': self.seed,
+            'rounds': self.turn_counter
+        }
+
+# ============================================================================
+# ENEMY AI
+# ============================================================================
+
+# Heals each enemy may use per battle (keeps heal-happy policies from stalling)
+ENEMY_MAX_HEALS = 2
+
+def enemy_heal_amount(enemy):
+    """Health an enemy restores when it heals: 2x magic, minimum 1"""
+    return max(1, enemy['magic'] * 2)
+
+def enemy_heal(enemy):
+    """
+    Heal an enemy, not exceeding max_health
+    
+    Returns: Actual amount healed
+    """
+    healed = min(enemy_heal_amount(enemy), enemy['max_health'] - enemy['health'])
+    enemy['health'] += healed
+    return healed
+
+class AlwaysAttackAI:
+    """
+    Enemy AI that always makes a basic attack
+    
+    Every policy answers decide(battle, enemy, targets, heals_left, positions)
+    with an (action, target) tuple where action is "attack" or "heal" (target
+    is the enemy itself for heals). positions gives each target's index in a
+    GroupBattle's party (None in a SimpleBattle). node_budget and time_budget
+    cap how much work a policy may do per decision; simple policies only use
+    one node.
+    """
+
+    name = "always_attack"
+
+    def __init__(self, target_policy="first", node_budget=1, time_budget=None):
+        """
+        Args:
+            target_policy: Target policy name or function (see TARGET_POLICIES)
+            node_budget: Most search nodes expanded per decision
+            time_budget: Most seconds spent per decision, or None for no limit
+        """
+        self.target_policy_name = target_policy if isinstance(target_policy, str) else None
+        self.target_policy = get_target_policy(target_policy)
+        self.node_budget = node_budget
+        self.time_budget = time_budget
+
+    def parameters(self):
+        """Returns: Constructor arguments that rebuild this policy (besides time_budget)"""
+        return {'target_policy': self.target_policy_name, 'node_budget': self.node_budget}
+
+    def settings(self):
+        """
+        Describe this policy for a battle replay
+        
+        Returns: Dictionary with 'policy' (its ENEMY_AI_POLICIES name) and its parameters
+        Raises: ValueError if the policy cannot be rebuilt exactly: a class or
+                target function that is not registered by name, or a time_budget
+                (which makes decisions depend on how fast the search runs)
+        """
+        if ENEMY_AI_POLICIES.get(self.name) is not type(self):
+            raise ValueError(f"Enemy AI {type(self).__name__} is not registered and cannot be recorded.")
+        if self.target_policy_name is None or self.time_budget is not None:
+            raise ValueError(f"Enemy AI '{self.name}' needs a named target policy and no "
+                             "time_budget to be recorded.")
+        return {'policy': self.name, **self.parameters()}
+
+    def pick_target(self, battle, targets):
+        """Pick who to attack among the living targets"""
+        return self.target_policy(targets, battle.rng)
+
+    def decide(self, battle, enemy, targets, heals_left, positions=None):
+        """
+        Returns: ("attack", target)
+        """
+        return "attack", self.pick_target(battle, targets)
+
+class HealWhenLowAI(AlwaysAttackAI):
+    """Enemy AI that heals once its health drops below a fraction of max_health"""
+
+    name = "heal_when_low"
+
+    def __init__(self, threshold=0.3, target_policy="first", node_budget=1, time_budget=None):
+        """
+        Args:
+            threshold: Fraction of max_health at or below which the enemy heals
+        """
+        super().__init__(target_policy, node_budget, time_budget)
+        self.threshold = threshold
+
+    def parameters(self):
+        return {**super().parameters(), 'threshold': self.threshold}
+
+    def decide(self, battle, enemy, targets, heals_left, positions=None):
+        """
+        Returns: ("heal", enemy) when low and heals remain, otherwise ("attack", target)
+        """
+        if heals_left > 0 and enemy['health'] <= enemy['max_health'] * self.threshold:
+            return "heal", enemy
+        return "attack", self.pick_target(battle, targets)
+
+class FocusWeakestAI(AlwaysAttackAI):
+    """Enemy AI that always attacks the living target with the least health"""
+
+    name = "focus_weakest"
+
+    def __init__(self, node_budget=1, time_budget=None):
+        super().__init__("weakest", node_budget, time_budget)
+
+    def parameters(self):
+        return {'node_budget': self.node_budget}
+
+class ExpectimaxAI(AlwaysAttackAI):
+    """
+    Enemy AI that searches a few turns ahead with expectimax
+    
+    The enemy chooses between attacking and healing (max nodes). The player
+    is modelled with the analytic damage table: special ability when ready,
+    otherwise a basic attack, with a 50/50 chance node for critical hits.
+    Abilities without a damage formula (e.g. Heal) are modelled as basic
+    attacks. Leaves score enemy health fraction minus player health fraction.
+    
+    With time_budget=None the search is deterministic, so recorded battles
+    that use it replay exactly (settings() refuses to record a time budget).
+    """
+
+    name = "expectimax"
+
+    def __init__(self, depth=3, target_policy="weakest", node_budget=200, time_budget=None):
+        """
+        Args:
+            depth: Enemy decisions to look ahead
+        """
+        super().__init__(target_policy, node_budget, time_budget)
+        self.depth = depth
+        self.nodes = 0
+        self.deadline = None
+        self.model = None # Figures for the decision being searched (see build_model)
+
+    def parameters(self):
+        return {**super().parameters(), 'depth': self.depth}
+
+    def decide(self, battle, enemy, targets, heals_left, positions=None):
+        """
+        Returns: ("attack", target) or ("heal", enemy), whichever scores best
+        """
+        target = self.pick_target(battle, targets)
+        if heals_left <= 0 or enemy['health'] >= enemy['max_health']:
+            return "attack", target
+
+        position = None
+        if positions is not None: # Match by identity: party members may compare equal
+            position = positions[next(i for i, candidate in enumerate(targets) if candidate is target)]
+
+        self.model = self.build_model(battle, enemy, target, position)
+        self.nodes = 0
+        self.deadline = None if self.time_budget is None else time.perf_counter() + self.time_budget
+
+        cooldown_left = self.model['cooldown_left']
+        attack_value = self.after_enemy_action(target['health'] - self.model['enemy_damage'],
+                                               enemy['health'], heals_left, cooldown_left, self.depth)
+        healed = min(enemy['max_health'], enemy['health'] + self.model['heal'])
+        heal_value = self.after_enemy_action(target['health'], healed, heals_left - 1,
+                                             cooldown_left, self.depth)
+
+        if heal_value > attack_value:
+            return "heal", enemy
+        return "attack", target
+
+    def build_model(self, battle, enemy, target, position=None):
+        """
+        Collect the numbers the search needs for one enemy/target matchup
+        
+        Args:
+            position: Target's index in a GroupBattle's party (None in a SimpleBattle)
+        
+        Returns: Dictionary of damage, heal, health and cooldown figures
+        """
+        table = build_damage_table(target, enemy)
+        ability = ABILITY_REGISTRY.get(target.get('class'))
+
+        cooldown_left = 0
+        has_special = ability is not None and table[1] is not None
+        if has_special:
+            cooldowns = battle.cooldowns if position is None else battle.cooldowns[position]
+            if ability.slot < len(cooldowns):
+                cooldown_left = max(0, cooldowns[ability.slot] - (battle.turn_counter + 1))
+
+        return {
+            'basic': table[0],
+            'special': table[1] if has_special else table[0],
+            'crit': table[2] if has_special else table[0],
+            'crits': has_special and ability.crits,
+            'ability_cooldown': ability.cooldown if has_special else 0,
+            'has_special': has_special,
+            'cooldown_left': cooldown_left,
+            'enemy_damage': table[3],
+            'heal': enemy_heal_amount(enemy),
+            'player_max': get_effective_stats(target)['max_health'],
+            'enemy_max': enemy['max_health']
+        }
+
+    def evaluate(self, player_hp, enemy_hp):
+        """Score a position from the enemy's point of view"""
+        if player_hp <= 0:
+            return 1000.0
+        if enemy_hp <= 0:
+            return -1000.0
+        return enemy_hp / self.model['enemy_max'] - player_hp / self.model['player_max']
+
+    def out_of_budget(self):
+        """True once the node or time budget for this decision is spent"""
+        if self.nodes >= self.node_budget:
+            return True
+        return self.deadline is not None and time.perf_counter() >= self.deadline
+
+    def after_enemy_action(self, player_hp, enemy_hp, heals_left, cooldown_left, depth):
+        """Chance node: the player's reply to the enemy's action"""
+        self.nodes += 1
+        if player_hp <= 0 or enemy_hp <= 0 or depth <= 1 or self.out_of_budget():
+            return self.evaluate(player_hp, enemy_hp)
+
+        model = self.model
+        if model['has_special'] and cooldown_left == 0:
+            next_cooldown = model['ability_cooldown']
+            if model['crits']:
+                return 0.5 * self.enemy_to_move(player_hp, enemy_hp - model['special'], heals_left,
+                                                next_cooldown, depth - 1) \
+                    + 0.5 * self.enemy_to_move(player_hp, enemy_hp - model['crit'], heals_left,
+                                               next_cooldown, depth - 1)
+            return self.enemy_to_move(player_hp, enemy_hp - model['special'], heals_left,
+                                      next_cooldown, depth - 1)
+
+        return self.enemy_to_move(player_hp, enemy_hp - model['basic'], heals_left,
+                                  max(0, cooldown_left - 1), depth - 1)
+
+    def enemy_to_move(self, player_hp, enemy_hp, heals_left, cooldown_left, depth):
+        """Max node: the enemy picks attack or heal"""
+        self.nodes += 1
+        if enemy_hp <= 0 or self.out_of_budget():
+            return self.evaluate(player_hp, enemy_hp)
+
+        model = self.model
+        best = self.after_enemy_action(player_hp - model['enemy_damage'], enemy_hp,
+                                       heals_left, cooldown_left, depth)
+
+        if heals_left > 0 and enemy_hp < model['enemy_max']:
+            healed = min(model['enemy_max'], enemy_hp + model['heal'])
+            best = max(best, self.after_enemy_action(player_hp, healed, heals_left - 1,
+                                                     cooldown_left, depth))
+        return best
+
+# Policy name -> enemy AI class
+ENEMY_AI_POLICIES = {
+    "always_attack": AlwaysAttackAI,
+    "heal_when_low": HealWhenLowAI,
+    "focus_weakest": FocusWeakestAI,
+    "expectimax": ExpectimaxAI
+}
+
+def get_enemy_ai(policy):
+    """
+    Resolve an enemy AI policy into a policy object
+    
+    Args:
+        policy: Name in ENEMY_AI_POLICIES, settings dictionary ({'policy': name,
+                **parameters}, see AlwaysAttackAI.settings) or a policy object
+                (passed through)
+    
+    Raises: InvalidTargetError if the name is not in ENEMY_AI_POLICIES
+    """
+    parameters = {}
+    if isinstance(policy, dict):
+        parameters = dict(policy)
+        policy = parameters.pop('policy', None)
+    elif not isinstance(policy, str):
+        return policy
+
+    if policy not in ENEMY_AI_POLICIES:
+        raise InvalidTargetError(f"Enemy AI policy '{policy}' is not recognized.")
+    return ENEMY_AI_POLICIES[policy](**parameters)
+
+# ============================================================================
+# BATTLE REPLAYS
+# ============================================================================
+
+# Character and enemy fields captured at the start of a recorded battle
+REPLAY_CHARACTER_FIELDS = ["name", "class", "level", "health", "max_health",
+                           "strength", "magic", "experience", "gold", "equipment_effects"]
+REPLAY_ENEMY_FIELDS = ["name", "health", "max_health", "strength", "magic",
+                       "xp_reward", "gold_reward"]
+
+def create_replay(character, enemy, seed, enemy_ai=None):
+    """
+    Start a replay record for a battle
+    
+    Args:
+        enemy_ai: The battle's enemy AI policy object, or None
+    
+    Returns: Dictionary with seed, enemy AI settings, initial character/enemy
+             stats, and an empty action string ('1'/'2'/'3' per player turn is
+             appended as it plays)
+    Raises: ValueError if the enemy AI cannot be recorded
+    """
+    recorded = {field: character[field] for field in REPLAY_CHARACTER_FIELDS if field in character}
+    if 'equipment_effects' in recorded: # Gear may change after the battle
+        recorded['equipment_effects'] = dict(recorded['equipment_effects'])
+
+    return {
+        'version': 1,
+        'seed': seed,
+        'enemy_ai': enemy_ai.settings() if enemy_ai is not None else None,
+        'character': recorded,
+        'enemy': {field: enemy[field] for field in REPLAY_ENEMY_FIELDS if field in enemy},
+        'actions': "",
+        'final': None
+    }
+
+def get_replay_final_state(battle, outcome):
+    """
+    Capture the end state a replay must reproduce
+    
+    Returns: Dictionary with winner, turns, both health totals, experience and gold
+    """
+    return {
+        'winner': outcome['winner'],
+        'turns': battle.turn_counter,
+        'character_health': battle.character['health'],
+        'enemy_health': battle.enemy['health'],
+        'experience': battle.character.get('experience'),
+        'gold': battle.character.get('gold')
+    }
+
+def save_replay(replay, filename):
+    """
+    Write a replay to a JSON file
+    
+    Returns: True if successful
+    """
+    with open(filename, "w") as f:
+        json.dump(replay, f, separators=(",", ":"))
+    return True
+
+def load_replay(filename):
+    """
+    Read a replay from a JSON file
+    
+    Returns: Replay dictionary
+    Raises: InvalidSaveDataError if the file is not a valid replay
+    """
+    try:
+        with open(filename, "r") as f:
+            replay = json.load(f)
+    except (OSError, ValueError):
+        raise InvalidSaveDataError(f"Replay file '{filename}' could not be read.")
+    
+    for field in ['seed', 'character', 'enemy', 'actions', 'final']:
+        if field not in replay:
+            raise InvalidSaveDataError(f"Replay file '{filename}' is missing '{field}'.")
+    
+    return replay
+
+def replay_battle(replay):
+    """
+    Re-run a recorded battle headlessly and compare its end state
+    
+    Args:
+        replay: Replay dictionary (from SimpleBattle(record=True) or load_replay)
+    
+    Returns: Dictionary with 'ok' (bool), 'expected' and 'actual' final states
+    """
+    character = dict(replay['character'])
+    enemy = dict(replay['enemy'])
+    actions = iter(replay['actions'])
+
+    def next_recorded_action(battle):
+        for action in actions:
+            return action
+        raise InvalidSaveDataError("Replay ran out of recorded actions.")
+
+    battle = SimpleBattle(character, enemy, log=BattleLog(NullSink()), seed=replay['seed'],
+                          action_provider=next_recorded_action,
+                          enemy_ai=replay.get('enemy_ai')) # Older replays have no enemy_ai
+    
+    try:
+        outcome = battle.start_battle()
+        actual = get_replay_final_state(battle, outcome)
+    except InvalidSaveDataError: # Recording ended before the battle did
+        actual = None
+
+    return {'ok': actual == replay['final'], 'expected': replay['final'], 'actual': actual}
+
+def replay_directory(directory):
+    """
+    Replay every *.json recording in a directory (regression check)
+    
+    Returns: Dictionary with 'total', 'passed' and 'failed' (list of filenames)
+    """
+    summary = {'total': 0, 'passed': 0, 'failed': []}
+    
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".json"):
+            continue
+        
+        summary['total'] += 1
+        try:
+            report = replay_battle(load_replay(os.path.join(directory, filename)))
+        except InvalidSaveDataError:
+            report = {'ok': False}
+
+        if report['ok']:
+            summary['passed'] += 1
+        else:
+            summary['failed'].append(filename)
+    
+    return summary
+
 # ============================================================================
 # SPECIAL ABILITIES
 # ============================================================================
 
-def use_special_ability(character, enemy):
+def use_special_ability(character, enemy, rng=random, cooldowns=None, turn=0):
     """
     Use character's class-specific special ability
     
-    Example abilities by class:
+    Args:
+        rng: Random source for abilities with a chance element (battle's rng)
+        cooldowns: Cooldown array from new_cooldown_state (None skips cooldowns)
+        turn: Current battle turn, used with cooldowns
+    
+    Example abilities by class (see ABILITY_REGISTRY):
     - Warrior: Power Strike (2x strength damage)
     - Mage: Fireball (2x magic damage)
     - Rogue: Critical Strike (3x strength damage, 50% chance)
@@ -336,29 +1540,40 @@ def use_special_ability(character, enemy):
     
     Returns: String describing what happened
     Raises: AbilityOnCooldownError if ability was used recently
+            InvalidTargetError if the class has no registered ability
     """
     # special abilities
-    # Check character class
-    # Execute appropriate ability
-    # Track cooldowns (optional advanced feature)
+    # Look up the class's ability, check its cooldown, run its effect
     char_class = character['class']
 
-    if char_class == "Warrior":
-        return warrior_power_strike(character, enemy)
-    elif char_class == "Mage":
-        return mage_fireball(character, enemy)
-    elif char_class == "Rogue":
-        return rogue_critical_strike(character, enemy)
-    elif char_class == "Cleric":
-        return cleric_heal(character)
-    else:
-       raise InvalidTargetError(f"Unknown character class '{char_class}' for special ability.")
+    ability = ABILITY_REGISTRY.get(char_class)
+    if ability is None:
+        raise InvalidTargetError(f"Unknown character class '{char_class}' for special ability.")
+
+    if cooldowns is not None:
+        start_cooldown(ability, cooldowns, turn)
+
+    return ability.effect(character, enemy, rng)
+
+def start_cooldown(ability, cooldowns, turn):
+    """
+    Check an ability is ready and put it on cooldown
+    
+    Raises: AbilityOnCooldownError if the ability was used too recently
+    """
+    slot = ability.slot
+    if slot >= len(cooldowns): # Registered after this battle started
+        cooldowns.extend([0] * (slot + 1 - len(cooldowns)))
+
+    if cooldowns[slot] > turn:
+        raise AbilityOnCooldownError(f"{ability.name} is ready again on turn {cooldowns[slot]}.")
+    cooldowns[slot] = turn + ability.cooldown + 1
 
 def warrior_power_strike(character, enemy):
     """Warrior special ability"""
     #  power strike
     # Double strength damage
-    damage = max(1,character["strength"]*2)
+    damage = power_strike_damage(get_effective_stats(character), enemy)
     enemy["health"] -= damage
     if enemy["health"] < 0:
         enemy["health"] = 0
@@ -367,26 +1582,22 @@ def mage_fireball(character, enemy):
     """Mage special ability"""
     # fireball
     # Double magic damage
-    damage = max(1,character["magic"]*2)
+    damage = fireball_damage(get_effective_stats(character), enemy)
     enemy["health"] -= damage
     if enemy["health"] < 0:
         enemy["health"] = 0
     return f"Mage used Fireball dealing {damage} damage to {enemy['name']}"
 
-def rogue_critical_strike(character, enemy):
+def rogue_critical_strike(character, enemy, rng=random):
     """Rogue special ability"""
     #  critical strike
     # 50% chance for triple damage
-    import random
+    base, critical_damage = critical_strike_damage(get_effective_stats(character), enemy)
 
-    base = character["strength"] - (enemy["strength"] // 4)
-    if base < 1:
-        base = 1
-
-    critical = random.randint(0, 1)
+    critical = rng.randint(0, 1)
 
     if critical == 1:
-        fin_damage = base * 3
+        fin_damage = critical_damage
         crit_msg = "It's a critical hit! "
     else:
         fin_damage = base
@@ -398,13 +1609,31 @@ def rogue_critical_strike(character, enemy):
 
     return f"Rogue used Critical Strike dealing {fin_damage} damage to {enemy['name']}. {crit_msg}"
 
+def power_strike_damage(character, enemy):
+    """Power Strike damage: 2x strength, minimum 1"""
+    return max(1, character["strength"] * 2)
+
+def fireball_damage(character, enemy):
+    """Fireball damage: 2x magic, minimum 1"""
+    return max(1, character["magic"] * 2)
+
+def critical_strike_damage(character, enemy):
+    """
+    Critical Strike damage
+    
+    Returns: Tuple of (normal, critical) where normal is the basic attack
+             damage and critical is triple that
+    """
+    base = calculate_damage(character, enemy)
+    return base, base * 3
+
 def cleric_heal(character):
     """Cleric special ability"""
     # healing
     # Restore 30 HP (not exceeding max_health)
     heal_amount = 30
 
-    max_health = character["max_health"]
+    max_health = get_effective_stats(character)["max_health"]
     current_health = character["health"]
 
     new_health = current_health + heal_amount
@@ -418,9 +1647,166 @@ def cleric_heal(character):
 
     return f"Cleric healed for {real_heal} health points."
 # ============================================================================
+# ABILITY REGISTRY
+# ============================================================================
+
+class Ability:
+    """A special ability: display name, effect function, cost and cooldown"""
+
+    def __init__(self, name, effect, cost=0, cooldown=0, area=False, damage=None, crits=False):
+        """
+        Args:
+            name: Display name (e.g. "Power Strike")
+            effect: Function(character, enemy, rng) returning a description string
+            cost: Resource cost shown to players; no built-in class spends one yet
+            cooldown: Turns the ability stays unavailable after being used
+            area: If True, group battles apply the effect to every living enemy
+            damage: Optional function(character, enemy) returning (normal, critical)
+                    damage; lets battles precompute the ability instead of running effect
+            crits: If True, battles roll rng.randint(0, 1) and a 1 deals critical damage
+        """
+        self.name = name
+        self.effect = effect
+        self.cost = cost
+        self.cooldown = cooldown
+        self.area = area
+        self.damage = damage
+        self.crits = crits
+        self.slot = None # Index into per-battle cooldown arrays
+
+# Character class -> Ability used by use_special_ability
+ABILITY_REGISTRY = {}
+
+# Ability name -> cooldown array slot (shared when classes share an ability)
+_ability_slots = {}
+
+def register_ability(character_class, ability):
+    """
+    Register (or replace) the special ability for a character class
+    
+    Returns: The registered Ability (with its cooldown slot assigned)
+    """
+    if ability.name not in _ability_slots:
+        _ability_slots[ability.name] = len(_ability_slots)
+
+    ability.slot = _ability_slots[ability.name]
+    ABILITY_REGISTRY[character_class] = ability
+    return ability
+
+def unregister_ability(character_class):
+    """
+    Remove a character class's special ability, freeing its cooldown slot once no
+    other class shares it (remaining slots are renumbered, so do not call this
+    while battles are running)
+    
+    Returns: The removed Ability, or None if the class had none
+    """
+    ability = ABILITY_REGISTRY.pop(character_class, None)
+    if ability is None or any(other.name == ability.name for other in ABILITY_REGISTRY.values()):
+        return ability
+
+    del _ability_slots[ability.name]
+    for name, slot in _ability_slots.items(): # Keep the cooldown array dense
+        if slot > ability.slot:
+            _ability_slots[name] = slot - 1
+    for registered in ABILITY_REGISTRY.values():
+        registered.slot = _ability_slots[registered.name]
+    return ability
+
+def is_ability_ready(character, cooldowns, turn):
+    """
+    Check whether a character's special ability can be used this turn
+    
+    Returns: True if the class has an ability that is off cooldown, False otherwise
+    """
+    ability = ABILITY_REGISTRY.get(character['class'])
+    if ability is None:
+        return False
+    return ability.slot >= len(cooldowns) or cooldowns[ability.slot] <= turn
+
+def auto_player_action(battle):
+    """
+    Action provider for headless SimpleBattles: special ability when ready, else attack
+    
+    Returns: '2' or '1'
+    """
+    if is_ability_ready(battle.character, battle.cooldowns, battle.turn_counter):
+        return '2'
+    return '1'
+
+def new_cooldown_state():
+    """
+    Create the cooldown state for one battle
+    
+    Returns: array of ints, one slot per registered ability, holding the first
+             turn the ability can be used again
+    """
+    return array("l", [0] * len(_ability_slots))
+
+register_ability("Warrior", Ability("Power Strike",
+                                    lambda character, enemy, rng: warrior_power_strike(character, enemy),
+                                    cooldown=2,
+                                    damage=lambda character, enemy: (power_strike_damage(character, enemy),) * 2))
+register_ability("Mage", Ability("Fireball",
+                                 lambda character, enemy, rng: mage_fireball(character, enemy),
+                                 cooldown=2, area=True,
+                                 damage=lambda character, enemy: (fireball_damage(character, enemy),) * 2))
+register_ability("Rogue", Ability("Critical Strike", rogue_critical_strike, cooldown=1,
+                                  damage=critical_strike_damage, crits=True))
+register_ability("Cleric", Ability("Heal",
+                                   lambda character, enemy, rng: cleric_heal(character),
+                                   cooldown=3))
+
+# ============================================================================
 # COMBAT UTILITIES
 # ============================================================================
 
+def calculate_damage(attacker, defender):
+    """
+    Calculate damage from a basic attack
+    
+    Damage formula: attacker['strength'] - (defender['strength'] // 4)
+    Minimum damage: 1
+    
+    Returns: Integer damage amount
+    """
+    damage = attacker['strength'] - (defender['strength'] // 4)
+
+    if damage < 1:
+        damage = 1  
+    
+    return damage
+
+def apply_damage(target, damage):
+    """
+    Apply damage to a character or enemy
+    
+    Reduces health, prevents negative health
+    """
+    target['health'] -= damage
+    if target['health'] < 0:
+        target['health'] = 0
+
+def build_damage_table(character, enemy):
+    """
+    Precompute every damage number a one-on-one battle needs
+    
+    The character side uses the cached effective stats (base + equipment).
+    
+    Returns: Tuple (basic, special, crit, enemy_basic); special and crit are None
+             when the character's ability has no damage formula
+    """
+    ability = ABILITY_REGISTRY.get(character['class'])
+    stats = get_effective_stats(character)
+
+    if ability is not None and ability.damage is not None:
+        special, crit = ability.damage(stats, enemy)
+    else:
+        special = crit = None
+
+    return (calculate_damage(stats, enemy), special, crit,
+            calculate_damage(enemy, stats))
+
 def can_character_fight(character):
     """
     Check if character is in condition to fight
@@ -448,11 +1834,10 @@ def display_combat_stats(character, enemy):
     
     Shows both character and enemy health/stats
     """
-    #  status display
-    print("\n=== Combat Status ===")
-
-    print(f"\n{character['name']}: HP={character['health']}/{character['max_health']}")
-    print(f"{enemy['name']}: HP={enemy['health']}/{enemy['max_health']}")
+    #  status display (one write instead of one per line)
+    print("\n=== Combat Status ===\n"
+          f"\n{character['name']}: HP={character['health']}/{get_effective_stats(character)['max_health']}\n"
+          f"{enemy['name']}: HP={enemy['health']}/{enemy['max_health']}")
 
 def display_battle_log(message):
     """
@@ -16,6 +16,20 @@ from custom_exceptions import (
     CorruptedDataError
 )
 
+# Stats an item effect can change; compiled effects refer to them by index
+EFFECT_STATS = ("health", "max_health", "strength", "magic")
+
+# Units of one item that share an inventory slot, by item type (others: 1)
+STACK_SIZES = {"consumable": 10}
+
+# item_id -> stack size for every item loaded so far (see get_stack_size)
+item_stack_sizes = {}
+
+# Quest IDs interned to dense numbers in the order they were first seen
+# (file order for loaded quests); quest_ids[number] -> quest_id
+quest_ids = []
+quest_numbers = {} # quest_id -> number
+
 # ============================================================================
 # DATA LOADING FUNCTIONS
 # ============================================================================
@@ -68,6 +82,7 @@ def load_quests(filename="data/quests.txt"):
         if not quest_id:
             raise InvalidDataFormatError("Missing quest_id field.")
 
+        intern_quest_id(quest_id) # Number quests in file order
         quests[quest_id] = quest_dict # Add to quests dictionary
 
     return quests
@@ -79,10 +94,15 @@ def load_items(filename="data/items.txt"):
     Expected format per item (separated by blank lines):
     ITEM_ID: unique_item_name
     NAME: Item Display Name
-    TYPE: weapon|armor|consumable
-    EFFECT: stat_name:value (e.g., strength:5 or health:20)
+    TYPE: weapon|armor|ring|amulet|consumable
+    EFFECT: stat_name:value (e.g., strength:5 or health:20, or
+            several separated by commas: strength:5,magic:3)
     COST: 100
     DESCRIPTION: Item description
+    STACK_SIZE: 10 (optional; defaults to STACK_SIZES for the type)
+    
+    Each item also gets 'compiled_effect' (see compile_item_effect) so the
+    effect string is only parsed once, and 'stack_size'.
     
     Returns: Dictionary of items {item_id: item_data_dict}
     Raises: MissingDataFileError, InvalidDataFormatError, CorruptedDataError
@@ -117,6 +137,7 @@ def load_items(filename="data/items.txt"):
                 if not item_id:
                     raise InvalidDataFormatError("Missing item_id field.")
                     
+                prepare_item(item_data)
                 items[item_id] = item_data # Add to items dictionary
                 curent_block = [] # Reset for next item block
         else:
@@ -137,6 +158,7 @@ def load_items(filename="data/items.txt"):
         if not item_id:
             raise InvalidDataFormatError("Missing item_id field.")
             
+        prepare_item(item_data)
         items[item_id] = item_data # Add to items dictionary
 
     return items
@@ -178,7 +200,7 @@ def validate_item_data(item_dict):
     Validate that item dictionary has all required fields
     
     Required fields: item_id, name, type, effect, cost, description
-    Valid types: weapon, armor, consumable
+    Valid types: weapon, armor, ring, amulet, consumable
     
     Returns: True if valid
     Raises: InvalidDataFormatError if missing required fields or invalid type
@@ -188,7 +210,7 @@ def validate_item_data(item_dict):
         "item_id", "name", "type", "effect", "cost", "description"
     ]
 #check for missing fields
-    valid_types = ["weapon", "armor", "consumable"]
+    valid_types = ["weapon", "armor", "ring", "amulet", "consumable"]
 #check for missing fields
     for field in required_fields:
         if field not in item_dict:
@@ -294,16 +316,108 @@ def parse_item_block(lines):
         value = value.strip()
 
         # Convert numeric fields to integers
-        if key == "cost":
+        if key in ["cost", "stack_size"]:
             try: # Convert cost to integer
                 value = int(value)
             except ValueError:
-                raise InvalidDataFormatError("cost must be an integer.")
+                raise InvalidDataFormatError(f"{key} must be an integer.")
         
         item_info[key] = value # Add to item dictionary
         
     return item_info
 
+def prepare_item(item_data):
+    """
+    Fill in the derived fields of a validated item: compiled_effect and stack_size
+    
+    Also records the stack size for get_stack_size.
+    
+    Raises: InvalidDataFormatError if the effect or stack size is invalid
+    """
+    item_data['compiled_effect'] = compile_item_effect(item_data['effect'])
+
+    stack_size = item_data.get('stack_size', STACK_SIZES.get(item_data['type'], 1))
+    if stack_size < 1:
+        raise InvalidDataFormatError("stack_size must be at least 1.")
+    item_data['stack_size'] = stack_size
+    item_stack_sizes[item_data['item_id']] = stack_size
+
+def intern_quest_id(quest_id):
+    """
+    Get the dense number for a quest ID, assigning the next one if it is new
+    
+    Numbers never change within a run. They can differ between runs (quests
+    inserted into the file, hot reloads), so saves store the IDs their quest
+    bitsets refer to and are remapped on load (see quest_handler.QuestSet.from_code).
+    
+    Returns: Integer quest number
+    """
+    number = quest_numbers.get(quest_id)
+    if number is None:
+        number = len(quest_ids)
+        quest_ids.append(quest_id)
+        quest_numbers[quest_id] = number
+    return number
+
+def get_stack_size(item_id, item_data=None):
+    """
+    Get how many units of an item share one inventory slot
+    
+    Args:
+        item_data: The item's data, when the caller has it; its 'stack_size'
+                   (or the default for its type) is used, so the answer does
+                   not depend on which item file was loaded
+    
+    Returns: Stack size. Without item_data the sizes recorded by load_items
+             are used; items that were never loaded (quest trophies, test
+             items) hold 1 unit per slot.
+    """
+    if item_data is not None:
+        stack_size = item_data.get('stack_size')
+        return stack_size if stack_size is not None else STACK_SIZES.get(item_data.get('type'), 1)
+    return item_stack_sizes.get(item_id, 1)
+
+def compile_item_effect(effect_string):
+    """
+    Parse an effect string once into its compact form
+    
+    Args:
+        effect_string: "stat_name:value", or several joined by commas
+                       (e.g. "strength:5,magic:3")
+    
+    Returns: Tuple of (stat_index, value) tuples, indexes into EFFECT_STATS
+    Example: "strength:5,magic:3" -> ((2, 5), (3, 3))
+    Raises: InvalidDataFormatError if a part is malformed or names an unknown stat
+    """
+    compiled = []
+
+    for part in effect_string.split(","): # Each stat change
+        if ":" not in part:
+            raise InvalidDataFormatError(f"Invalid effect format: {effect_string}")
+
+        stat_name, value = part.split(":", 1)
+        stat_name = stat_name.strip()
+
+        if stat_name not in EFFECT_STATS:
+            raise InvalidDataFormatError(f"Unknown effect stat: {stat_name}")
+
+        try:
+            value = int(value)
+        except ValueError:
+            raise InvalidDataFormatError("Effect value must be an integer.")
+
+        compiled.append((EFFECT_STATS.index(stat_name), value))
+
+    return tuple(compiled)
+
+def format_item_effect(effect):
+    """
+    Turn a compiled effect back into its effect string
+    
+    Returns: String such as "strength:5,magic:3"
+    """
+    return ",".join(f"{EFFECT_STATS[stat_index]}:{value}" for stat_index, value in effect)
+
 # ============================================================================
 # TESTING
 # ============================================================================
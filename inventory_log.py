@@ -0,0 +1,379 @@
+"""
+COMP 163 - Project 3: Quest Chronicles
+Inventory Log Module
+
+Name: Vanessa Gray
+
+Append-only binary log of inventory and gold changes, plus an offline query
+tool that rebuilds a character's inventory at any point in time.
+
+Install a log with inventory_system.set_event_log(EventLog(...)); every
+inventory and gold change made through inventory_system, the stash and
+character_manager.add_gold is then recorded as
+
+    timestamp, character, op, item, quantity, gold delta
+
+Records are buffered in memory and appended to segment files
+(events_000000.log, events_000001.log, ...). A new segment starts once the
+current one reaches max_segment_bytes. After a character's first event in a
+segment, and then every checkpoint_interval events, a checkpoint record
+stores their whole inventory and gold, so a rebuild replays from the nearest
+checkpoint instead of from the start of the log.
+
+Usage:
+    python inventory_log.py --character Hero --at 1760000000
+    python inventory_log.py --character Hero --events --op sell
+"""
+
+import argparse
+import os
+import struct
+import time
+from datetime import datetime
+
+from inventory_system import get_inventory
+from custom_exceptions import CharacterNotFoundError, SaveFileCorruptedError
+
+# Event kinds; a record stores the index. Checkpoint records store the gold
+# balance in the gold field and "item=qty,..." in the item field.
+LOG_OPS = ("checkpoint", "add", "remove", "buy", "sell", "use", "equip", "unequip",
+           "deposit", "withdraw", "gold", "clear")
+
+# Change in item quantity per unit of each op when replaying
+OP_SIGNS = {"add": 1, "buy": 1, "unequip": 1, "withdraw": 1,
+            "remove": -1, "sell": -1, "use": -1, "equip": -1, "deposit": -1}
+
+# Segment header: magic, format version, segment start time
+LOG_MAGIC = b"QCEV"
+HEADER = struct.Struct("<4sBd")
+LOG_VERSION = 1
+
+# Record: timestamp, op, quantity, gold, name length, item length (then the two strings)
+RECORD = struct.Struct("<dBiiHH")
+
+# Defaults
+DEFAULT_LOG_DIRECTORY = "data/event_log"
+DEFAULT_BUFFER_SIZE = 64 * 1024
+DEFAULT_SEGMENT_BYTES = 4 * 1024 * 1024
+DEFAULT_CHECKPOINT_INTERVAL = 100
+
+# ============================================================================
+# WRITING
+# ============================================================================
+
+class EventLog:
+    """
+    Buffered writer for the inventory event log
+    """
+
+    def __init__(self, directory=DEFAULT_LOG_DIRECTORY, buffer_size=DEFAULT_BUFFER_SIZE,
+                 max_segment_bytes=DEFAULT_SEGMENT_BYTES,
+                 checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL, clock=time.time):
+        """
+        Args:
+            directory: Directory holding the segment files (appends to the newest)
+            buffer_size: Bytes buffered before they are written
+            max_segment_bytes: Size at which a new segment is started
+            checkpoint_interval: Events per character between checkpoints
+            clock: Function returning the current time in seconds
+        """
+        self.directory = directory
+        self.buffer_size = buffer_size
+        self.max_segment_bytes = max_segment_bytes
+        self.checkpoint_interval = checkpoint_interval
+        self.clock = clock
+
+        self.buffer = bytearray()
+        self.since_checkpoint = {} # character name -> events since their last checkpoint
+
+        segments = list_segments(directory)
+        if segments:
+            self.segment = len(segments) - 1
+            self.segment_bytes = os.path.getsize(segments[-1][0])
+        else:
+            self.segment = 0
+            self.segment_bytes = 0 # Header not written yet
+
+    def segment_file(self, segment):
+        """Returns: Path of one segment file"""
+        return os.path.join(self.directory, f"events_{segment:06d}.log")
+
+    def record(self, character, op, item_id="", quantity=0, gold_delta=0, checkpoint=True):
+        """
+        Append one event, followed by a checkpoint when one is due
+
+        Args:
+            character: Character dictionary, after the change was made
+            op: One of LOG_OPS (not 'checkpoint')
+            checkpoint: False when the character's state already includes later
+                        changes (events of a batch logged after the whole batch
+                        was applied); a due checkpoint then waits for the next
+                        event that allows one
+        """
+        pending = max(self.segment_bytes, HEADER.size) + len(self.buffer)
+        if pending > HEADER.size and pending >= self.max_segment_bytes:
+            self.rotate()
+
+        timestamp = self.clock()
+        name = character['name']
+        self.append(timestamp, LOG_OPS.index(op), quantity, gold_delta, name, item_id)
+
+        count = self.since_checkpoint.get(name)
+        if count is None: # First event in this segment: a checkpoint is due now
+            count = self.checkpoint_interval - 1
+        if checkpoint and count + 1 >= self.checkpoint_interval:
+            self.checkpoint(character, timestamp)
+        else:
+            self.since_checkpoint[name] = count + 1
+
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def checkpoint(self, character, timestamp=None):
+        """Append a record of the character's whole inventory and gold"""
+        contents = ",".join(f"{item_id}={quantity}"
+                            for item_id, quantity in get_inventory(character).items())
+        self.append(self.clock() if timestamp is None else timestamp, 0, 0,
+                    character['gold'], character['name'], contents)
+        self.since_checkpoint[character['name']] = 0
+
+    def append(self, timestamp, op_index, quantity, gold, name, item):
+        """Encode one record into the buffer"""
+        name = name.encode()
+        item = item.encode()
+        self.buffer += RECORD.pack(timestamp, op_index, quantity, gold, len(name), len(item))
+        self.buffer += name
+        self.buffer += item
+
+    def rotate(self):
+        """Write out the buffer and start a new segment"""
+        self.flush()
+        self.segment += 1
+        self.segment_bytes = 0
+        self.since_checkpoint = {} # Every segment gets its own checkpoints
+
+    def flush(self):
+        """
+        Write buffered records to the current segment
+
+        Returns: Number of bytes written
+        """
+        if not self.buffer:
+            return 0
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        with open(self.segment_file(self.segment), "ab") as f:
+            if not self.segment_bytes: # Segment start time = its first record's time
+                f.write(HEADER.pack(LOG_MAGIC, LOG_VERSION, RECORD.unpack_from(self.buffer)[0]))
+                self.segment_bytes = HEADER.size
+            f.write(self.buffer)
+
+        written = len(self.buffer)
+        self.segment_bytes += written
+        self.buffer = bytearray()
+        return written
+
+    def close(self):
+        """Write anything still buffered"""
+        self.flush()
+
+# ============================================================================
+# READING
+# ============================================================================
+
+def list_segments(directory):
+    """
+    Returns: List of (path, start time) for every segment, oldest first
+    Raises: SaveFileCorruptedError if a segment header is not valid
+    """
+    if not os.path.isdir(directory):
+        return []
+
+    segments = []
+    for filename in sorted(os.listdir(directory)):
+        if not (filename.startswith("events_") and filename.endswith(".log")):
+            continue
+        path = os.path.join(directory, filename)
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise SaveFileCorruptedError(f"Event log segment '{filename}' is truncated.")
+        magic, version, started = HEADER.unpack(header)
+        if magic != LOG_MAGIC or version != LOG_VERSION:
+            raise SaveFileCorruptedError(f"'{filename}' is not an event log segment.")
+        segments.append((path, started))
+    return segments
+
+def iter_records(path):
+    """
+    Read every record of one segment
+
+    Yields: Tuples of (timestamp, op_index, quantity, gold, name bytes, item bytes)
+    Raises: SaveFileCorruptedError if the segment ends inside a record
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    position = HEADER.size
+    end = len(data)
+    unpack = RECORD.unpack_from
+    while position < end:
+        if position + RECORD.size > end:
+            raise SaveFileCorruptedError(f"Event log segment '{path}' is truncated.")
+        timestamp, op_index, quantity, gold, name_length, item_length = unpack(data, position)
+        position += RECORD.size
+        name = data[position:position + name_length]
+        position += name_length
+        item = data[position:position + item_length]
+        position += item_length
+        if position > end:
+            raise SaveFileCorruptedError(f"Event log segment '{path}' is truncated.")
+        yield timestamp, op_index, quantity, gold, name, item
+
+def read_events(directory=DEFAULT_LOG_DIRECTORY, character=None, op=None, start=None, end=None):
+    """
+    List logged events, oldest first (checkpoints are left out)
+
+    Args:
+        character: Only this character's events
+        op: Only events of this kind (one of LOG_OPS)
+        start / end: Inclusive timestamp bounds
+
+    Returns: List of event dictionaries with 'timestamp', 'character', 'op',
+             'item_id', 'quantity' and 'gold_delta'
+    """
+    name = None if character is None else character.encode()
+    op_index = None if op is None else LOG_OPS.index(op)
+    events = []
+
+    for path, started in list_segments(directory):
+        for timestamp, index, quantity, gold, record_name, item in iter_records(path):
+            if index == 0 or (name is not None and record_name != name):
+                continue
+            if (op_index is not None and index != op_index) or \
+                    (start is not None and timestamp < start) or (end is not None and timestamp > end):
+                continue
+            events.append({
+                'timestamp': timestamp,
+                'character': record_name.decode(),
+                'op': LOG_OPS[index],
+                'item_id': item.decode(),
+                'quantity': quantity,
+                'gold_delta': gold
+            })
+    return events
+
+def rebuild_inventory(directory=DEFAULT_LOG_DIRECTORY, character=None, at=None):
+    """
+    Rebuild a character's inventory and gold as they were at a point in time
+
+    Finds the newest checkpoint at or before `at` (searching back from the
+    segment that contains it) and replays only the events after it.
+
+    Args:
+        character: Character name
+        at: Timestamp to rebuild at (None = end of the log)
+
+    Returns: Dictionary with 'inventory' ({item_id: quantity}), 'gold',
+             'checkpoint' (timestamp of the checkpoint used) and 'replayed'
+             (number of events applied after it)
+    Raises: CharacterNotFoundError if the character has no checkpoint by then
+    """
+    segments = list_segments(directory)
+    name = character.encode()
+
+    last = len(segments) - 1 # Newest segment that started by `at`
+    while last >= 0 and at is not None and segments[last][1] > at:
+        last -= 1
+
+    # Newest checkpoint at or before `at`: (segment, record number, record)
+    found = None
+    for segment in range(last, -1, -1):
+        for number, record in enumerate(iter_records(segments[segment][0])):
+            if at is not None and record[0] > at:
+                break
+            if record[1] == 0 and record[4] == name:
+                found = (segment, number, record)
+        if found is not None:
+            break
+
+    if found is None:
+        raise CharacterNotFoundError(f"No logged inventory for '{character}' at that time.")
+
+    first_segment, first_number, checkpoint = found
+    inventory = {}
+    for entry in checkpoint[5].decode().split(","):
+        if entry:
+            item_id, quantity = entry.split("=")
+            inventory[item_id] = int(quantity)
+    gold = checkpoint[3]
+
+    replayed = 0
+    for segment in range(first_segment, last + 1):
+        for number, record in enumerate(iter_records(segments[segment][0])):
+            if segment == first_segment and number <= first_number:
+                continue
+            timestamp, op_index, quantity, gold_delta, record_name, item = record
+            if at is not None and timestamp > at:
+                break
+            if op_index == 0 or record_name != name:
+                continue
+
+            op = LOG_OPS[op_index]
+            if op == "clear":
+                inventory = {}
+            elif op in OP_SIGNS:
+                item_id = item.decode()
+                held = inventory.get(item_id, 0) + OP_SIGNS[op] * quantity
+                if held:
+                    inventory[item_id] = held
+                else:
+                    inventory.pop(item_id, None)
+            gold += gold_delta
+            replayed += 1
+
+    return {'inventory': inventory, 'gold': gold, 'checkpoint': checkpoint[0], 'replayed': replayed}
+
+# ============================================================================
+# QUERY TOOL
+# ============================================================================
+
+def parse_time(text):
+    """
+    Parse a timestamp given as epoch seconds or an ISO date/time
+
+    Returns: Float seconds since the epoch
+    """
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text).timestamp()
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Query the inventory event log.")
+    parser.add_argument("--dir", default=DEFAULT_LOG_DIRECTORY)
+    parser.add_argument("--character", required=True)
+    parser.add_argument("--at", type=parse_time, help="epoch seconds or ISO time (default: now)")
+    parser.add_argument("--events", action="store_true", help="list events instead of rebuilding")
+    parser.add_argument("--op", choices=LOG_OPS[1:])
+    parser.add_argument("--start", type=parse_time)
+    args = parser.parse_args(argv)
+
+    if args.events:
+        for event in read_events(args.dir, args.character, args.op, args.start, args.at):
+            when = datetime.fromtimestamp(event['timestamp']).isoformat(sep=" ", timespec="seconds")
+            print(f"{when}  {event['op']:9} {event['item_id'] or '-':20} "
+                  f"x{event['quantity']:<4} gold {event['gold_delta']:+d}")
+        return
+
+    state = rebuild_inventory(args.dir, args.character, args.at)
+    print(f"Gold: {state['gold']}")
+    for item_id, quantity in state['inventory'].items():
+        print(f"- {item_id} x{quantity}")
+    print(f"(checkpoint + {state['replayed']} events replayed)")
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ Name: Vanessa Gray
 This module handles inventory management, item usage, and equipment.
 """
 
+from game_data import EFFECT_STATS, compile_item_effect, get_stack_size
 from custom_exceptions import (
     InventoryFullError,
     ItemNotFoundError,
@@ -17,30 +18,198 @@ from custom_exceptions import (
 # Maximum inventory size
 MAX_INVENTORY_SIZE = 20
 
+# Equipment slots; an item goes in the slot named by its type
+EQUIPMENT_SLOTS = ("weapon", "armor", "ring", "amulet")
+
+# Effective stat changed by each EFFECT_STATS entry when it comes from gear
+EQUIPMENT_STAT_KEYS = ("max_health", "max_health", "strength", "magic")
+
+# shop_pricing.PricingEngine supplying shop prices (None = fixed prices from item costs)
+pricing_engine = None
+
+# inventory_log.EventLog recording inventory and gold changes (None = not logged)
+event_log = None
+
+# ============================================================================
+# INVENTORY CONTAINER
+# ============================================================================
+
+class Inventory:
+    """
+    Counted multiset of item IDs
+    
+    Stores item_id -> quantity (in first-added order) plus running unit and
+    slot totals, so membership, counts, adds and removes are all O(1). Items
+    stack: one slot holds up to the item's stack size (game_data.get_stack_size,
+    remembered per item only while it is held; callers with the item's data
+    pass its size to slots_needed and append, and correct held items with
+    set_stack_size). It still behaves like the old list
+    where callers relied on that: `in`, len() (units), iteration (each item
+    repeated by its quantity), append, remove and count.
+    """
+
+    def __init__(self, items=()):
+        """
+        Args:
+            items: Iterable of item IDs (e.g. the list form from a save file)
+        """
+        self.counts = {}
+        self.stacks = {} # item_id -> stack size, for items held
+        self.total = 0
+        self.slots = 0
+        for item_id in items:
+            self.append(item_id)
+
+    def stack_slots(self, item_id, quantity, stack_size=None):
+        """Returns: Slots quantity units of item_id fill (stack_size for an item not held)"""
+        stack = self.stacks.get(item_id) or stack_size or get_stack_size(item_id)
+        return -(-quantity // stack)
+
+    def slots_needed(self, item_id, quantity=1, stack_size=None):
+        """Returns: Extra slots needed to add quantity units of item_id"""
+        held = self.counts.get(item_id, 0)
+        return (self.stack_slots(item_id, held + quantity, stack_size)
+                - self.stack_slots(item_id, held, stack_size))
+
+    def set_stack_size(self, item_id, stack_size):
+        """Use stack_size for a held item from now on, re-counting the slots it fills"""
+        held = self.counts.get(item_id, 0)
+        if not held: # Items not held take their size when appended
+            return
+        before = self.stack_slots(item_id, held)
+        self.stacks[item_id] = stack_size
+        self.slots += self.stack_slots(item_id, held) - before
+
+    def append(self, item_id, quantity=1, stack_size=None):
+        """Add quantity copies of an item (stack_size: size to use if it is not held yet)"""
+        if item_id not in self.stacks:
+            self.stacks[item_id] = stack_size or get_stack_size(item_id)
+        self.slots += self.slots_needed(item_id, quantity)
+        self.counts[item_id] = self.counts.get(item_id, 0) + quantity
+        self.total += quantity
+
+    def remove(self, item_id, quantity=1):
+        """
+        Remove quantity copies of an item
+        
+        Raises: ValueError if fewer than quantity copies are held (like list.remove)
+        """
+        held = self.counts.get(item_id, 0)
+        if held < quantity:
+            raise ValueError(f"{item_id} x{quantity} not in inventory")
+
+        self.slots -= self.stack_slots(item_id, held) - self.stack_slots(item_id, held - quantity)
+        if held == quantity:
+            del self.counts[item_id]
+            del self.stacks[item_id]
+        else:
+            self.counts[item_id] = held - quantity
+        self.total -= quantity
+
+    def snapshot(self):
+        """Returns: Copy of the contents for restore()"""
+        return dict(self.counts), dict(self.stacks), self.total, self.slots
+
+    def restore(self, state):
+        """Put back contents saved by snapshot()"""
+        counts, stacks, self.total, self.slots = state
+        self.counts = dict(counts)
+        self.stacks = dict(stacks)
+
+    def count(self, item_id):
+        """Returns: Quantity of item_id held"""
+        return self.counts.get(item_id, 0)
+
+    def items(self):
+        """Returns: View of (item_id, quantity) pairs"""
+        return self.counts.items()
+
+    def to_list(self):
+        """
+        Convert to the list form used by save files
+        
+        Returns: List of item IDs, each repeated by its quantity
+        """
+        return list(self)
+
+    def __contains__(self, item_id):
+        return item_id in self.counts
+
+    def __len__(self):
+        return self.total
+
+    def __iter__(self):
+        for item_id, quantity in self.counts.items():
+            for _ in range(quantity):
+                yield item_id
+
+    def __eq__(self, other):
+        if isinstance(other, Inventory):
+            return self.counts == other.counts
+        if isinstance(other, list):
+            return self.to_list() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Inventory({self.counts!r})"
+
+def get_inventory(character):
+    """
+    Get a character's inventory as an Inventory, converting a list in place
+    
+    Characters created or loaded with a plain list are converted on first
+    use, so saves and older code can keep using the list form.
+    
+    Returns: Inventory object stored in character['inventory']
+    """
+    inventory = character['inventory']
+    if not isinstance(inventory, Inventory):
+        inventory = Inventory(inventory)
+        character['inventory'] = inventory
+    return inventory
+
 # ============================================================================
 # INVENTORY MANAGEMENT
 # ============================================================================
 
-def add_item_to_inventory(character, item_id):
+def add_item_to_inventory(character, item_id, quantity=1, item_data=None):
     """
     Add an item to character's inventory
     
     Args:
         character: Character dictionary
         item_id: Unique item identifier
+        quantity: Units to add (they fill existing stacks first)
+        item_data: The item's data, if known (sets its stack size)
     
     Returns: True if added successfully
-    Raises: InventoryFullError if inventory is at max capacity
+    Raises: InventoryFullError if the new stacks would not fit
     """
-    inventory = character['inventory']
+    inventory = get_inventory(character)
+    stack_size = None
+    if item_data is not None:
+        stack_size = get_stack_size(item_id, item_data)
+        inventory.set_stack_size(item_id, stack_size)
 
 # Check inventory capacity
-    if len(inventory) >= MAX_INVENTORY_SIZE:
+    if not has_room(inventory, item_id, quantity, stack_size):
         raise InventoryFullError("Inventory is full.")
     
     # Add item to inventory
-    inventory.append(item_id)
+    inventory.append(item_id, quantity, stack_size)
+    record_event(character, "add", item_id, quantity)
     return True
+
+def has_room(inventory, item_id, quantity=1, stack_size=None):
+    """
+    Check the stacks for quantity more units of item_id fit
+    
+    stack_size is the item's stack size if it is not held yet (default:
+    game_data.get_stack_size).
+    
+    Returns: True if they fit within MAX_INVENTORY_SIZE slots
+    """
+    return inventory.slots + inventory.slots_needed(item_id, quantity, stack_size) <= MAX_INVENTORY_SIZE
     
 def remove_item_from_inventory(character, item_id):
     """
@@ -53,10 +222,13 @@ def remove_item_from_inventory(character, item_id):
     Returns: True if removed successfully
     Raises: ItemNotFoundError if item not in inventory
     """
+    inventory = get_inventory(character)
+
     # Check if item exists in inventory
-    if item_id not in character['inventory']: 
+    if item_id not in inventory: 
         raise ItemNotFoundError("Item not found in inventory.")
-    character['inventory'].remove(item_id) # Remove item
+    inventory.remove(item_id) # Remove item
+    record_event(character, "remove", item_id, 1)
     return True
     
 def has_item(character, item_id):
@@ -65,7 +237,7 @@ def has_item(character, item_id):
     
     Returns: True if item in inventory, False otherwise
     """
-    if item_id in character['inventory']: # Check presence
+    if item_id in get_inventory(character): # Check presence
         return True
     else:
         return False
@@ -77,19 +249,19 @@ def count_item(character, item_id):
     Returns: Integer count of item
     """
     #item counting
-    # Use list.count() method
-    return character['inventory'].count(item_id)
+    # Inventory.count() is a dictionary lookup
+    return get_inventory(character).count(item_id)
 
 def get_inventory_space_remaining(character):
     """
-    Calculate how many more items can fit in inventory
+    Calculate how many more stacks can fit in inventory
     
     Returns: Integer representing available slots
     """
     #space calculation
-    inventory = character['inventory']
+    inventory = get_inventory(character)
     
-    reamining = MAX_INVENTORY_SIZE - len(inventory) # Calculate remaining space
+    reamining = MAX_INVENTORY_SIZE - inventory.slots # Calculate remaining space
 
     return reamining
 
@@ -103,22 +275,25 @@ def clear_inventory(character):
     # Save current inventory before clearing
     # Clear character's inventory list
 
-    removed_items = character['inventory'][:]
-    character['inventory'] = []
+    removed_items = get_inventory(character).to_list()
+    character['inventory'] = Inventory()
+    record_event(character, "clear")
 
     return removed_items
 # ============================================================================
 # ITEM USAGE
 # ============================================================================
 
-def use_item(character, item_id, item_data):
+def use_item(character, item_id, item_data, quantity=1):
     """
-    Use a consumable item from inventory
+    Use one or more of a consumable item from inventory
     
     Args:
         character: Character dictionary
         item_id: Item to use
         item_data: Item information dictionary from game_data
+        quantity: Units to use at once; their effects are added up and
+                  applied in one step (health is still capped at max)
     
     Item types and effects:
     - consumable: Apply effect and remove from inventory
@@ -126,24 +301,29 @@ def use_item(character, item_id, item_data):
     
     Returns: String describing what happened
     Raises: 
-        ItemNotFoundError if item not in inventory
+        ItemNotFoundError if fewer than quantity units are in inventory
         InvalidItemTypeError if item type is not 'consumable'
     """
     # item usage
     
-    inventory = character['inventory']
+    inventory = get_inventory(character)
 
-    if item_id not in inventory: # Check item exists
+    if quantity < 1 or inventory.count(item_id) < quantity: # Check items exist
         raise ItemNotFoundError("Item not found in inventory.")
     
     if item_data['type'] != 'consumable': # Check item type
         raise InvalidItemTypeError("Item is not consumable.")
     
-    stat_name, value = parse_item_effect(item_data['effect']) # Parse effect
-    apply_stat_effect(character, stat_name, value) # Apply effect
-    remove_item_from_inventory(character, item_id) # Remove item
+    effect = get_item_effect(item_data) # Precompiled (stat_index, value) pairs
+    if quantity > 1:
+        effect = tuple((stat_index, value * quantity) for stat_index, value in effect)
+    apply_item_effect(character, effect) # Apply effect
+    inventory.remove(item_id, quantity) # Remove items
+    record_event(character, "use", item_id, quantity)
 
-    return f"Used {item_id}, {stat_name} increased by {value}."
+    if quantity == 1:
+        return f"Used {item_id}, {describe_item_effect(effect)}."
+    return f"Used {item_id} x{quantity}, {describe_item_effect(effect)}."
 
 def equip_weapon(character, item_id, item_data):
     """
@@ -154,10 +334,10 @@ def equip_weapon(character, item_id, item_data):
         item_id: Weapon to equip
         item_data: Item information dictionary
     
-    Weapon effect format: "strength:5" (adds 5 to strength)
+    Weapon effect format: "strength:5" (adds 5 to effective strength)
     
     If character already has weapon equipped:
-    - Unequip current weapon (remove bonus)
+    - Unequip current weapon (its bonus stops counting)
     - Add old weapon back to inventory
     
     Returns: String describing equipment change
@@ -166,37 +346,11 @@ def equip_weapon(character, item_id, item_data):
         InvalidItemTypeError if item type is not 'weapon'
     """
     # weapon equipping
-
-    inventory = character['inventory']
-
-    if item_id not in inventory: # Check item exists
-        raise ItemNotFoundError("Item not found in inventory.")
-    
     if item_data['type'] != 'weapon': # Check item type
         raise InvalidItemTypeError("Item is not a weapon.")
-    
-    # Unequip current weapon if exists
-    if 'equipped_weapon' in character and character['equipped_weapon'] is not None:
-        current_weapon_id = character['equipped_weapon']
-       
-        # Unequip current weapon
-        current_weapon_data = character['game_data']['items'][current_weapon_id]
-        current_weapon_effect = item_data['effect']  # This should ideally fetch the effect of the currently equipped weapon
-        
-        # Remove current weapon effect
-        stat_name, value = parse_item_effect(current_weapon_effect)
-        apply_stat_effect(character, stat_name, -value)  # Remove bonus
-        add_item_to_inventory(character, current_weapon_id)  # Add back to inventory
-
-    stat_name, value = parse_item_effect(item_data['effect']) # Parse new weapon effect
-    apply_stat_effect(character, stat_name, value)  # Apply new weapon bonus
-
-    character['equipped_weapon'] = item_id # Set new weapon
-    character["equippe_weapon_effect"] = item_data['effect'] # Store effect
-
-    remove_item_from_inventory(character, item_id) # Remove from inventory
 
-    return f"Equipped {item_id}, {stat_name} increased by {value}."
+    effect = equip_item(character, item_id, item_data)
+    return f"Equipped {item_id}, {describe_item_effect(effect)}."
 
 def equip_armor(character, item_id, item_data):
     """
@@ -207,10 +361,10 @@ def equip_armor(character, item_id, item_data):
         item_id: Armor to equip
         item_data: Item information dictionary
     
-    Armor effect format: "max_health:10" (adds 10 to max_health)
+    Armor effect format: "max_health:10" (adds 10 to effective max_health)
     
     If character already has armor equipped:
-    - Unequip current armor (remove bonus)
+    - Unequip current armor (its bonus stops counting)
     - Add old armor back to inventory
     
     Returns: String describing equipment change
@@ -220,33 +374,11 @@ def equip_armor(character, item_id, item_data):
     """
     # armor equipping
     # Similar to equip_weapon but for armor
-    inventory = character['inventory']
-
-    if item_id not in inventory: # Check item exists
-        raise ItemNotFoundError("Item not found in inventory.")
-    
     if item_data['type'] != 'armor': # Check item type
         raise InvalidItemTypeError("Item is not armor.")
-    
-    if 'equipped_armor' in character and character['equipped_armor'] is not None:
-        current_armor_id = character['equipped_armor'] # Get current armor ID
-
-        current_armor_data = character['game_data']['items'][current_armor_id] # Fetch current armor data
-        current_armor_effect = item_data['effect']  # This should ideally fetch the effect of the currently equipped armor
-        
-        stat_name, value = parse_item_effect(current_armor_effect) # Parse current armor effect
-        apply_stat_effect(character, stat_name, -value)  # Remove bonus
-        add_item_to_inventory(character, current_armor_id)  # Add back to inventory
-
-    stat_name, value = parse_item_effect(item_data['effect']) # Parse new armor effect
-    apply_stat_effect(character, stat_name, value)  # Apply new armor bonus
 
-    character['equipped_armor'] = item_id # Set new armor
-    character["equippe_armor_effect"] = item_data['effect'] # Store effect
-
-    remove_item_from_inventory(character, item_id)
-
-    return f"Equipped {item_data['name']}, {stat_name} increased by {value}."
+    effect = equip_item(character, item_id, item_data)
+    return f"Equipped {item_data.get('name', item_id)}, {describe_item_effect(effect)}."
 
 def unequip_weapon(character):
     """
@@ -256,56 +388,133 @@ def unequip_weapon(character):
     Raises: InventoryFullError if inventory is full
     """
     # weapon unequipping
-    if "equipped_weapon" not in character or character['equipped_weapon'] is None:
-        return None
-    
-    weapon_id = character["equipped_weapon"] # Get equipped weapon ID
+    return unequip_item(character, 'weapon')
+
+def unequip_armor(character):
+    """
+    Remove equipped armor and return it to inventory
     
-    if len(character['inventory']) >= MAX_INVENTORY_SIZE: # Check inventory space
-        raise InventoryFullError("Inventory is full.")
+    Returns: Item ID that was unequipped, or None if no armor equipped
+    Raises: InventoryFullError if inventory is full
+    """
+    # armor unequipping
+    return unequip_item(character, 'armor')
+
+# ============================================================================
+# EQUIPMENT
+# ============================================================================
+
+def get_equipment(character):
+    """
+    Get a character's equipped items
     
-    effect = character["equippe_weapon_effect"]  # Get weapon effect
+    Returns: Dictionary of {slot: item_id} for every filled slot
+    """
+    if 'equipment' not in character:
+        character['equipment'] = {}
+        character['equipment_effects'] = {}
+    return character['equipment']
 
-    stat_name,value = parse_item_effect(effect) # Parse effect
+def get_equipped_item(character, slot):
+    """
+    Returns: Item ID in the slot, or None if it is empty
+    """
+    return character.get('equipment', {}).get(slot)
+
+def equip_item(character, item_id, item_data):
+    """
+    Move an item from the inventory into the equipment slot named by its type
+    
+    Base stats are not changed; the item's compiled effect is stored with the
+    slot and counted by get_effective_stats. Anything already in the slot
+    goes back to the inventory.
+    
+    Returns: The item's compiled effect
+    Raises:
+        ItemNotFoundError if item not in inventory
+        InvalidItemTypeError if the item type is not an equipment slot
+    """
+    slot = item_data['type']
+    if slot not in EQUIPMENT_SLOTS:
+        raise InvalidItemTypeError(f"{item_id} cannot be equipped.")
 
-    apply_stat_effect(character, stat_name, -value)  # Remove bonus
+    inventory = get_inventory(character)
+    if item_id not in inventory: # Check item exists
+        raise ItemNotFoundError("Item not found in inventory.")
 
-    character['inventory'].append(weapon_id)
+    effect = get_item_effect(item_data)
+    equipment = get_equipment(character)
 
+    inventory.remove(item_id) # Frees the slot the old item goes back into
+    record_event(character, "equip", item_id, 1)
+    if slot in equipment:
+        inventory.append(equipment[slot])
+        record_event(character, "unequip", equipment[slot], 1)
 
-    character['equipped_weapon'] = None
-    character["equippe_weapon_effect"] = None
+    equipment[slot] = item_id
+    character['equipment_effects'][slot] = effect
+    gear_changed(character)
 
-    return weapon_id
+    return effect
 
-def unequip_armor(character):
+def unequip_item(character, slot):
     """
-    Remove equipped armor and return it to inventory
+    Empty an equipment slot, returning its item to the inventory
     
-    Returns: Item ID that was unequipped, or None if no armor equipped
+    Returns: Item ID that was unequipped, or None if the slot was empty
     Raises: InventoryFullError if inventory is full
     """
-    # armor unequipping
-    inventory = character['inventory']
-
-    if "equipped_armor" not in character or character['equipped_armor'] is None: # Check equipped armor
+    equipment = get_equipment(character)
+    if slot not in equipment:
         return None
-    
-    armor_id = character["equipped_armor"] # Get equipped armor ID
 
-    if len(inventory) >= MAX_INVENTORY_SIZE: # Check inventory space
+    inventory = get_inventory(character)
+    if not has_room(inventory, equipment[slot]): # Check inventory space
         raise InventoryFullError("Inventory is full.")
+
+    item_id = equipment.pop(slot)
+    del character['equipment_effects'][slot]
+    inventory.append(item_id)
+    record_event(character, "unequip", item_id, 1)
+    gear_changed(character)
+
+    return item_id
+
+def gear_changed(character):
+    """Invalidate cached stats after equipment changes and keep health within max"""
+    character['stat_version'] = character.get('stat_version', 0) + 1
+
+    max_health = get_effective_stats(character)['max_health']
+    if character['health'] > max_health:
+        character['health'] = max_health
+
+def get_effective_stats(character):
+    """
+    Get base stats plus every equipped item's bonuses
+    
+    The result is cached on the character and only rebuilt when
+    'stat_version' changes (equipment changes, level-ups and permanent
+    stat items bump it). Bonuses to health count toward max_health.
     
-    effect = character["equipped_armor_effect"]  # Get armor effect
- 
-    stat_name,value = parse_item_effect(effect) # Parse effect
-    apply_stat_effect(character, stat_name, -value)  # Remove bonus
+    Returns: Dictionary with max_health, strength and magic
+    """
+    version = character.get('stat_version', 0)
+    stats = character.get('effective_stats')
+    if stats is not None and character.get('effective_version') == version:
+        return stats
 
-    inventory.append(armor_id) # Add armor back to inventory
-    character['equipped_armor'] = None
-    character["equipped_armor_effect"] = None
+    stats = {
+        'max_health': character['max_health'],
+        'strength': character['strength'],
+        'magic': character['magic']
+    }
+    for effect in character.get('equipment_effects', {}).values():
+        for stat_index, value in effect:
+            stats[EQUIPMENT_STAT_KEYS[stat_index]] += value
 
-    return armor_id
+    character['effective_stats'] = stats
+    character['effective_version'] = version
+    return stats
 
 # ============================================================================
 # SHOP SYSTEM
@@ -327,17 +536,21 @@ def purchase_item(character, item_id, item_data):
     """
     # purchasing
 
-    cost = item_data['cost'] # Get item cost
-    inventory = character['inventory'] # Get inventory
+    cost = get_buy_price(item_data) # Get item cost
+    inventory = get_inventory(character) # Get inventory
 
     if character['gold'] < cost: # Check gold
         raise InsufficientResourcesError("Not enough gold to purchase item.")
     
-    if len(inventory) >= MAX_INVENTORY_SIZE: # Check inventory space
+    stack_size = get_stack_size(item_id, item_data)
+    inventory.set_stack_size(item_id, stack_size)
+    if not has_room(inventory, item_id, 1, stack_size): # Check inventory space
         raise InventoryFullError("Inventory is full.")
     
     character['gold'] -= cost # Deduct gold
-    inventory.append(item_id)
+    inventory.append(item_id, 1, stack_size)
+    record_trade(item_data, bought=1)
+    record_event(character, "buy", item_id, 1, -cost)
 
     return True
 
@@ -355,18 +568,181 @@ def sell_item(character, item_id, item_data):
     """
     # selling
     
-    inventory = character['inventory']
+    inventory = get_inventory(character)
 
-    if item_id not in character['inventory']: # Check item exists
+    if item_id not in inventory: # Check item exists
         raise ItemNotFoundError("Item not found in inventory.") 
     
-    sell_price = item_data['cost'] // 2 # Calculate sell price
+    sell_price = get_sell_price(item_data) # Calculate sell price
     inventory.remove(item_id)
 
     character['gold'] += sell_price # Add gold to character
+    record_trade(item_data, sold=1)
+    record_event(character, "sell", item_id, 1, sell_price)
 
     return sell_price
 
+def set_pricing_engine(engine):
+    """
+    Use a shop_pricing.PricingEngine for shop prices (None restores fixed prices)
+    
+    Returns: The previous engine
+    """
+    global pricing_engine
+    previous = pricing_engine
+    pricing_engine = engine
+    return previous
+
+def set_event_log(log):
+    """
+    Record inventory and gold changes to an inventory_log.EventLog (None stops logging)
+    
+    Returns: The previous log
+    """
+    global event_log
+    previous = event_log
+    event_log = log
+    return previous
+
+def record_event(character, op, item_id="", quantity=0, gold_delta=0, checkpoint=True):
+    """
+    Report one inventory or gold change to the event log, if there is one
+    
+    Args:
+        checkpoint: False if the character already reflects later changes
+                    (see inventory_log.EventLog.record)
+    """
+    if event_log is not None:
+        event_log.record(character, op, item_id, quantity, gold_delta, checkpoint)
+
+def get_buy_price(item_data):
+    """Returns: Gold the shop charges for one of the item (current market price if priced)"""
+    item_id = item_data.get('item_id')
+    if pricing_engine is not None and item_id in pricing_engine:
+        return pricing_engine.buy_price(item_id)
+    return item_data['cost']
+
+def get_sell_price(item_data):
+    """Returns: Gold the shop pays for one of the item (half its price)"""
+    item_id = item_data.get('item_id')
+    if pricing_engine is not None and item_id in pricing_engine:
+        return pricing_engine.sell_price(item_id)
+    return item_data['cost'] // 2
+
+def record_trade(item_data, bought=0, sold=0):
+    """Report traded units to the pricing engine, if there is one"""
+    if pricing_engine is None:
+        return
+    item_id = item_data.get('item_id')
+    if bought:
+        pricing_engine.record_buy(item_id, bought)
+    if sold:
+        pricing_engine.record_sell(item_id, sold)
+
+def process_transaction(character, item_data_dict, buys=(), sells=()):
+    """
+    Apply a whole cart of purchases and sales at once, or none of it
+    
+    Everything is validated before anything changes, with one gold check
+    and one capacity check for the whole cart. Sales are counted first,
+    so their gold and freed slots can pay for the purchases. If applying
+    the cart fails anyway, gold and inventory are restored.
+    
+    Args:
+        character: Character dictionary
+        item_data_dict: Dictionary of all item data
+        buys: List of (item_id, quantity) to purchase
+        sells: List of (item_id, quantity) to sell
+    
+    Returns: Receipt dictionary:
+             {'lines': [{'action': 'buy'|'sell', 'item_id', 'quantity',
+                         'unit_price', 'total'}, ...],
+              'gold_spent': int, 'gold_earned': int, 'gold_after': int}
+    Raises:
+        ItemNotFoundError if an item does not exist or is not held in the quantity sold
+        InsufficientResourcesError if the cart costs more gold than the character has
+        InventoryFullError if the purchases would not fit
+        ValueError if a quantity is not positive
+    """
+    inventory = get_inventory(character)
+    lines = []
+    selling = {} # item_id -> quantity sold in this cart
+    changes = {} # item_id -> net change in quantity
+    gold_spent = 0
+    gold_earned = 0
+
+    for action, entries in (('sell', sells), ('buy', buys)):
+        for item_id, quantity in entries:
+            if quantity < 1:
+                raise ValueError("Quantity must be at least 1.")
+            if item_id not in item_data_dict:
+                raise ItemNotFoundError(f"Item '{item_id}' does not exist.")
+
+            item_data = item_data_dict[item_id]
+            if action == 'sell':
+                selling[item_id] = selling.get(item_id, 0) + quantity
+                if inventory.count(item_id) < selling[item_id]:
+                    raise ItemNotFoundError(f"Not enough {item_id} in inventory to sell.")
+                unit_price = get_sell_price(item_data)
+                gold_earned += unit_price * quantity
+                changes[item_id] = changes.get(item_id, 0) - quantity
+            else:
+                unit_price = get_buy_price(item_data)
+                gold_spent += unit_price * quantity
+                changes[item_id] = changes.get(item_id, 0) + quantity
+
+            lines.append({'action': action, 'item_id': item_id, 'quantity': quantity,
+                          'unit_price': unit_price, 'total': unit_price * quantity})
+
+    if character['gold'] + gold_earned < gold_spent: # Single gold check
+        raise InsufficientResourcesError("Not enough gold for this cart.")
+
+    stack_sizes = {item_id: get_stack_size(item_id, item_data_dict[item_id]) for item_id in changes}
+    for item_id, stack_size in stack_sizes.items():
+        inventory.set_stack_size(item_id, stack_size)
+
+    slots_after = inventory.slots # Single capacity check, counting stacks
+    for item_id, change in changes.items():
+        held = inventory.count(item_id)
+        slots_after += (inventory.stack_slots(item_id, held + change, stack_sizes[item_id])
+                        - inventory.stack_slots(item_id, held, stack_sizes[item_id]))
+    if slots_after > MAX_INVENTORY_SIZE:
+        raise InventoryFullError("Not enough inventory space for this cart.")
+
+    gold_before = character['gold']
+    contents_before = inventory.snapshot()
+
+    try:
+        for line in lines:
+            if line['action'] == 'sell':
+                inventory.remove(line['item_id'], line['quantity'])
+            else:
+                inventory.append(line['item_id'], line['quantity'], stack_sizes[line['item_id']])
+        character['gold'] = gold_before + gold_earned - gold_spent
+
+        for line in lines: # Only once the whole cart has gone through
+            if line['action'] == 'sell':
+                record_trade(item_data_dict[line['item_id']], sold=line['quantity'])
+            else:
+                record_trade(item_data_dict[line['item_id']], bought=line['quantity'])
+    except Exception: # Roll back to the state before the cart
+        inventory.restore(contents_before)
+        character['gold'] = gold_before
+        raise
+
+    last = len(lines) - 1
+    for number, line in enumerate(lines): # Only the last line matches the character's state
+        gold_delta = line['total'] if line['action'] == 'sell' else -line['total']
+        record_event(character, line['action'], line['item_id'], line['quantity'], gold_delta,
+                     checkpoint=number == last)
+
+    return {
+        'lines': lines,
+        'gold_spent': gold_spent,
+        'gold_earned': gold_earned,
+        'gold_after': character['gold']
+    }
+
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
@@ -380,6 +756,8 @@ def parse_item_effect(effect_string):
     
     Returns: Tuple of (stat_name, value)
     Example: "health:20" → ("health", 20)
+    
+    Item usage and equipment use get_item_effect instead, which parses once.
     """
     # effect parsing
     
@@ -395,21 +773,60 @@ def parse_item_effect(effect_string):
     
     return stat_name, value
 
+def get_item_effect(item_data):
+    """
+    Get an item's compiled effect
+    
+    Items from game_data.load_items are compiled at load time; other item
+    dictionaries are compiled on first use and cached in the same field.
+    
+    Returns: Tuple of (stat_index, value) tuples (see game_data.compile_item_effect)
+    """
+    effect = item_data.get('compiled_effect')
+    if effect is None:
+        effect = compile_item_effect(item_data['effect'])
+        item_data['compiled_effect'] = effect
+    return effect
+
+def apply_item_effect(character, effect, sign=1):
+    """
+    Apply every stat change of a compiled effect
+    
+    Args:
+        effect: Tuple of (stat_index, value) tuples
+        sign: 1 to apply the effect, -1 to take it back off
+    """
+    for stat_index, value in effect:
+        apply_stat_effect(character, stat_index, sign * value)
+
+def describe_item_effect(effect):
+    """
+    Returns: Text such as "strength increased by 5, magic increased by 3"
+    """
+    return ", ".join(f"{EFFECT_STATS[stat_index]} increased by {value}" for stat_index, value in effect)
+
 def apply_stat_effect(character, stat_name, value):
     """
     Apply a stat modification to character
     
     Valid stats: health, max_health, strength, magic
+    stat_name may also be an index into EFFECT_STATS (the compiled form)
     
-    Note: health cannot exceed max_health
+    Note: health cannot exceed (effective) max_health
     """
     # stat application
+    if isinstance(stat_name, int):
+        stat_name = EFFECT_STATS[stat_name]
     
     character[stat_name] += value
 
     if stat_name == 'health': # Ensure health does not exceed max_health
-        if character['health'] > character['max_health']:
-            character['health'] = character['max_health']
+        max_health = get_effective_stats(character)['max_health'] if 'equipment' in character \
+            else character['max_health']
+        if character['health'] > max_health:
+            character['health'] = max_health
+    else: # Tell running battles their damage tables are stale
+        character['stat_version'] = character.get('stat_version', 0) + 1
 
 def display_inventory(character, item_data_dict):
     """
@@ -423,7 +840,7 @@ def display_inventory(character, item_data_dict):
     """
     # inventory display
 
-    inventory = character['inventory']
+    inventory = get_inventory(character)
 
     print("\n=== Inventory ===")
 
@@ -431,14 +848,7 @@ def display_inventory(character, item_data_dict):
         print("Inventory is empty.")
         return
     
-    item_counts = {} # Count items
-    for item_id in inventory: # Tally items
-        if item_id in item_counts:
-            item_counts[item_id] += 1
-        else:
-            item_counts[item_id] = 1
-    
-    for item_id, count in item_counts.items(): # Display each item
+    for item_id, count in inventory.items(): # Quantities are already tallied
         item_name = item_data_dict[item_id]['name'] # Get item name
         item_type = item_data_dict[item_id]['type'] # Get item type
         print(f"{item_name} (Type: {item_type}) x{count}")
@@ -16,6 +16,10 @@ import inventory_system
 import quest_handler
 import combat_system
 import game_data
+import shop_catalog
+import shop_pricing
+import stash_system
+import inventory_log
 from custom_exceptions import *
 
 # ============================================================================
@@ -26,6 +30,8 @@ from custom_exceptions import *
 current_character = None
 all_quests = {}
 all_items = {}
+shop_index = None # shop_catalog.ShopCatalog over all_items
+current_stash = None # stash_system.Stash of the current character, opened on first visit
 game_running = False
 
 # ============================================================================
@@ -200,6 +206,8 @@ def game_loop():
         elif choice == 5:
             shop()
         elif choice == 6:
+            stash()
+        elif choice == 7:
             save_game()
             print("Game saved. Exiting to main menu.")
             game_running = False
@@ -216,9 +224,10 @@ def game_menu():
     3. Quest Menu
     4. Explore (Find Battles)
     5. Shop
-    6. Save and Quit
+    6. Stash
+    7. Save and Quit
     
-    Returns: Integer choice (1-6)
+    Returns: Integer choice (1-7)
     """
     # game menu
     print("\n=== Game Menu ===")
@@ -227,12 +236,13 @@ def game_menu():
     print("3. Quest Menu")
     print("4. Explore (Find Battles)")
     print("5. Shop")
-    print("6. Save and Quit")
+    print("6. Stash")
+    print("7. Save and Quit")
 
-    answer = input("Enter your choice (1-6): ").strip()
-    while answer not in ['1', '2', '3', '4', '5', '6']:
-        print("Invalid choice. Please select a number between 1 and 6.")
-        answer = input("Enter your choice (1-6): ").strip()
+    answer = input("Enter your choice (1-7): ").strip()
+    while answer not in ['1', '2', '3', '4', '5', '6', '7']:
+        print("Invalid choice. Please select a number between 1 and 7.")
+        answer = input("Enter your choice (1-7): ").strip()
 
     return int(answer)
 # ============================================================================
@@ -249,16 +259,19 @@ def view_character_stats():
     # Show quest progress using quest_handler
 
     character = current_character
+    stats = inventory_system.get_effective_stats(character) # Base stats plus gear
 
     print("\n=== Character Stats ===")
     print(f"Name: {character['name']}")
     print(f"Class: {character['class']}")
     print(f"Level: {character['level']}")
-    print(f"Health: {character['health']}/{character['max_health']}")
-    print(f"Strength: {character['strength']}")
-    print(f"Experience: {character['xp']}")
+    print(f"Health: {character['health']}/{stats['max_health']}")
+    print(f"Strength: {stats['strength']} (base {character['strength']})")
+    print(f"Experience: {character['experience']}")
     print(f"Gold: {character['gold']}")
-    print(f"Magic: {character['magic']}")
+    print(f"Magic: {stats['magic']} (base {character['magic']})")
+    for slot, item_id in inventory_system.get_equipment(character).items():
+        print(f"{slot.title()}: {item_id}")
     print(f"Active Quests: {len(character['active_quests'])}")
     print(f"Completed Quests: {len(character['completed_quests'])}")
 
@@ -329,84 +342,173 @@ def explore():
     
     print("\n=== Battle Result ===")
 
-    if result['victory'] == "player":
+    if result['winner'] == "player":
         print("You have defeated the enemy!")
         print(f"XP Gained: {result['xp_gained']}")
         print(f"Gold Gained: {result['gold_gained']}")
 
-    elif result['victory'] == "enemy":
+    elif result['winner'] == "enemy":
         print("You have been defeated...")
         handle_character_death()    
         return
     else:
         print("The battle has ended without a victor.")
 
+    if inventory_system.pricing_engine is not None: # Shop prices move once per outing
+        inventory_system.pricing_engine.tick()
+
     input("Press Enter to continue...")
 
 def shop():
     """Shop menu for buying/selling items"""
-    global current_character, all_items
+    global current_character, all_items, shop_index
+    if shop_index is None:
+        shop_index = shop_catalog.ShopCatalog(all_items)
+
+    filters = {} # Keyword arguments for ShopCatalog.query
+    page = 1
+
     while True:
+        listing = shop_index.query(page=page, **filters)
+
         print("\n=== Shop Menu ===")
         print(f"Current Gold: {current_character['gold']}")
-        print("Available Items:")
+        print(f"Available Items (page {listing['page']} of {max(listing['pages'], 1)}, "
+              f"{listing['total']} items):")
 
-        for item_name, item_info in all_items.items():
-            print(f"- {item_name}: {item_info['cost']} gold")
+        for item_info in listing['items']:
+            print(f"- {item_info['item_id']}: {inventory_system.get_buy_price(item_info)} gold")
 
         print("1. Buy Items")
         print("2. Sell Items")
         print("3. Back to Game Menu")
+        print("4. Next Page")
+        print("5. Previous Page")
+        print("6. Filter Items")
         
-        answer = input("Enter your choice (1-3): ").strip()
+        answer = input("Enter your choice (1-6): ").strip()
         
-        if answer == '1':
-            item_id = input("Enter the name of the item to buy: ").strip()
-
-            if item_id not in all_items:
-                print("Item does not exist in shop.")
-                continue
-
-            item_data = all_items[item_id]
+        if answer in ('1', '2'):
+            action = "buy" if answer == '1' else "sell"
+            text = input(f"Enter the items to {action} (e.g. health_potion x3, iron_sword): ")
 
             try:
-                inventory_system.purchase_item(current_character, item_id, item_data)
-                print(f"Purchased {item_data['name']}!")
+                cart = parse_cart(text)
+                if action == "buy":
+                    receipt = inventory_system.process_transaction(current_character, all_items, buys=cart)
+                else:
+                    receipt = inventory_system.process_transaction(current_character, all_items, sells=cart)
+            except ValueError:
+                print("Could not read that list of items.")
+                continue
+            except ItemNotFoundError as e:
+                print(e)
+                continue
             except InsufficientResourcesError:
                 print("You do not have enough gold.")
+                continue
             except InventoryFullError:
                 print("Your inventory is full.")
+                continue
 
+            print_receipt(receipt)
             input("\nPress ENTER to continue...")
-            continue
 
-        elif answer == '2':
-            item_id = input("Enter the name of the item to sell: ").strip()
+        elif answer == '3':
+            break
+
+        elif answer == '4':
+            if page < listing['pages']:
+                page += 1
 
-            if item_id not in all_items:
-                print("Item does not exist in shop.")
-                continue
+        elif answer == '5':
+            if page > 1:
+                page -= 1
 
-            item_data = all_items[item_id]
+        elif answer == '6':
             try:
-                gold = inventory_system.sell_item(current_character, item_id, item_data)
-                print(f"Sold {item_data['name']} for {gold} gold!")
-                
-            except ItemNotFoundError:
-                print("You do not have that item in your inventory.")
-
-        elif answer == '3':
-            break
+                filters = ask_shop_filters()
+            except ValueError:
+                print("Costs must be whole numbers.")
+            page = 1
 
         else:
-            print("Invalid choice. Please select 1, 2, or 3.")
+            print("Invalid choice. Please select 1 to 6.")
 
     #  shop
     # Show available items for purchase
     # Show current gold
     # Options: Buy item, Sell item, Back
     # Handle exceptions from inventory_system
-    
+
+def stash():
+    """Stash menu for storing items outside the inventory"""
+    global current_character, current_stash
+
+    account = current_character['name']
+    if current_stash is None or current_stash.account != account:
+        try:
+            current_stash = stash_system.open_stash(account)
+        except (SaveFileCorruptedError, InvalidSaveDataError):
+            print("Error: The stash could not be opened.")
+            return
+
+    page = 0
+    while True:
+        print("\n=== Stash ===")
+        print(f"Free slots: {current_stash.free_slots()}")
+        if current_stash.page_count:
+            page = min(page, current_stash.page_count - 1)
+            print(f"Page {page + 1} of {current_stash.page_count}:")
+            try:
+                for item_id, quantity in current_stash.view_page(page):
+                    print(f"- {item_id} x{quantity}")
+            except (SaveFileCorruptedError, InvalidSaveDataError):
+                print("This page could not be read.")
+        else:
+            print("The stash is empty.")
+
+        print("1. Deposit Items")
+        print("2. Withdraw Items")
+        print("3. Back to Game Menu")
+        print("4. Next Page")
+        print("5. Previous Page")
+
+        answer = input("Enter your choice (1-5): ").strip()
+
+        if answer in ('1', '2'):
+            action = "deposit" if answer == '1' else "withdraw"
+            text = input(f"Enter the items to {action} (e.g. health_potion x3, iron_sword): ")
+            try:
+                for item_id, quantity in parse_cart(text):
+                    if action == "deposit":
+                        current_stash.deposit(current_character, item_id, quantity,
+                                              all_items.get(item_id))
+                        print(f"Deposited {item_id} x{quantity}.")
+                    else:
+                        current_stash.withdraw(current_character, item_id, quantity,
+                                               all_items.get(item_id))
+                        print(f"Withdrew {item_id} x{quantity}.")
+            except ValueError:
+                print("Could not read that list of items.")
+            except ItemNotFoundError as e:
+                print(e)
+            except InventoryFullError as e:
+                print(e)
+
+        elif answer == '3':
+            break
+
+        elif answer == '4':
+            if page < current_stash.page_count - 1:
+                page += 1
+
+        elif answer == '5':
+            if page > 0:
+                page -= 1
+
+        else:
+            print("Invalid choice. Please select 1 to 5.")
 
 # ============================================================================
 # HELPER FUNCTIONS
@@ -414,7 +516,7 @@ def shop():
 
 def save_game():
     """Save current game state"""
-    global current_character
+    global current_character, current_stash
     
     #  save
     # Use character_manager.save_character()
@@ -425,15 +527,75 @@ def save_game():
     
     try: 
         character_manager.save_character(current_character)
+        if current_stash is not None:
+            current_stash.flush() # Writes only the stash pages that changed
+        if inventory_system.event_log is not None:
+            inventory_system.event_log.flush()
         print(f"Character '{current_character['name']}' saved successfully!")
     except PermissionError:
         print("Error: Permission denied while saving the character.")
     except IOError: 
         print("Error: An I/O error occurred while saving the character.")
 
+def parse_cart(text):
+    """
+    Parse shop input such as "health_potion x3, iron_sword"
+    
+    Returns: List of (item_id, quantity)
+    Raises: ValueError if a quantity is not a positive number
+    """
+    cart = []
+    for entry in text.split(","):
+        entry = entry.strip()
+        if entry == "":
+            continue
+
+        item_id, _, quantity = entry.partition(" x")
+        quantity = int(quantity) if quantity else 1
+        if quantity < 1:
+            raise ValueError("Quantity must be at least 1.")
+        cart.append((item_id.strip(), quantity))
+    return cart
+
+def ask_shop_filters():
+    """
+    Ask for shop filters; blank answers leave a filter off
+    
+    Returns: Keyword arguments for ShopCatalog.query
+    Raises: ValueError if a cost is not a number
+    """
+    filters = {}
+
+    item_type = input("Type (weapon/armor/ring/amulet/consumable): ").strip()
+    if item_type:
+        filters['item_type'] = item_type
+
+    prefix = input("Name starts with: ").strip()
+    if prefix:
+        filters['prefix'] = prefix
+
+    max_cost = input("Maximum price: ").strip()
+    if max_cost:
+        filters['max_cost'] = int(max_cost)
+
+    sort = input("Sort by (cost/cost_desc/name): ").strip()
+    if sort in shop_catalog.SORT_ORDERS:
+        filters['sort'] = sort
+
+    return filters
+
+def print_receipt(receipt):
+    """Display a receipt from inventory_system.process_transaction"""
+    print("\n=== Receipt ===")
+    for line in receipt['lines']:
+        print(f"{line['action'].title():5} {line['item_id']} x{line['quantity']} "
+              f"@ {line['unit_price']} = {line['total']} gold")
+    print(f"Spent: {receipt['gold_spent']}  Earned: {receipt['gold_earned']}  "
+          f"Gold now: {receipt['gold_after']}")
+
 def load_game_data():
     """Load all quest and item data from files"""
-    global all_quests, all_items
+    global all_quests, all_items, shop_index
     
     # data loading
     # Try to load quests with game_data.load_quests()
@@ -454,6 +616,17 @@ def load_game_data():
         print(f"Error loading game data: {e}")
         raise
 
+    try:
+        quest_handler.validate_quest_prerequisites(all_quests) # Also builds the quest index
+    except (QuestNotFoundError, InvalidDataFormatError) as e:
+        print(f"Error loading game data: {e}")
+        raise
+
+    shop_index = shop_catalog.ShopCatalog(all_items) # Index once per load
+    inventory_system.set_pricing_engine(shop_pricing.PricingEngine(all_items))
+    if inventory_system.event_log is None: # Audit trail of inventory and gold changes
+        inventory_system.set_event_log(inventory_log.EventLog())
+
 def handle_character_death():
     """Handle character death"""
     global current_character, game_running
@@ -476,7 +649,7 @@ def handle_character_death():
                 game_running = False
                 return
 
-            current_character['gold'] -= 50
+            character_manager.add_gold(current_character, -50) # Logged like any gold change
 
             try:
                 character_manager.revive_character(current_character, cost=50)
@@ -9,14 +9,373 @@ AI Usage: AI was used to help generate the initial structure and functions of th
 This module handles quest management, dependencies, and completion.
 """
 
+import heapq
+import zlib
+from bisect import bisect_left, bisect_right
+from collections import deque
+
+from game_data import quest_ids, quest_numbers, intern_quest_id, load_quests
+from inventory_system import record_event
 from custom_exceptions import (
     QuestNotFoundError,
     QuestRequirementsNotMetError,
     QuestAlreadyCompletedError,
     QuestNotActiveError,
-    InsufficientLevelError
+    InsufficientLevelError,
+    InvalidDataFormatError
 )
 
+# Index over the quest data last used (see get_quest_index)
+quest_index = None
+
+# Levels per band in the completion statistics (1-5, 6-10, ...)
+LEVEL_BAND_SIZE = 5
+
+# ============================================================================
+# QUEST STATE
+# ============================================================================
+
+class QuestSet:
+    """
+    Set of quest IDs stored as an int bitset over interned quest numbers
+    
+    Membership, add and remove are single bit operations, and two sets can
+    be combined with | and &. It still behaves like the old list where
+    callers relied on that: `in`, len(), iteration (in quest number order),
+    append and remove. `version` changes on every add and remove.
+    """
+
+    def __init__(self, quests=()):
+        self.bits = 0
+        self.version = 0
+        for quest_id in quests:
+            self.append(quest_id)
+
+    def append(self, quest_id):
+        """Add a quest (adding one already in the set does nothing)"""
+        self.bits |= 1 << intern_quest_id(quest_id)
+        self.version += 1
+
+    def remove(self, quest_id):
+        """
+        Remove a quest
+        
+        Raises: ValueError if the quest is not in the set (like list.remove)
+        """
+        if quest_id not in self:
+            raise ValueError(f"{quest_id} not in quest set")
+        self.bits ^= 1 << quest_numbers[quest_id]
+        self.version += 1
+
+    def to_list(self):
+        """Returns: List of quest IDs"""
+        return list(self)
+
+    def to_code(self):
+        """
+        Encode for a save file as "~<hex bits>.<checksum>"
+        
+        The checksum covers the interned IDs the bits refer to. Saves store
+        those IDs too (see get_quest_id_table), so a save made under another
+        quest numbering can be remapped by ID when it is loaded.
+        
+        Returns: String (empty for an empty set)
+        """
+        if not self.bits:
+            return ""
+        return f"~{self.bits:x}.{quest_id_checksum(self.bits.bit_length()):08x}"
+
+    @classmethod
+    def from_code(cls, code, saved_ids=None):
+        """
+        Decode a to_code() string
+        
+        The bits are used as they are when this run numbers quests the same
+        way as the run that saved them; otherwise each bit is mapped back to
+        its quest ID through saved_ids.
+        
+        Args:
+            saved_ids: Quest IDs by number when the code was saved (None for
+                       saves that did not store them)
+        
+        Returns: QuestSet
+        Raises: ValueError if the code is malformed, or the numbering changed and
+                saved_ids is missing or does not match the checksum
+        """
+        bits_text, checksum_text = code[1:].split(".", 1)
+        bits = int(bits_text, 16)
+        checksum = int(checksum_text, 16)
+        count = bits.bit_length()
+
+        quest_set = cls()
+        if checksum == quest_id_checksum(count):
+            quest_set.bits = bits
+            return quest_set
+
+        if saved_ids is None or len(saved_ids) < count or \
+                zlib.crc32("\n".join(saved_ids[:count]).encode()) != checksum:
+            raise ValueError("Quest data does not match the saved quest numbers.")
+
+        while bits: # Remap by ID
+            low = bits & -bits
+            quest_set.append(saved_ids[low.bit_length() - 1])
+            bits ^= low
+        return quest_set
+
+    def __contains__(self, quest_id):
+        number = quest_numbers.get(quest_id)
+        return number is not None and bool(self.bits >> number & 1)
+
+    def __len__(self):
+        return self.bits.bit_count()
+
+    def __iter__(self):
+        bits = self.bits
+        while bits:
+            low = bits & -bits
+            yield quest_ids[low.bit_length() - 1]
+            bits ^= low
+
+    def __eq__(self, other):
+        if isinstance(other, QuestSet):
+            return self.bits == other.bits
+        if isinstance(other, (list, set, tuple)):
+            return len(self) == len(set(other)) and all(quest_id in self for quest_id in other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"QuestSet({self.to_list()!r})"
+
+def quest_id_checksum(count):
+    """Returns: CRC32 of the first count interned quest IDs"""
+    if count > len(quest_ids):
+        return -1 # Numbers this run has never assigned
+    return zlib.crc32("\n".join(quest_ids[:count]).encode())
+
+def get_quest_id_table(*quest_sets):
+    """
+    Get the interned quest IDs that the given sets' bits refer to
+    
+    Returns: List of quest IDs by number, up to the highest bit any set uses
+    """
+    count = max((quest_set.bits.bit_length() for quest_set in quest_sets), default=0)
+    return quest_ids[:count]
+
+def get_quest_set(character, key):
+    """
+    Get character[key] ('active_quests' or 'completed_quests') as a QuestSet
+    
+    Plain lists (new or loaded characters) are converted the first time.
+    
+    Returns: QuestSet
+    """
+    quests = character[key]
+    if not isinstance(quests, QuestSet):
+        quests = QuestSet(quests)
+        character[key] = quests
+    return quests
+
+# ============================================================================
+# QUEST INDEX
+# ============================================================================
+
+class QuestIndex:
+    """
+    Prerequisite graph of a quest dictionary, built once
+    
+    Every quest gets a position in topological order (prerequisites first),
+    and ancestors / descendants are int bitsets over those positions
+    (worked out once per quest, when first asked for), so "is A required
+    for B" is a single bit test and a whole unlock set is read without
+    walking the graph. Quests are also indexed by required level.
+    """
+
+    def __init__(self, quest_data_dict):
+        """
+        Args:
+            quest_data_dict: Dictionary of all quest data
+        Raises: InvalidDataFormatError if the prerequisites form a cycle
+        """
+        self.quests = quest_data_dict
+        self.size = len(quest_data_dict)
+        self.parent = {} # quest_id -> prerequisite quest_id, or None
+        self.children = {quest_id: [] for quest_id in quest_data_dict}
+        self.missing = {} # quest_id -> prerequisite that is not a known quest
+
+        for quest_id, quest_data in quest_data_dict.items():
+            prerequisite = quest_data['prerequisite']
+            if prerequisite == "NONE":
+                self.parent[quest_id] = None
+            elif prerequisite not in quest_data_dict:
+                self.parent[quest_id] = None
+                self.missing[quest_id] = prerequisite
+            else:
+                self.parent[quest_id] = prerequisite
+                self.children[prerequisite].append(quest_id)
+
+        # Topological order (Kahn); quests left over are on a cycle
+        self.order = []
+        self.depth = {}
+        queue = deque(quest_id for quest_id, parent in self.parent.items() if parent is None)
+        for quest_id in queue:
+            self.depth[quest_id] = 0
+        while queue:
+            quest_id = queue.popleft()
+            self.order.append(quest_id)
+            for child in self.children[quest_id]:
+                self.depth[child] = self.depth[quest_id] + 1
+                queue.append(child)
+
+        if len(self.order) < self.size:
+            raise InvalidDataFormatError(f"Quest prerequisites form a cycle: {self.find_cycle()}.")
+
+        self.position = {quest_id: i for i, quest_id in enumerate(self.order)}
+
+        # Transitive bitsets, filled in per quest on first use (all of them up
+        # front would be O(n^2) bits for long chains of a large quest file)
+        self.ancestor_bits = {} # quest_id -> bitset of every quest required before it
+        self.descendant_bits = {} # quest_id -> bitset of every quest it leads to
+
+        # Quest IDs sorted by required level, with a parallel level list for bisect
+        self.by_level = sorted(self.order, key=lambda quest_id: quest_data_dict[quest_id]['required_level'])
+        self.levels = [quest_data_dict[quest_id]['required_level'] for quest_id in self.by_level]
+
+        self.level_buckets = {} # required_level -> quest IDs
+        for quest_id, level in zip(self.by_level, self.levels):
+            self.level_buckets.setdefault(level, []).append(quest_id)
+
+        # Checksum of everything the quest statistics count (see get_quest_stats)
+        self.stats_version = zlib.crc32("\n".join(
+            f"{quest_id}:{quest['reward_xp']}:{quest['reward_gold']}:{quest['required_level']}"
+            for quest_id, quest in quest_data_dict.items()).encode())
+
+    def find_cycle(self):
+        """Returns: Text such as "a -> b -> a" for one prerequisite cycle"""
+        placed = set(self.order)
+        start = next(quest_id for quest_id in self.parent if quest_id not in placed)
+        seen = []
+        while start not in seen: # Walk prerequisites until one repeats
+            seen.append(start)
+            start = self.parent[start]
+        cycle = seen[seen.index(start):] + [start]
+        return " -> ".join(reversed(cycle))
+
+    def quests_in(self, bits):
+        """Returns: Quest IDs of the set bits, in topological order"""
+        quest_ids = []
+        while bits:
+            low = bits & -bits
+            quest_ids.append(self.order[low.bit_length() - 1])
+            bits ^= low
+        return quest_ids
+
+    def level_band(self, above_level, up_to_level):
+        """Returns: Quest IDs with above_level < required_level <= up_to_level"""
+        return self.by_level[bisect_right(self.levels, above_level):bisect_right(self.levels, up_to_level)]
+
+    def level_range(self, min_level, max_level):
+        """Returns: Quest IDs with min_level <= required_level <= max_level, lowest level first"""
+        if min_level == max_level:
+            return list(self.level_buckets.get(min_level, ()))
+        return self.by_level[bisect_left(self.levels, min_level):bisect_right(self.levels, max_level)]
+
+    def ancestors(self, quest_id):
+        """Returns: Bitset of every quest required (directly or not) before quest_id"""
+        bits = self.ancestor_bits.get(quest_id)
+        if bits is not None:
+            return bits
+
+        path = [] # quest_id and its prerequisites up to the first cached one
+        current = quest_id
+        while current is not None and current not in self.ancestor_bits:
+            path.append(current)
+            current = self.parent[current]
+
+        for current in reversed(path): # Each parent is cached (or None) by now
+            parent = self.parent[current]
+            bits = 0 if parent is None else self.ancestor_bits[parent] | (1 << self.position[parent])
+            self.ancestor_bits[current] = bits
+        return bits
+
+    def descendants(self, quest_id):
+        """Returns: Bitset of every quest that quest_id leads to"""
+        stack = [quest_id]
+        while stack: # Children are finished before their parent
+            current = stack[-1]
+            if current in self.descendant_bits:
+                stack.pop()
+                continue
+            pending = [child for child in self.children[current] if child not in self.descendant_bits]
+            if pending:
+                stack.extend(pending)
+                continue
+            bits = 0
+            for child in self.children[current]:
+                bits |= self.descendant_bits[child] | (1 << self.position[child])
+            self.descendant_bits[current] = bits
+            stack.pop()
+        return self.descendant_bits[quest_id]
+
+    def requires(self, quest_id, prerequisite_id):
+        """Returns: True if prerequisite_id must be completed (directly or not) before quest_id"""
+        return bool(self.ancestors(quest_id) >> self.position[prerequisite_id] & 1)
+
+def build_quest_index(quest_data_dict):
+    """
+    Build the prerequisite index for a quest dictionary and make it current
+    
+    Call once after loading quests; the other functions reuse it as long as
+    they are given the same dictionary.
+    
+    Returns: QuestIndex
+    Raises: InvalidDataFormatError if the prerequisites form a cycle
+    """
+    global quest_index
+    quest_index = QuestIndex(quest_data_dict)
+    return quest_index
+
+def reload_quests(quest_data_dict, filename="data/quests.txt"):
+    """
+    Hot reload quest data from file into an existing quest dictionary
+    
+    The new data is loaded and indexed first, so a bad file leaves the
+    current quests and index untouched. The dictionary is then updated in
+    place (callers keep their reference) and the new index becomes current;
+    characters' available quests are rebuilt on their next query.
+    
+    Returns: Dictionary with lists of 'added', 'removed' and 'changed' quest IDs
+    Raises:
+        MissingDataFileError, InvalidDataFormatError, CorruptedDataError from loading
+        InvalidDataFormatError if the new prerequisites form a cycle
+    """
+    global quest_index
+    new_quests = load_quests(filename)
+    new_index = QuestIndex(new_quests)
+
+    changes = {
+        'added': [quest_id for quest_id in new_quests if quest_id not in quest_data_dict],
+        'removed': [quest_id for quest_id in quest_data_dict if quest_id not in new_quests],
+        'changed': [quest_id for quest_id in new_quests
+                    if quest_id in quest_data_dict and quest_data_dict[quest_id] != new_quests[quest_id]]
+    }
+
+    quest_data_dict.clear()
+    quest_data_dict.update(new_quests)
+    new_index.quests = quest_data_dict
+    quest_index = new_index
+    return changes
+
+def get_quest_index(quest_data_dict):
+    """
+    Get the index for a quest dictionary, rebuilding it if the dictionary changed
+    
+    Returns: QuestIndex
+    """
+    if quest_index is None or quest_index.quests is not quest_data_dict \
+            or quest_index.size != len(quest_data_dict):
+        return build_quest_index(quest_data_dict)
+    return quest_index
+
 # ============================================================================
 # QUEST MANAGEMENT
 # ============================================================================
@@ -50,16 +409,23 @@ def accept_quest(character, quest_id, quest_data_dict):
     if character['level'] < quest_data_dict[quest_id]['required_level']: # Check level req
         raise InsufficientLevelError(f"Character level too low to accept quest '{quest_id}'.")
     
+    completed = get_quest_set(character, 'completed_quests')
+    active = get_quest_set(character, 'active_quests')
+
     if quest_data_dict[quest_id]['prerequisite'] != "NONE": # Check prerequisite
         prereq = quest_data_dict[quest_id]['prerequisite'] # Get prerequisite quest ID
-        if prereq not in character['completed_quests']: # Verify completed
+        if prereq not in completed: # Verify completed
             raise QuestRequirementsNotMetError(f"Prerequisite quest '{prereq}' not completed for quest '{quest_id}'.")
     
-    if quest_id in character['completed_quests']: # Check already completed
+    if quest_id in completed: # Check already completed
         raise QuestAlreadyCompletedError(f"Quest '{quest_id}' has already been completed.")
     
-    if quest_id not in character['active_quests']: # Check not already active
-        character['active_quests'].append(quest_id)
+    if quest_id not in active: # Check not already active
+        availability = current_availability(character, quest_data_dict)
+        active.append(quest_id)
+        if availability is not None:
+            availability['available'].pop(quest_id, None)
+            availability['fingerprint'] = quest_fingerprint(character)
         return True
     
 def complete_quest(character, quest_id, quest_data_dict):
@@ -85,17 +451,30 @@ def complete_quest(character, quest_id, quest_data_dict):
     if quest_id not in quest_data_dict: # Check quest exists
         raise QuestNotFoundError(f"Quest '{quest_id}' not found.")
     
-    if quest_id not in character['active_quests']: # Check quest is active
+    active = get_quest_set(character, 'active_quests')
+    if quest_id not in active: # Check quest is active
         raise QuestNotActiveError(f"Quest '{quest_id}' is not active.")
     
-    character['active_quests'].remove(quest_id) # Remove from active quests
-    character['completed_quests'].append(quest_id) # Add to completed quests
+    availability = current_availability(character, quest_data_dict)
+    stats = get_quest_stats(character, quest_data_dict)
+    active.remove(quest_id) # Remove from active quests
+    completed = get_quest_set(character, 'completed_quests')
+    completed.append(quest_id) # Add to completed quests
+    if availability is not None: # Only the quests this one unlocks can open up
+        taken = completed.bits | active.bits # Loaded saves may already hold a child
+        for child in get_quest_index(quest_data_dict).children[quest_id]:
+            if quest_data_dict[child]['required_level'] <= availability['level'] \
+                    and not taken >> quest_numbers[child] & 1:
+                availability['available'][child] = None
+        availability['fingerprint'] = quest_fingerprint(character)
 
     reward_xp = quest_data_dict[quest_id]['reward_xp'] # Get reward XP
     reward_gold = quest_data_dict[quest_id]['reward_gold'] # Get reward gold
 
     character['experience'] += reward_xp
     character['gold'] += reward_gold
+    record_event(character, "gold", gold_delta=reward_gold)
+    add_quest_stats(stats, quest_data_dict[quest_id]) # Running totals
 
     return{'reward_xp': reward_xp, 'reward_gold': reward_gold}
 
@@ -107,10 +486,17 @@ def abandon_quest(character, quest_id):
     Raises: QuestNotActiveError if quest not active
     """
     # quest abandonment
-    if quest_id not in character['active_quests']:
+    active = get_quest_set(character, 'active_quests')
+    if quest_id not in active:
         raise QuestNotActiveError(f"Quest '{quest_id}' is not active.")
     
-    character['active_quests'].remove(quest_id)
+    availability = character.get('quest_availability')
+    if availability is not None and availability['fingerprint'] != quest_fingerprint(character):
+        availability = None
+    active.remove(quest_id)
+    if availability is not None: # It was accepted, so it can be accepted again
+        availability['available'][quest_id] = None
+        availability['fingerprint'] = quest_fingerprint(character)
     return True
 
 def get_active_quests(character, quest_data_dict):
@@ -122,7 +508,7 @@ def get_active_quests(character, quest_data_dict):
     # active quest retrieval
 
     active_quests = []
-    for quest_id in character['active_quests']: # Iterate active quests
+    for quest_id in get_quest_set(character, 'active_quests'): # Iterate active quests
         if quest_id in quest_data_dict:
             active_quests.append(quest_data_dict[quest_id])
 
@@ -137,7 +523,7 @@ def get_completed_quests(character, quest_data_dict):
     # completed quest retrieval
     completed_quests = []
  
-    for quest_id in character['completed_quests']: # Iterate completed quests
+    for quest_id in get_quest_set(character, 'completed_quests'): # Iterate completed quests
         if quest_id in quest_data_dict:
             completed_quests.append(quest_data_dict[quest_id])
 
@@ -149,27 +535,87 @@ def get_available_quests(character, quest_data_dict):
     
     Available = meets level req + prerequisite done + not completed + not active
     
+    The set is kept on the character and updated as quests are accepted,
+    completed and abandoned and as the character levels up, so this costs
+    O(number of available quests).
+    
     Returns: List of quest dictionaries
     """
     # available quest search
+    available = get_quest_availability(character, quest_data_dict)['available']
+    return [quest_data_dict[quest_id] for quest_id in available]
 
-    available = []
+def quest_fingerprint(character):
+    """Returns: Value that changes whenever either quest set changes"""
+    completed = get_quest_set(character, 'completed_quests')
+    active = get_quest_set(character, 'active_quests')
+    return (id(completed), completed.version, id(active), active.version)
 
-    for quest_id, quest_data in quest_data_dict.items(): # Iterate all quests
-        if character['level'] >= quest_data['required_level']: # Check level req
-            continue
+def get_quest_availability(character, quest_data_dict):
+    """
+    Get the character's cached availability, bringing it up to date
+    
+    The cache is character['quest_availability']:
+        {'index': QuestIndex, 'level': int, 'fingerprint': tuple,
+         'available': {quest_id: None}}
+    It is rebuilt from scratch only for a new quest index, a lower level,
+    or quest lists changed outside this module. A higher level only checks
+    the quests in the newly reached level band.
+    
+    Returns: The availability dictionary
+    """
+    index = get_quest_index(quest_data_dict)
+    availability = character.get('quest_availability')
+    level = character['level']
 
-        prereq = quest_data['prerequisite'] # Get prerequisite quest ID
-        if prereq != "NONE" and prereq in character['completed_quests']: # Check prerequisite
-            continue
-        
-        if quest_id not in character['completed_quests']: # Check not completed
+    if availability is None or availability['index'] is not index or level < availability['level'] \
+            or availability['fingerprint'] != quest_fingerprint(character):
+        return rebuild_quest_availability(character, index)
+
+    if level > availability['level']: # Newly reached levels
+        completed = character['completed_quests']
+        taken = completed.bits | character['active_quests'].bits
+        for quest_id in index.level_band(availability['level'], level):
+            parent = index.parent[quest_id]
+            if quest_id in index.missing or (parent is not None and parent not in completed):
+                continue
+            if not taken >> quest_numbers[quest_id] & 1:
+                availability['available'][quest_id] = None
+        availability['level'] = level
+
+    return availability
+
+def rebuild_quest_availability(character, index):
+    """
+    Work out the available quests from scratch
+    
+    Returns: The new availability dictionary (also stored on the character)
+    """
+    completed = get_quest_set(character, 'completed_quests')
+    taken = completed.bits | get_quest_set(character, 'active_quests').bits # Completed or active
+    level = character['level']
+    available = {}
+
+    for quest_id in index.level_band(float("-inf"), level): # Level requirement met
+        parent = index.parent[quest_id]
+        if quest_id in index.missing or (parent is not None and parent not in completed):
             continue
-        if quest_id not in character['active_quests']: # Check not active
-            continue 
-        
-        available.append(quest_data)
-    return available
+        if not taken >> quest_numbers[quest_id] & 1:
+            available[quest_id] = None
+
+    availability = {'index': index, 'level': level, 'fingerprint': quest_fingerprint(character),
+                    'available': available}
+    character['quest_availability'] = availability
+    return availability
+
+def current_availability(character, quest_data_dict):
+    """
+    Returns: The character's availability cache brought up to date, or None
+             if it has not been built (it is then built on the next query)
+    """
+    if 'quest_availability' not in character:
+        return None
+    return get_quest_availability(character, quest_data_dict)
 
 # ============================================================================
 # QUEST TRACKING
@@ -182,8 +628,7 @@ def is_quest_completed(character, quest_id):
     Returns: True if completed, False otherwise
     """
     # completion check
-    if quest_id in character['completed_quests']:
-        return True
+    return quest_id in get_quest_set(character, 'completed_quests')
 
 def is_quest_active(character, quest_id):
     """
@@ -192,8 +637,7 @@ def is_quest_active(character, quest_id):
     Returns: True if active, False otherwise
     """
     # active check
-    if quest_id in character['active_quests']:
-        return True
+    return quest_id in get_quest_set(character, 'active_quests')
 
 def can_accept_quest(character, quest_id, quest_data_dict):
     """
@@ -207,9 +651,7 @@ def can_accept_quest(character, quest_id, quest_data_dict):
     
     if quest_id not in quest_data_dict: # Quest must exist
         return False 
-    quest = quest_data_dict[quest_id] # Get quest data
-    if character['level'] < quest['required_level']:
-        return False
+    return quest_id in get_quest_availability(character, quest_data_dict)['available']
 
 def get_quest_prerequisite_chain(quest_id, quest_data_dict):
     """
@@ -222,27 +664,44 @@ def get_quest_prerequisite_chain(quest_id, quest_data_dict):
     Raises: QuestNotFoundError if quest doesn't exist
     """
     # prerequisite chain tracing
-    # Follow prerequisite links backwards
+    # Follow the indexed prerequisite links backwards (the index has no cycles)
     # Build list in reverse order
 
     if quest_id not in quest_data_dict: # Check quest exists
         raise QuestNotFoundError(f"Quest '{quest_id}' not found.")
     
+    index = get_quest_index(quest_data_dict)
+    parent = index.parent
     chain = [] # Initialize chain list
     current_quest_id = quest_id # Start with given quest ID
 
-    while True: # Loop until no more prerequisites
-        if current_quest_id not in quest_data_dict:
-            raise QuestNotFoundError(f"Quest '{current_quest_id}' not found ")
+    while current_quest_id is not None: # Loop until no more prerequisites
         chain.append(current_quest_id) # Add current quest to chain
-        prerequisite = quest_data_dict[current_quest_id]['prerequisite']
-        if prerequisite == "NONE": # No more prerequisites
-            break
+        current_quest_id = parent[current_quest_id] # Move to prerequisite quest ID
 
-        current_quest_id = prerequisite # Move to prerequisite quest ID
+    if chain[-1] in index.missing: # Chain starts at a quest that does not exist
+        raise QuestNotFoundError(f"Quest '{index.missing[chain[-1]]}' not found ")
 
     chain.reverse() # Reverse to get correct order
     return chain
+
+def get_quest_unlocks(quest_id, quest_data_dict, transitive=False):
+    """
+    Get the quests that list this quest as their prerequisite
+    
+    Args:
+        transitive: Also include quests unlocked further down the chain
+    
+    Returns: List of quest IDs (prerequisites before the quests needing them)
+    Raises: QuestNotFoundError if quest doesn't exist
+    """
+    if quest_id not in quest_data_dict: # Check quest exists
+        raise QuestNotFoundError(f"Quest '{quest_id}' not found.")
+
+    index = get_quest_index(quest_data_dict)
+    if transitive:
+        return index.quests_in(index.descendants(quest_id))
+    return list(index.children[quest_id])
             
 # ============================================================================
 # QUEST STATISTICS
@@ -261,47 +720,120 @@ def get_quest_completion_percentage(character, quest_data_dict):
     if total_quests == 0: # Avoid division by zero
         return 0.0
     
-    completed_quests = len(character['completed_quests']) # Number completed
+    completed_quests = get_quest_stats(character, quest_data_dict)['completed'] # Number completed
     percentage = (completed_quests / total_quests) * 100    
     return percentage
     
 def get_total_quest_rewards_earned(character, quest_data_dict):
     """
-    Calculate total XP and gold earned from completed quests
+    Get total XP and gold earned from completed quests
+    
+    Read from the running totals (see get_quest_stats), not summed again.
     
     Returns: Dictionary with 'total_xp' and 'total_gold'
     """
     # reward calculation
-    # Sum up reward_xp and reward_gold for all completed quests
+    stats = get_quest_stats(character, quest_data_dict)
+    return {'total_xp': stats['total_xp'], 'total_gold': stats['total_gold']}
 
-    total_xp = 0
-    total_gold = 0
+def get_level_band(level):
+    """Returns: Band label such as "1-5" for a required level"""
+    start = (level - 1) // LEVEL_BAND_SIZE * LEVEL_BAND_SIZE + 1
+    return f"{start}-{start + LEVEL_BAND_SIZE - 1}"
 
-    for quest_id in character['completed_quests']: # Iterate completed quests
-        if quest_id in quest_data_dict: # Check quest exists
-            total_xp += quest_data_dict[quest_id]['reward_xp']
-            total_gold += quest_data_dict[quest_id]['reward_gold']
+def add_quest_stats(stats, quest_data):
+    """Count one completed quest in a statistics dictionary"""
+    stats['total_xp'] += quest_data['reward_xp']
+    stats['total_gold'] += quest_data['reward_gold']
+    stats['completed'] += 1
+    band = get_level_band(quest_data['required_level'])
+    stats['by_band'][band] = stats['by_band'].get(band, 0) + 1
 
-    return {'total_xp': total_xp, 'total_gold': total_gold}
+def compute_quest_stats(character, quest_data_dict):
+    """
+    Work out the completion statistics from scratch
+    
+    Completed quests missing from quest_data_dict are counted without rewards.
     
+    Returns: Statistics dictionary (see get_quest_stats)
+    """
+    stats = {'total_xp': 0, 'total_gold': 0, 'completed': 0, 'by_band': {},
+             'version': get_quest_index(quest_data_dict).stats_version}
+    for quest_id in get_quest_set(character, 'completed_quests'): # Iterate completed quests
+        if quest_id in quest_data_dict: # Check quest exists
+            add_quest_stats(stats, quest_data_dict[quest_id])
+        else:
+            stats['completed'] += 1
+    return stats
 
-def get_quests_by_level(quest_data_dict, min_level, max_level):
+def get_quest_stats(character, quest_data_dict):
     """
-    Get all quests within a level range
+    Get the character's running quest statistics
     
-    Returns: List of quest dictionaries
+    character['quest_stats'] = {'total_xp': int, 'total_gold': int,
+                                'completed': int, 'by_band': {"1-5": count, ...},
+                                'version': int}
+    is updated by complete_quest and saved with the character, so reading
+    it never walks the quest history. It is worked out from scratch only
+    when missing, when quests were completed outside complete_quest (its
+    count no longer matches completed_quests), or when the quest data's
+    rewards or levels changed since it was counted (its version no longer
+    matches the quest index's stats_version, e.g. after reload_quests).
+    
+    Returns: Statistics dictionary
     """
-    # level filtering
+    stats = character.get('quest_stats')
+    if stats is None or stats['completed'] != len(get_quest_set(character, 'completed_quests')) \
+            or stats.get('version') != get_quest_index(quest_data_dict).stats_version:
+        stats = compute_quest_stats(character, quest_data_dict)
+        character['quest_stats'] = stats
+    return stats
+
+def audit_quest_stats(character, quest_data_dict, repair=False):
+    """
+    Check the running quest statistics against a full recount
     
-    filtered = [] # Initialize filtered list
+    Args:
+        repair: Replace the running statistics with the recount if they differ
+    
+    Returns: Dictionary of {field: (running value, recounted value)} for every
+             field that differs (empty if the totals are correct)
+    """
+    expected = compute_quest_stats(character, quest_data_dict)
+    running = character.get('quest_stats') or {}
 
-    for quest_id, quest_data in quest_data_dict.items(): # Iterate all quests
+    mismatches = {field: (running.get(field), value)
+                  for field, value in expected.items() if running.get(field) != value}
+    if mismatches and repair:
+        character['quest_stats'] = expected
+    return mismatches
 
-        level = quest_data['required_level'] # Get quest level requirement
-        if min_level <= level <= max_level: # Check if within range
-            filtered.append(quest_data)
+def get_quest_leaderboard(characters, quest_data_dict, stat="total_xp", limit=10):
+    """
+    Rank characters by a quest statistic ('total_xp', 'total_gold' or 'completed')
+    
+    Reads each character's running totals, so no quest history is walked.
+    
+    Returns: List of (character name, value), highest first
+    """
+    scores = ((character['name'], get_quest_stats(character, quest_data_dict)[stat])
+              for character in characters)
+    return heapq.nlargest(limit, scores, key=lambda score: score[1])
+    
 
-    return filtered
+def get_quests_by_level(quest_data_dict, min_level, max_level):
+    """
+    Get all quests within a level range
+    
+    Uses the quest index: a single level is one bucket lookup and a range is
+    two bisects into the level-sorted quest list, so this costs
+    O(log n + number of quests returned).
+    
+    Returns: List of quest dictionaries, lowest required level first
+    """
+    # level filtering
+    index = get_quest_index(quest_data_dict)
+    return [quest_data_dict[quest_id] for quest_id in index.level_range(min_level, max_level)]
 
 # ============================================================================
 # DISPLAY FUNCTIONS
@@ -353,6 +885,7 @@ def display_character_quest_progress(character, quest_data_dict):
     completed_count = len(character['completed_quests']) # Completed quests count
     completion_percentage = get_quest_completion_percentage(character, quest_data_dict) # Completion percentage
     total_rewards = get_total_quest_rewards_earned(character, quest_data_dict) # Total rewards earned
+    by_band = get_quest_stats(character, quest_data_dict)['by_band'] # Completed per level band
 
     print("\n=== Quest Progress ===")
     print(f"Active Quests: {active_count}")
@@ -360,6 +893,8 @@ def display_character_quest_progress(character, quest_data_dict):
     print(f"Completion Percentage: {completion_percentage:.2f}%")
     print(f"Total Rewards Earned: {total_rewards['total_xp']}")
     print(f"Total Gold Earned: {total_rewards['total_gold']}")
+    for band in sorted(by_band, key=lambda label: int(label.split("-")[0])):
+        print(f"Levels {band}: {by_band[band]} completed")
 
 # ============================================================================
 # VALIDATION
@@ -367,22 +902,22 @@ def display_character_quest_progress(character, quest_data_dict):
 
 def validate_quest_prerequisites(quest_data_dict):
     """
-    Validate that all quest prerequisites exist
+    Validate that all quest prerequisites exist and never loop back
     
     Checks that every prerequisite (that's not "NONE") refers to a real quest
+    and that no quest is (indirectly) its own prerequisite
     
     Returns: True if all valid
-    Raises: QuestNotFoundError if invalid prerequisite found
+    Raises:
+        QuestNotFoundError if invalid prerequisite found
+        InvalidDataFormatError if the prerequisites form a cycle
     """
     # prerequisite validation
-    # Check each quest's prerequisite
-    # Ensure prerequisite exists in quest_data_dict
+    # Building the index finds cycles and records unknown prerequisites
     
-    for quest_id, quest_data in quest_data_dict.items(): # Iterate all quests
-        prerequisite = quest_data['prerequisite'] # Get prerequisite
- 
-        if prerequisite != "NONE" and prerequisite not in quest_data_dict: # Check validity
-            raise QuestNotFoundError(f"Quest '{quest_id}' has invalid prerequisite '{prerequisite}'.")
+    index = build_quest_index(quest_data_dict)
+    for quest_id, prerequisite in index.missing.items(): # Check validity
+        raise QuestNotFoundError(f"Quest '{quest_id}' has invalid prerequisite '{prerequisite}'.")
     return True
 
 # ============================================================================
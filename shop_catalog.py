@@ -0,0 +1,245 @@
+"""
+COMP 163 - Project 3: Quest Chronicles
+Shop Catalog Module
+
+Name: Vanessa Gray
+
+Indexes the loaded item data so the shop can filter, sort and page through
+thousands of items without scanning all of them.
+
+Indexes built once per catalog:
+- by type:        item type -> item IDs
+- by stat:        stat an item's effect changes -> item IDs
+- by cost:        item IDs sorted by cost, with a parallel cost list for bisect
+- by name prefix: trie over lower-case display names
+
+A query starts from the smallest matching index and only checks the
+remaining filters on those candidates.
+
+Cost filters and cost sorts use the price the shop currently charges
+(inventory_system.get_buy_price). With a pricing engine set, prices stay
+within [floor, ceiling] times the base cost, so the base cost index is
+searched over that wider range and each candidate's actual price is checked.
+The price order is re-sorted only after the engine ticks.
+"""
+
+from bisect import bisect_left, bisect_right
+from math import ceil, floor
+
+import inventory_system
+from game_data import EFFECT_STATS
+from inventory_system import get_item_effect, get_buy_price
+from custom_exceptions import ItemNotFoundError
+
+# Default number of items per page
+DEFAULT_PAGE_SIZE = 10
+
+# Sort orders accepted by ShopCatalog.query
+SORT_ORDERS = ("cost", "cost_desc", "name")
+
+# ============================================================================
+# NAME TRIE
+# ============================================================================
+
+class PrefixTrie:
+    """
+    Trie mapping name prefixes to item IDs
+
+    Every node keeps the IDs of all names that pass through it, so a prefix
+    lookup costs O(len(prefix)) and returns the matches directly.
+    """
+
+    def __init__(self):
+        self.root = {'children': {}, 'ids': []}
+
+    def add(self, name, item_id):
+        """Index item_id under every prefix of name"""
+        node = self.root
+        node['ids'].append(item_id)
+        for letter in name:
+            node = node['children'].setdefault(letter, {'children': {}, 'ids': []})
+            node['ids'].append(item_id)
+
+    def find(self, prefix):
+        """
+        Returns: List of item IDs whose name starts with prefix (empty if none)
+        """
+        node = self.root
+        for letter in prefix:
+            node = node['children'].get(letter)
+            if node is None:
+                return []
+        return node['ids']
+
+# ============================================================================
+# CATALOG
+# ============================================================================
+
+class ShopCatalog:
+    """
+    Searchable index over a dictionary of items from game_data.load_items
+    """
+
+    def __init__(self, items):
+        """
+        Args:
+            items: Dictionary of {item_id: item_data}
+        """
+        self.items = items
+        self.by_type = {}
+        self.by_stat = {}
+        self.names = PrefixTrie()
+
+        for item_id, item in items.items():
+            self.by_type.setdefault(item['type'], []).append(item_id)
+            for stat_index, value in get_item_effect(item):
+                stat_ids = self.by_stat.setdefault(EFFECT_STATS[stat_index], [])
+                if not stat_ids or stat_ids[-1] != item_id: # Multi-stat effects list a stat once
+                    stat_ids.append(item_id)
+            self.names.add(item['name'].lower(), item_id)
+
+        self.by_cost = sorted(items, key=lambda item_id: (items[item_id]['cost'], item_id))
+        self.costs = [items[item_id]['cost'] for item_id in self.by_cost]
+
+        # Position of every item in each sort order, so candidates sort by lookup
+        self.cost_rank = {item_id: rank for rank, item_id in enumerate(self.by_cost)}
+        by_name = sorted(items, key=lambda item_id: (items[item_id]['name'].lower(), item_id))
+        self.name_rank = {item_id: rank for rank, item_id in enumerate(by_name)}
+
+        # Order by current price, cached per pricing engine tick
+        self.priced_by = None
+        self.priced_tick = None
+        self.by_price = self.by_cost
+        self.price_rank = self.cost_rank
+
+    def get_item(self, item_id):
+        """
+        Returns: Item data dictionary
+        Raises: ItemNotFoundError if the item is not in the catalog
+        """
+        if item_id not in self.items:
+            raise ItemNotFoundError(f"Item '{item_id}' is not sold here.")
+        return self.items[item_id]
+
+    def cost_range(self, min_cost=None, max_cost=None):
+        """
+        Returns: List of item IDs with min_cost <= cost <= max_cost, cheapest first
+        """
+        low = 0 if min_cost is None else bisect_left(self.costs, min_cost)
+        high = len(self.costs) if max_cost is None else bisect_right(self.costs, max_cost)
+        return self.by_cost[low:high]
+
+    def price_range(self, min_price=None, max_price=None):
+        """
+        Returns: List of item IDs whose current buy price is within the bounds
+        """
+        engine = inventory_system.pricing_engine
+        if engine is None:
+            return self.cost_range(min_price, max_price)
+
+        # Search the base cost index over every cost that could be priced in range
+        low = None if min_price is None else min(min_price, floor((min_price - 1) / engine.ceiling))
+        high = None if max_price is None else max(max_price, ceil((max_price + 1) / engine.floor))
+        items = self.items
+        low_price = float("-inf") if min_price is None else min_price
+        high_price = float("inf") if max_price is None else max_price
+        return [item_id for item_id in self.cost_range(low, high)
+                if low_price <= get_buy_price(items[item_id]) <= high_price]
+
+    def price_order(self):
+        """
+        Returns: (item IDs sorted by current buy price, rank of each item ID)
+        """
+        engine = inventory_system.pricing_engine
+        if engine is None:
+            return self.by_cost, self.cost_rank
+        if self.priced_by is not engine or self.priced_tick != engine.ticks:
+            items = self.items
+            self.by_price = sorted(self.by_cost, key=lambda item_id: get_buy_price(items[item_id]))
+            self.price_rank = {item_id: rank for rank, item_id in enumerate(self.by_price)}
+            self.priced_by = engine
+            self.priced_tick = engine.ticks
+        return self.by_price, self.price_rank
+
+    def query(self, item_type=None, stat=None, min_cost=None, max_cost=None, prefix=None,
+              sort="cost", page=1, page_size=DEFAULT_PAGE_SIZE):
+        """
+        Filter, sort and page the catalog
+
+        Args:
+            item_type: Only items of this type
+            stat: Only items whose effect changes this stat
+            min_cost / max_cost: Inclusive bounds on the current buy price
+            prefix: Only items whose display name starts with this (case-insensitive)
+            sort: One of SORT_ORDERS (cost orders use the current buy price)
+            page: 1-based page number
+            page_size: Items per page
+
+        Returns: Dictionary with 'items' (list of item data for the page),
+                 'total' (matching items), 'page' and 'pages'
+        Raises: ValueError if sort, page or page_size is invalid
+        """
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"Unknown sort order '{sort}'.")
+        if page < 1 or page_size < 1:
+            raise ValueError("page and page_size must be at least 1.")
+
+        # (index, check) per filter; start from the smallest index and
+        # apply the other filters as O(1) checks on its items
+        filters = []
+        if item_type is not None:
+            filters.append((self.by_type.get(item_type, []),
+                            lambda item: item['type'] == item_type))
+        if stat is not None:
+            stat_index = EFFECT_STATS.index(stat) if stat in EFFECT_STATS else -1
+            filters.append((self.by_stat.get(stat, []),
+                            lambda item: any(index == stat_index for index, _ in get_item_effect(item))))
+        if prefix:
+            prefix = prefix.lower()
+            filters.append((self.names.find(prefix),
+                            lambda item: item['name'].lower().startswith(prefix)))
+        if min_cost is not None or max_cost is not None:
+            low = float("-inf") if min_cost is None else min_cost
+            high = float("inf") if max_cost is None else max_cost
+            filters.append((self.price_range(min_cost, max_cost),
+                            lambda item: low <= get_buy_price(item) <= high))
+
+        by_price, price_rank = self.price_order()
+        if filters:
+            filters.sort(key=lambda entry: len(entry[0]))
+            checks = [check for ids, check in filters[1:]]
+            items = self.items
+            matches = [item_id for item_id in filters[0][0]
+                       if all(check(items[item_id]) for check in checks)]
+        else:
+            matches = by_price
+
+        if sort == "name":
+            matches = sorted(matches, key=self.name_rank.__getitem__)
+        else:
+            if matches is not by_price:
+                matches = sorted(matches, key=price_rank.__getitem__)
+            if sort == "cost_desc":
+                matches = matches[::-1]
+
+        total = len(matches)
+        start = (page - 1) * page_size
+        return {
+            'items': [self.items[item_id] for item_id in matches[start:start + page_size]],
+            'total': total,
+            'page': page,
+            'pages': (total + page_size - 1) // page_size
+        }
+
+# ============================================================================
+# TESTING
+# ============================================================================
+
+if __name__ == "__main__":
+    print("=== SHOP CATALOG TEST ===")
+
+    # import game_data
+    #
+    # catalog = ShopCatalog(game_data.load_items())
+    # print(catalog.query(item_type="weapon", max_cost=200))
+    # print(catalog.query(prefix="st", sort="name"))
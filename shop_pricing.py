@@ -0,0 +1,149 @@
+"""
+COMP 163 - Project 3: Quest Chronicles
+Shop Pricing Module
+
+Name: Vanessa Gray
+
+Supply and demand pricing for the shop.
+
+Every item has a price multiplier. Purchases and sales are only counted as
+they happen; once per tick every multiplier moves by
+
+    multiplier *= 1 + elasticity * (bought - sold)
+
+clamped to [floor, ceiling], so popular items get dearer and items players
+dump get cheaper. When NumPy is installed the multipliers, volumes and prices
+live in NumPy arrays and the tick updates them in place in a few whole-catalog
+operations; otherwise they are plain lists updated by a Python loop. Either
+way reading a price is a single index.
+"""
+
+try:
+    import numpy as np
+except ImportError: # Optional: fall back to plain Python lists
+    np = None
+
+from custom_exceptions import ItemNotFoundError
+
+# Default tuning
+DEFAULT_ELASTICITY = 0.05
+DEFAULT_FLOOR = 0.5
+DEFAULT_CEILING = 2.0
+
+# ============================================================================
+# PRICING ENGINE
+# ============================================================================
+
+class PricingEngine:
+    """
+    Per-item prices driven by aggregated buy/sell volume
+    """
+
+    def __init__(self, items, elasticity=DEFAULT_ELASTICITY, floor=DEFAULT_FLOOR,
+                 ceiling=DEFAULT_CEILING, use_numpy=True):
+        """
+        Args:
+            items: Dictionary of {item_id: item_data} with 'cost' fields
+            elasticity: Multiplier change per net unit bought in one tick
+            floor / ceiling: Lowest and highest multiplier of the base cost
+            use_numpy: Set False to force the pure Python update
+        Raises: ValueError if floor is not positive or is above ceiling
+        """
+        if floor <= 0 or floor > ceiling:
+            raise ValueError("floor must be positive and no greater than ceiling.")
+
+        self.elasticity = elasticity
+        self.floor = floor
+        self.ceiling = ceiling
+        self.use_numpy = use_numpy and np is not None
+
+        self.item_ids = list(items)
+        self.index = {item_id: i for i, item_id in enumerate(self.item_ids)}
+        costs = [items[item_id]['cost'] for item_id in self.item_ids]
+        count = len(self.item_ids)
+        self.ticks = 0
+
+        if self.use_numpy: # Arrays, so tick never converts between lists and arrays
+            self.base_costs = np.array(costs, dtype=float)
+            self.multipliers = np.ones(count)
+            self.bought = np.zeros(count, dtype=np.int64) # Volume since the last tick
+            self.sold = np.zeros(count, dtype=np.int64)
+            self.buy_prices = np.array(costs, dtype=np.int64)
+            self.sell_prices = self.buy_prices // 2
+        else:
+            self.base_costs = costs
+            self.multipliers = [1.0] * count
+            self.bought = [0] * count # Volume since the last tick
+            self.sold = [0] * count
+            self.buy_prices = list(costs)
+            self.sell_prices = [cost // 2 for cost in costs]
+
+    def __contains__(self, item_id):
+        return item_id in self.index
+
+    def buy_price(self, item_id):
+        """
+        Returns: Current price the shop charges for one item
+        Raises: ItemNotFoundError if the item is not priced by this engine
+        """
+        if item_id not in self.index:
+            raise ItemNotFoundError(f"Item '{item_id}' has no price.")
+        return int(self.buy_prices[self.index[item_id]])
+
+    def sell_price(self, item_id):
+        """
+        Returns: Current price the shop pays for one item (half the buy price)
+        Raises: ItemNotFoundError if the item is not priced by this engine
+        """
+        if item_id not in self.index:
+            raise ItemNotFoundError(f"Item '{item_id}' has no price.")
+        return int(self.sell_prices[self.index[item_id]])
+
+    def record_buy(self, item_id, quantity=1):
+        """Count units players bought (ignored for unpriced items)"""
+        if item_id in self.index:
+            self.bought[self.index[item_id]] += quantity
+
+    def record_sell(self, item_id, quantity=1):
+        """Count units players sold (ignored for unpriced items)"""
+        if item_id in self.index:
+            self.sold[self.index[item_id]] += quantity
+
+    def tick(self):
+        """Move every price by this tick's net demand and reset the volumes"""
+        if self.use_numpy:
+            self.multipliers *= 1.0 + self.elasticity * (self.bought - self.sold)
+            np.clip(self.multipliers, self.floor, self.ceiling, out=self.multipliers)
+            self.buy_prices[:] = np.maximum(np.rint(self.base_costs * self.multipliers), 1)
+            np.floor_divide(self.buy_prices, 2, out=self.sell_prices)
+            self.bought.fill(0)
+            self.sold.fill(0)
+        else:
+            elasticity, floor, ceiling = self.elasticity, self.floor, self.ceiling
+            self.multipliers = [
+                min(max(multiplier * (1.0 + elasticity * (bought - sold)), floor), ceiling)
+                for multiplier, bought, sold in zip(self.multipliers, self.bought, self.sold)
+            ]
+            self.buy_prices = [max(int(round(cost * multiplier)), 1)
+                               for cost, multiplier in zip(self.base_costs, self.multipliers)]
+            self.sell_prices = [price // 2 for price in self.buy_prices]
+
+            count = len(self.item_ids)
+            self.bought = [0] * count
+            self.sold = [0] * count
+        self.ticks += 1
+
+# ============================================================================
+# TESTING
+# ============================================================================
+
+if __name__ == "__main__":
+    print("=== SHOP PRICING TEST ===")
+
+    # import game_data
+    #
+    # engine = PricingEngine(game_data.load_items())
+    # engine.record_buy("health_potion", 10)
+    # engine.record_sell("iron_sword", 4)
+    # engine.tick()
+    # print(engine.buy_price("health_potion"), engine.sell_price("iron_sword"))
@@ -0,0 +1,379 @@
+"""
+COMP 163 - Project 3: Quest Chronicles
+Stash System Module
+
+Name: Vanessa Gray
+
+Per-account bank for items that do not fit in the inventory.
+
+A stash holds up to MAX_STASH_PAGES pages of STASH_PAGE_SIZE slots. Slots stack
+like inventory slots (see game_data.get_stack_size). On disk every page is
+its own file, next to a small index with the slot count of every page and the
+total and pages of every item:
+
+    data/stash/{account}/stash.txt        PAGE_SIZE / PAGES / SLOTS / ITEM lines
+    data/stash/{account}/page_0000.txt    one "item_id: quantity" line per slot
+
+Opening a stash reads only the index. A page file is read the first time a
+page is viewed or an item on it is needed, and flush() rewrites only the
+pages that changed. Pages left empty at the end of the stash are dropped,
+and flush() deletes their files.
+"""
+
+import os
+
+from game_data import get_stack_size
+from inventory_system import get_inventory, has_room, record_event
+from custom_exceptions import (
+    InventoryFullError,
+    ItemNotFoundError,
+    SaveFileCorruptedError,
+    InvalidSaveDataError
+)
+
+# Slots per page and pages per stash
+STASH_PAGE_SIZE = 50
+MAX_STASH_PAGES = 100
+
+# Where stashes are saved, one directory per account
+DEFAULT_STASH_DIRECTORY = "data/stash"
+
+# ============================================================================
+# STASH
+# ============================================================================
+
+class Stash:
+    """
+    One account's stash, loaded page by page
+    """
+
+    def __init__(self, account, save_directory=DEFAULT_STASH_DIRECTORY,
+                 page_size=STASH_PAGE_SIZE, max_pages=MAX_STASH_PAGES):
+        """
+        Open a stash, reading only its index file (a new stash starts empty)
+
+        Args:
+            account: Account name; also the stash's directory name
+            save_directory: Directory holding every account's stash
+            page_size / max_pages: Used for new stashes; a saved stash keeps its page size
+        Raises:
+            SaveFileCorruptedError if the index cannot be read
+            InvalidSaveDataError if the index is badly formatted
+        """
+        self.account = account
+        self.directory = os.path.join(save_directory, account)
+        self.page_size = page_size
+        self.max_pages = max_pages
+
+        self.page_slots = [] # Used slots of every page, loaded or not
+        self.totals = {} # item_id -> quantity stashed
+        self.locations = {} # item_id -> set of page numbers holding it
+        self.pages = {} # page number -> list of [item_id, quantity] slots (loaded pages only)
+        self.dirty = set() # Loaded pages changed since the last flush
+        self.dropped = set() # Trailing pages emptied since the last flush (files to delete)
+        self.index_dirty = False
+        self.pages_read = 0 # Page files read since opening
+
+        self.load_index()
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    @property
+    def page_count(self):
+        """Returns: Number of pages in use"""
+        return len(self.page_slots)
+
+    def count(self, item_id):
+        """Returns: Quantity of item_id in the stash (no page is read)"""
+        return self.totals.get(item_id, 0)
+
+    def free_slots(self):
+        """Returns: Empty slots left, counting pages not created yet"""
+        used = sum(self.page_slots)
+        return self.max_pages * self.page_size - used
+
+    def view_page(self, page_no):
+        """
+        Get the slots on one page, reading its file if needed
+
+        Returns: List of (item_id, quantity) tuples
+        Raises: ValueError if the page does not exist
+        """
+        if not 0 <= page_no < self.page_count:
+            raise ValueError(f"Stash page {page_no + 1} does not exist.")
+        return [tuple(slot) for slot in self.load_page(page_no)]
+
+    # ------------------------------------------------------------------
+    # Moving items
+    # ------------------------------------------------------------------
+
+    def deposit(self, character, item_id, quantity=1, item_data=None):
+        """
+        Move items from the character's inventory into the stash
+
+        Args:
+            item_data: The item's data, if known (sets its stack size; otherwise
+                       the stack size the inventory holds it with is used)
+        Returns: True if deposited
+        Raises:
+            ItemNotFoundError if the inventory holds fewer than quantity units
+            InventoryFullError if the stash has no room for them
+        """
+        inventory = get_inventory(character)
+        if quantity < 1 or inventory.count(item_id) < quantity:
+            raise ItemNotFoundError("Item not found in inventory.")
+
+        if item_data is not None:
+            stack_size = get_stack_size(item_id, item_data)
+        else:
+            stack_size = inventory.stacks.get(item_id)
+        self.store(item_id, quantity, stack_size)
+        inventory.remove(item_id, quantity)
+        record_event(character, "deposit", item_id, quantity)
+        return True
+
+    def withdraw(self, character, item_id, quantity=1, item_data=None):
+        """
+        Move items from the stash into the character's inventory
+
+        Args:
+            item_data: The item's data, if known (sets its stack size in the inventory)
+        Returns: True if withdrawn
+        Raises:
+            ItemNotFoundError if the stash holds fewer than quantity units
+            InventoryFullError if the inventory has no room for them
+        """
+        if quantity < 1 or self.count(item_id) < quantity:
+            raise ItemNotFoundError("Item not found in stash.")
+
+        inventory = get_inventory(character)
+        stack_size = None
+        if item_data is not None:
+            stack_size = get_stack_size(item_id, item_data)
+            inventory.set_stack_size(item_id, stack_size)
+        if not has_room(inventory, item_id, quantity, stack_size):
+            raise InventoryFullError("Inventory is full.")
+
+        self.take(item_id, quantity)
+        inventory.append(item_id, quantity, stack_size)
+        record_event(character, "withdraw", item_id, quantity)
+        return True
+
+    def store(self, item_id, quantity, stack_size=None):
+        """
+        Add units to the stash, topping up open stacks before using new slots
+
+        Args:
+            stack_size: Units per slot (default: game_data.get_stack_size)
+        Raises: InventoryFullError if they do not fit (nothing is stored)
+        """
+        stack = stack_size or get_stack_size(item_id)
+        holding = sorted(self.locations.get(item_id, ()))
+
+        open_space = 0 # Room left in stacks already holding this item
+        for page_no in holding:
+            for slot in self.load_page(page_no):
+                if slot[0] == item_id:
+                    open_space += max(stack - slot[1], 0)
+
+        if open_space + self.free_slots() * stack < quantity:
+            raise InventoryFullError("Stash is full.")
+
+        remaining = quantity
+        for page_no in holding: # Top up open stacks
+            for slot in self.pages[page_no]:
+                if remaining and slot[0] == item_id and slot[1] < stack:
+                    added = min(stack - slot[1], remaining)
+                    slot[1] += added
+                    remaining -= added
+                    self.dirty.add(page_no)
+
+        page_no = 0
+        while remaining: # New slots on the first pages with room
+            if page_no == self.page_count:
+                self.page_slots.append(0)
+                self.pages[page_no] = []
+                self.dropped.discard(page_no) # Rewritten on flush instead
+            if self.page_slots[page_no] < self.page_size:
+                page = self.load_page(page_no)
+                while remaining and len(page) < self.page_size:
+                    added = min(stack, remaining)
+                    page.append([item_id, added])
+                    remaining -= added
+                self.page_slots[page_no] = len(page)
+                self.locations.setdefault(item_id, set()).add(page_no)
+                self.dirty.add(page_no)
+            page_no += 1
+
+        self.totals[item_id] = self.count(item_id) + quantity
+        self.index_dirty = True
+
+    def take(self, item_id, quantity):
+        """
+        Remove units from the stash, emptying the last stacks first
+
+        Raises: ItemNotFoundError if fewer than quantity units are stashed
+        """
+        if self.count(item_id) < quantity:
+            raise ItemNotFoundError("Item not found in stash.")
+
+        remaining = quantity
+        for page_no in sorted(self.locations[item_id], reverse=True):
+            page = self.load_page(page_no)
+            for slot in reversed(page):
+                if remaining and slot[0] == item_id:
+                    taken = min(slot[1], remaining)
+                    slot[1] -= taken
+                    remaining -= taken
+
+            page[:] = [slot for slot in page if slot[1] > 0]
+            self.page_slots[page_no] = len(page)
+            if not any(slot[0] == item_id for slot in page):
+                self.locations[item_id].discard(page_no)
+            self.dirty.add(page_no)
+            if not remaining:
+                break
+
+        self.totals[item_id] -= quantity
+        if not self.totals[item_id]:
+            del self.totals[item_id]
+            del self.locations[item_id]
+
+        while self.page_slots and not self.page_slots[-1]: # Drop empty pages at the end
+            page_no = self.page_count - 1
+            self.page_slots.pop()
+            self.pages.pop(page_no, None)
+            self.dirty.discard(page_no)
+            self.dropped.add(page_no)
+        self.index_dirty = True
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def page_file(self, page_no):
+        """Returns: Path of one page's file"""
+        return os.path.join(self.directory, f"page_{page_no:04d}.txt")
+
+    def load_page(self, page_no):
+        """
+        Get a page's slot list, reading its file the first time
+
+        Raises: SaveFileCorruptedError / InvalidSaveDataError if the page file is bad
+        """
+        page = self.pages.get(page_no)
+        if page is not None:
+            return page
+
+        filename = self.page_file(page_no)
+        try:
+            with open(filename, "r") as f:
+                lines = f.readlines()
+        except OSError:
+            raise SaveFileCorruptedError(f"Could not read stash page {page_no} of '{self.account}'.")
+
+        page = []
+        for line in lines:
+            if not line.strip():
+                continue
+            if ": " not in line:
+                raise InvalidSaveDataError(f"Invalid stash line: {line.strip()}")
+            item_id, quantity = line.split(": ", 1)
+            try:
+                page.append([item_id.strip(), int(quantity)])
+            except ValueError:
+                raise InvalidSaveDataError(f"Stash quantity must be an integer: {line.strip()}")
+
+        self.pages[page_no] = page
+        self.pages_read += 1
+        return page
+
+    def load_index(self):
+        """Read the index file, if the stash has been saved before"""
+        filename = os.path.join(self.directory, "stash.txt")
+        if not os.path.exists(filename):
+            return
+
+        try:
+            with open(filename, "r") as f:
+                lines = f.readlines()
+        except OSError:
+            raise SaveFileCorruptedError(f"Could not read the stash of '{self.account}'.")
+
+        try:
+            for line in lines:
+                if not line.strip():
+                    continue
+                key, value = line.strip().split(": ", 1)
+                if key == "PAGE_SIZE":
+                    self.page_size = int(value)
+                elif key == "SLOTS" and value:
+                    self.page_slots = [int(used) for used in value.split(",")]
+                elif key == "ITEM": # item_id=total@page,page
+                    item_id, rest = value.split("=", 1)
+                    total, pages = rest.split("@", 1)
+                    self.totals[item_id] = int(total)
+                    self.locations[item_id] = {int(page_no) for page_no in pages.split(",")}
+        except ValueError:
+            raise InvalidSaveDataError(f"Invalid stash index for '{self.account}'.")
+
+    def flush(self):
+        """
+        Write changed pages and, if anything changed, the index (deleting dropped pages)
+
+        Returns: Number of page files written
+        """
+        if not self.dirty and not self.index_dirty:
+            return 0
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        for page_no in self.dropped:
+            if os.path.exists(self.page_file(page_no)):
+                os.remove(self.page_file(page_no))
+
+        for page_no in sorted(self.dirty):
+            with open(self.page_file(page_no), "w") as f:
+                for item_id, quantity in self.pages[page_no]:
+                    f.write(f"{item_id}: {quantity}\n")
+
+        with open(os.path.join(self.directory, "stash.txt"), "w") as f:
+            f.write(f"PAGE_SIZE: {self.page_size}\n")
+            f.write(f"PAGES: {self.page_count}\n")
+            f.write(f"SLOTS: {','.join(str(used) for used in self.page_slots)}\n")
+            for item_id in sorted(self.totals):
+                pages = ",".join(str(page_no) for page_no in sorted(self.locations[item_id]))
+                f.write(f"ITEM: {item_id}={self.totals[item_id]}@{pages}\n")
+
+        written = len(self.dirty)
+        self.dirty = set()
+        self.dropped = set()
+        self.index_dirty = False
+        return written
+
+def open_stash(account, save_directory=DEFAULT_STASH_DIRECTORY):
+    """
+    Open an account's stash (only its index is read)
+
+    Returns: Stash
+    """
+    return Stash(account, save_directory)
+
+# ============================================================================
+# TESTING
+# ============================================================================
+
+if __name__ == "__main__":
+    print("=== STASH SYSTEM TEST ===")
+
+    # import character_manager
+    #
+    # hero = character_manager.create_character("Hero", "Warrior")
+    # hero['inventory'] = ["health_potion"] * 5
+    # stash = open_stash("Hero")
+    # stash.deposit(hero, "health_potion", 5)
+    # print(stash.view_page(0))
+    # print(f"{stash.flush()} page(s) written")
@@ -72,6 +72,13 @@ def test_invalid_item_type_exception():
     with pytest.raises(InvalidItemTypeError):
         inventory_system.use_item(char, "weapon1", item_data)
 
+def test_invalid_item_effect_exception():
+    """Test that malformed item effects are rejected when compiled"""
+    with pytest.raises(InvalidDataFormatError):
+        game_data.compile_item_effect("luck:5")
+    with pytest.raises(InvalidDataFormatError):
+        game_data.compile_item_effect("strength:5,magic")
+
 # ============================================================================
 # QUEST HANDLER EXCEPTION TESTS
 # ============================================================================
@@ -184,6 +191,21 @@ def test_combat_not_active_exception():
     with pytest.raises(CombatNotActiveError):
         battle.player_turn()
 
+def test_ability_on_cooldown_exception():
+    """Test that AbilityOnCooldownError is raised when an ability is reused too soon"""
+    import combat_system
+    
+    char = character_manager.create_character("Test", "Warrior")
+    enemy = combat_system.create_enemy("dragon")
+    cooldowns = combat_system.new_cooldown_state()
+    
+    combat_system.use_special_ability(char, enemy, cooldowns=cooldowns, turn=0)
+    with pytest.raises(AbilityOnCooldownError):
+        combat_system.use_special_ability(char, enemy, cooldowns=cooldowns, turn=1)
+    
+    # Power Strike has a 2 turn cooldown, so it is ready again on turn 3
+    combat_system.use_special_ability(char, enemy, cooldowns=cooldowns, turn=3)
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
 
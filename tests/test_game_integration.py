@@ -89,6 +89,253 @@ def test_inventory_item_management():
     assert "health_potion" not in char['inventory']  # Consumed
     assert char['health'] == 70  # Healed
 
+def test_inventory_counts_and_save_round_trip(tmp_path):
+    """Test the counted inventory keeps list behavior and saves in list form"""
+    char = character_manager.create_character("CountTest", "Rogue")
+    char['inventory'] = ["health_potion", "iron_sword", "health_potion"]
+    
+    assert inventory_system.count_item(char, "health_potion") == 2
+    assert isinstance(char['inventory'], inventory_system.Inventory)
+    assert char['inventory'] == ["health_potion", "health_potion", "iron_sword"]
+    assert inventory_system.get_inventory_space_remaining(char) == (
+        inventory_system.MAX_INVENTORY_SIZE - char['inventory'].slots)
+    
+    inventory_system.remove_item_from_inventory(char, "health_potion")
+    assert inventory_system.count_item(char, "health_potion") == 1
+    assert len(char['inventory']) == 2
+    
+    character_manager.save_character(char, str(tmp_path))
+    loaded = character_manager.load_character("CountTest", str(tmp_path))
+    assert sorted(loaded['inventory']) == ["health_potion", "iron_sword"]
+    assert inventory_system.has_item(loaded, "iron_sword")
+
+def test_stacked_items_and_bulk_use():
+    """Test consumables stack per slot and can be used several at once"""
+    from custom_exceptions import InventoryFullError, ItemNotFoundError
+    items = game_data.load_items("data/items.txt")
+    char = character_manager.create_character("StackTest", "Warrior")
+    
+    inventory_system.add_item_to_inventory(char, "health_potion", 15)
+    assert char['inventory'].slots == 2 # Stacks of 10 and 5
+    assert inventory_system.get_inventory_space_remaining(char) == inventory_system.MAX_INVENTORY_SIZE - 2
+    
+    char['health'] = 50
+    message = inventory_system.use_item(char, "health_potion", items["health_potion"], 5)
+    assert "x5" in message
+    assert char['health'] == inventory_system.get_effective_stats(char)['max_health'] # Capped once
+    assert inventory_system.count_item(char, "health_potion") == 10
+    assert char['inventory'].slots == 1
+    
+    with pytest.raises(ItemNotFoundError):
+        inventory_system.use_item(char, "health_potion", items["health_potion"], 11)
+    
+    # Non-stacking items still take a slot each
+    for i in range(inventory_system.MAX_INVENTORY_SIZE - 1):
+        inventory_system.add_item_to_inventory(char, "iron_sword")
+    with pytest.raises(InventoryFullError):
+        inventory_system.add_item_to_inventory(char, "iron_sword")
+    with pytest.raises(InventoryFullError): # The potion stack is full too
+        inventory_system.add_item_to_inventory(char, "health_potion")
+    inventory_system.remove_item_from_inventory(char, "health_potion")
+    inventory_system.add_item_to_inventory(char, "health_potion") # Tops up the open stack
+
+def test_stack_size_comes_from_item_data(monkeypatch):
+    """Test that item data sets stack sizes even when load_items has not recorded them"""
+    items = game_data.load_items("data/items.txt")
+    monkeypatch.setattr(game_data, "item_stack_sizes", {})
+    char = character_manager.create_character("StackData", "Warrior")
+    char['gold'] = 1000
+    
+    # Held before its data was seen: counted as 1 per slot, then corrected
+    char['inventory'] = ["health_potion"] * 3
+    assert char['inventory'] == ["health_potion"] * 3
+    assert inventory_system.get_inventory(char).slots == 3
+    inventory_system.purchase_item(char, "health_potion", items["health_potion"])
+    assert char['inventory'].slots == 1
+    
+    inventory_system.add_item_to_inventory(char, "mana_tonic", 12, {'type': 'consumable'})
+    inventory_system.process_transaction(char, items, buys=[("health_potion", 6)])
+    assert char['inventory'].slots == 3 # 10 potions, then tonics as 10 + 2
+
+def test_rejected_purchase_leaves_slots_unchanged():
+    """Test that a purchase that does not fit leaves no stack entry behind"""
+    from custom_exceptions import InventoryFullError
+    items = game_data.load_items("data/items.txt")
+    char = character_manager.create_character("RejectTest", "Warrior")
+    char['gold'] = 10000
+    char['inventory'] = [f"trinket_{i}" for i in range(inventory_system.MAX_INVENTORY_SIZE)]
+    inventory = inventory_system.get_inventory(char)
+    slots = inventory.slots
+    
+    with pytest.raises(InventoryFullError):
+        inventory_system.purchase_item(char, "health_potion", items["health_potion"])
+    with pytest.raises(InventoryFullError):
+        inventory_system.process_transaction(char, items, buys=[("iron_sword", 1)])
+    inventory.set_stack_size("mana_tonic", 5) # Not held: nothing to remember
+    
+    assert inventory.slots == slots and char['gold'] == 10000
+    assert set(inventory.stacks) == set(inventory.counts)
+    
+    inventory_system.remove_item_from_inventory(char, "trinket_0")
+    inventory_system.purchase_item(char, "health_potion", items["health_potion"])
+    assert inventory.stacks["health_potion"] == game_data.get_stack_size("health_potion", items["health_potion"])
+    assert inventory.slots == slots
+
+def test_stash_pages_load_lazily(tmp_path):
+    """Test stash deposits, paging, dirty write-back and lazy page reads"""
+    import stash_system
+    from custom_exceptions import InventoryFullError, ItemNotFoundError
+    game_data.load_items("data/items.txt")
+    char = character_manager.create_character("StashTest", "Warrior")
+    stash = stash_system.Stash("StashTest", str(tmp_path), page_size=4, max_pages=3)
+    
+    char['inventory'] = [f"trophy_{i}" for i in range(10)] + ["health_potion"] * 15
+    for i in range(10):
+        stash.deposit(char, f"trophy_{i}")
+    stash.deposit(char, "health_potion", 15) # Two stacks
+    assert stash.page_count == 3 and stash.free_slots() == 0
+    assert stash.count("health_potion") == 15 and len(char['inventory']) == 0
+    
+    with pytest.raises(ItemNotFoundError):
+        stash.deposit(char, "health_potion")
+    char['inventory'] = ["iron_sword"]
+    with pytest.raises(InventoryFullError):
+        stash.deposit(char, "iron_sword")
+    assert "iron_sword" in char['inventory']
+    assert stash.flush() == 3 and stash.flush() == 0
+    
+    # Reopening reads only the index; pages load when viewed or needed
+    stash = stash_system.open_stash("StashTest", str(tmp_path))
+    assert stash.pages_read == 0 and stash.count("trophy_3") == 1
+    assert stash.view_page(0) == [("trophy_0", 1), ("trophy_1", 1), ("trophy_2", 1), ("trophy_3", 1)]
+    stash.withdraw(char, "health_potion", 6)
+    assert stash.pages_read == 2 and inventory_system.count_item(char, "health_potion") == 6
+    assert stash.view_page(2) == [("trophy_8", 1), ("trophy_9", 1), ("health_potion", 9)]
+    assert stash.flush() == 1 # Only the page that changed
+    
+    char['inventory'] = [f"junk_{i}" for i in range(inventory_system.MAX_INVENTORY_SIZE)]
+    with pytest.raises(InventoryFullError):
+        stash.withdraw(char, "trophy_0")
+    assert stash.count("trophy_0") == 1
+
+def test_stash_stack_sizes_and_trailing_pages(tmp_path, monkeypatch):
+    """Test the stash stacks by item data and drops pages emptied at the end"""
+    import stash_system
+    items = game_data.load_items("data/items.txt")
+    monkeypatch.setattr(game_data, "item_stack_sizes", {})
+    char = character_manager.create_character("StashStack", "Warrior")
+    stash = stash_system.Stash("StashStack", str(tmp_path), page_size=2, max_pages=5)
+
+    # Stacked by the data the inventory was given, not the (empty) global table
+    inventory_system.add_item_to_inventory(char, "health_potion", 15, items["health_potion"])
+    stash.deposit(char, "health_potion", 15)
+    assert stash.page_slots == [2]
+    inventory_system.add_item_to_inventory(char, "mana_tonic", 4)
+    stash.deposit(char, "mana_tonic", 4, {'type': 'consumable'})
+    assert stash.page_slots == [2, 1]
+
+    char['inventory'] = [f"trophy_{i}" for i in range(3)]
+    for i in range(3):
+        stash.deposit(char, f"trophy_{i}")
+    assert stash.page_count == 3
+    stash.flush()
+    assert os.path.exists(stash.page_file(2))
+
+    stash.withdraw(char, "health_potion", 15, items["health_potion"])
+    assert char['inventory'].slots == 2 # Stacks of 10 and 5
+    for i in range(3):
+        stash.withdraw(char, f"trophy_{i}")
+    assert stash.page_slots == [0, 1] # Only the empty pages at the end go
+
+    stash.flush()
+    assert not os.path.exists(stash.page_file(2))
+    stash = stash_system.open_stash("StashStack", str(tmp_path))
+    assert stash.page_count == 2 and stash.count("mana_tonic") == 4
+    stash.withdraw(char, "mana_tonic", 4)
+    assert stash.page_count == 0
+    stash.flush()
+    assert os.listdir(stash.directory) == ["stash.txt"]
+
+def test_inventory_event_log_rebuilds_history(tmp_path):
+    """Test the event log rotates, checkpoints and rebuilds past inventories"""
+    import itertools
+    import inventory_log
+    from custom_exceptions import CharacterNotFoundError
+    items = game_data.load_items("data/items.txt")
+    clock = itertools.count(1000)
+    log = inventory_log.EventLog(str(tmp_path), buffer_size=256, max_segment_bytes=600,
+                                 checkpoint_interval=4, clock=lambda: float(next(clock)))
+    previous = inventory_system.set_event_log(log)
+    char = character_manager.create_character("LogTest", "Warrior")
+    history = [] # (time of last event, inventory, gold)
+    try:
+        for i in range(12):
+            inventory_system.purchase_item(char, "health_potion", items["health_potion"])
+            if i % 3 == 2:
+                inventory_system.use_item(char, "health_potion", items["health_potion"])
+            if i % 4 == 3:
+                inventory_system.sell_item(char, "health_potion", items["health_potion"])
+            character_manager.add_gold(char, 25)
+            history.append((log.clock() - 0.5, dict(char['inventory'].items()), char['gold']))
+        inventory_system.process_transaction(char, items, buys=[("iron_sword", 1)])
+        
+        # A multi-line cart for a character with no checkpoint yet
+        buyer = character_manager.create_character("CartTest", "Mage")
+        buyer['gold'] = 1000
+        inventory_system.process_transaction(buyer, items, buys=[("health_potion", 2), ("iron_sword", 1)])
+        log.close()
+    finally:
+        inventory_system.set_event_log(previous)
+    
+    cart = inventory_log.rebuild_inventory(str(tmp_path), "CartTest")
+    assert cart['inventory'] == {"health_potion": 2, "iron_sword": 1}
+    assert cart['gold'] == buyer['gold'] == 850
+    
+    assert len(inventory_log.list_segments(str(tmp_path))) > 1
+    for at, inventory, gold in history:
+        state = inventory_log.rebuild_inventory(str(tmp_path), "LogTest", at)
+        assert state['inventory'] == inventory and state['gold'] == gold
+        assert state['replayed'] < 8 # Starts from a recent checkpoint
+    
+    final = inventory_log.rebuild_inventory(str(tmp_path), "LogTest")
+    assert final['inventory'] == dict(char['inventory'].items()) and final['gold'] == char['gold']
+    sells = inventory_log.read_events(str(tmp_path), "LogTest", op="sell")
+    assert len(sells) == 3 and all(event['gold_delta'] > 0 for event in sells)
+    with pytest.raises(CharacterNotFoundError):
+        inventory_log.rebuild_inventory(str(tmp_path), "LogTest", at=999)
+
+def test_event_log_counts_battle_and_quest_gold(tmp_path):
+    """Test that battle and quest rewards are logged, so rebuilt gold matches"""
+    import inventory_log
+    items = game_data.load_items("data/items.txt")
+    quests = game_data.load_quests("data/quests.txt")
+    log = inventory_log.EventLog(str(tmp_path), checkpoint_interval=100)
+    previous = inventory_system.set_event_log(log)
+    char = character_manager.create_character("RewardLog", "Warrior")
+    ally = character_manager.create_character("RewardAlly", "Cleric")
+    for member in (char, ally):
+        member['strength'] = member['max_health'] = member['health'] = 1000
+    try:
+        inventory_system.purchase_item(char, "health_potion", items["health_potion"])
+
+        result = combat_system.SimpleBattle(char, combat_system.create_enemy("goblin"), seed=3,
+                                            action_provider=lambda battle: '1').start_battle()
+        assert result['winner'] == 'player' and result['gold_gained'] > 0
+        inventory_system.purchase_item(char, "health_potion", items["health_potion"])
+
+        quest_handler.accept_quest(char, "first_steps", quests)
+        quest_handler.complete_quest(char, "first_steps", quests)
+        group = combat_system.GroupBattle([char, ally], [combat_system.create_enemy("orc")], seed=5)
+        assert group.start_battle()['winner'] == 'party'
+        inventory_system.purchase_item(char, "health_potion", items["health_potion"])
+        log.close()
+    finally:
+        inventory_system.set_event_log(previous)
+
+    state = inventory_log.rebuild_inventory(str(tmp_path), "RewardLog")
+    assert state['gold'] == char['gold'] and state['replayed'] == 5 # After the first purchase
+    assert len(inventory_log.read_events(str(tmp_path), "RewardLog", op="gold")) == 3
+
 def test_equipment_system():
     """Test equipping weapons and armor"""
     char = character_manager.create_character("EquipTest", "Warrior")
@@ -100,9 +347,71 @@ def test_equipment_system():
     
     inventory_system.equip_weapon(char, "iron_sword", weapon_data)
     
-    assert char['strength'] == original_strength + 5
-    assert 'equipped_weapon' in char
-    assert char['equipped_weapon'] == "iron_sword"
+    # Base strength is untouched; the bonus shows up in the effective stats
+    assert char['strength'] == original_strength
+    assert inventory_system.get_effective_stats(char)['strength'] == original_strength + 5
+    assert inventory_system.get_equipped_item(char, 'weapon') == "iron_sword"
+
+def test_compiled_multi_stat_effects():
+    """Test that item effects are compiled once and swapped cleanly on re-equip"""
+    assert game_data.compile_item_effect("strength:5,magic:3") == ((2, 5), (3, 3))
+    items = game_data.load_items("data/items.txt")
+    assert items['iron_sword']['compiled_effect'] == ((2, 5),)
+    
+    char = character_manager.create_character("CompiledTest", "Mage")
+    strength, magic = char['strength'], char['magic']
+    runed_blade = {'type': 'weapon', 'effect': 'strength:5,magic:3'}
+    
+    inventory_system.add_item_to_inventory(char, "runed_blade")
+    inventory_system.add_item_to_inventory(char, "iron_sword")
+    inventory_system.equip_weapon(char, "runed_blade", runed_blade)
+    stats = inventory_system.get_effective_stats(char)
+    assert (stats['strength'], stats['magic']) == (strength + 5, magic + 3)
+    
+    # Swapping weapons removes the old weapon's bonus, not the new one's
+    inventory_system.equip_weapon(char, "iron_sword", items['iron_sword'])
+    stats = inventory_system.get_effective_stats(char)
+    assert (stats['strength'], stats['magic']) == (strength + 5, magic)
+    assert "runed_blade" in char['inventory']
+    
+    assert inventory_system.unequip_weapon(char) == "iron_sword"
+    stats = inventory_system.get_effective_stats(char)
+    assert (stats['strength'], stats['magic']) == (strength, magic)
+
+def test_equipment_slots_and_effective_stat_cache(tmp_path):
+    """Test extra slots, effective stat caching, and equipment in saves"""
+    items = game_data.load_items("data/items.txt")
+    char = character_manager.create_character("SlotTest", "Warrior")
+    base_max = char['max_health']
+    
+    for item_id in ["ruby_ring", "leather_armor"]:
+        inventory_system.add_item_to_inventory(char, item_id)
+    inventory_system.equip_item(char, "ruby_ring", items['ruby_ring'])
+    inventory_system.equip_armor(char, "leather_armor", items['leather_armor'])
+    
+    stats = inventory_system.get_effective_stats(char)
+    assert stats['max_health'] == base_max + 5 + 10
+    assert char['max_health'] == base_max
+    assert inventory_system.get_effective_stats(char) is stats # Cached until gear or level changes
+    
+    # Combat reads the effective stats
+    enemy = combat_system.create_enemy("goblin")
+    assert combat_system.build_damage_table(char, enemy)[0] == stats['strength'] - enemy['strength'] // 4
+    
+    character_manager.heal_character(char, 100)
+    assert char['health'] == base_max + 15
+    
+    character_manager.gain_experience(char, 100)
+    assert inventory_system.get_effective_stats(char) is not stats
+    
+    character_manager.save_character(char, str(tmp_path))
+    loaded = character_manager.load_character("SlotTest", str(tmp_path))
+    assert loaded['equipment'] == {'ring': "ruby_ring", 'armor': "leather_armor"}
+    assert inventory_system.get_effective_stats(loaded) == inventory_system.get_effective_stats(char)
+    
+    # Unequipping gear clamps health to the new max
+    inventory_system.unequip_item(loaded, 'armor')
+    assert loaded['health'] == inventory_system.get_effective_stats(loaded)['max_health']
 
 def test_shop_system():
     """Test buying and selling items"""
@@ -123,6 +432,149 @@ def test_shop_system():
     assert gold_received == 12  # Half of cost (25 // 2)
     assert "health_potion" not in char['inventory']
 
+def test_shop_transaction_is_all_or_nothing():
+    """Test that a shop cart applies completely or not at all"""
+    from custom_exceptions import InsufficientResourcesError, InventoryFullError
+    items = game_data.load_items("data/items.txt")
+    char = character_manager.create_character("CartTest", "Rogue")
+    char['inventory'] = ["iron_sword"]
+    
+    receipt = inventory_system.process_transaction(
+        char, items, buys=[("health_potion", 3)], sells=[("iron_sword", 1)])
+    assert receipt['gold_earned'] == 50
+    assert receipt['gold_spent'] == 75
+    assert receipt['gold_after'] == char['gold'] == 75
+    assert inventory_system.count_item(char, "health_potion") == 3
+    assert "iron_sword" not in char['inventory']
+    assert [line['action'] for line in receipt['lines']] == ['sell', 'buy']
+    
+    # The steel sword is unaffordable, so the potion in the same cart is not bought either
+    with pytest.raises(InsufficientResourcesError):
+        inventory_system.process_transaction(
+            char, items, buys=[("health_potion", 1), ("steel_sword", 1)])
+    assert char['gold'] == 75
+    assert inventory_system.count_item(char, "health_potion") == 3
+    
+    char['gold'] = 1000
+    char['inventory'] = [f"trinket_{i}" for i in range(inventory_system.MAX_INVENTORY_SIZE - 1)]
+    with pytest.raises(InventoryFullError): # Potions stack, but two swords need two slots
+        inventory_system.process_transaction(
+            char, items, buys=[("health_potion", 10), ("iron_sword", 2)])
+    assert char['gold'] == 1000
+
+def test_shop_catalog_queries():
+    """Test filtering, sorting and paging the indexed shop catalog"""
+    import shop_catalog
+    catalog = shop_catalog.ShopCatalog(game_data.load_items("data/items.txt"))
+    
+    weapons = catalog.query(item_type="weapon", max_cost=200)
+    assert [item['item_id'] for item in weapons['items']] == ["iron_sword", "fire_staff"]
+    
+    by_name = catalog.query(prefix="ST", sort="name")
+    assert [item['name'] for item in by_name['items']] == ["Steel Armor", "Steel Sword", "Strength Elixir"]
+    
+    health_gear = catalog.query(stat="max_health", sort="cost_desc")
+    costs = [item['cost'] for item in health_gear['items']]
+    assert costs == sorted(costs, reverse=True) and health_gear['total'] == 3
+    
+    page = catalog.query(page=3, page_size=5)
+    assert page['pages'] == 3 and len(page['items']) == page['total'] - 10
+    assert catalog.query(prefix="zz")['total'] == 0
+    
+    with pytest.raises(ValueError):
+        catalog.query(sort="rarity")
+
+def test_shop_catalog_uses_current_prices():
+    """Test that catalog cost filters and sorts follow the prices the shop shows"""
+    import shop_catalog
+    import shop_pricing
+    items = game_data.load_items("data/items.txt")
+    catalog = shop_catalog.ShopCatalog(items)
+    engine = shop_pricing.PricingEngine(items, elasticity=0.1, floor=0.5, ceiling=1.5)
+    previous = inventory_system.set_pricing_engine(engine)
+    try:
+        engine.record_sell("steel_sword", 100) # 250 -> 125
+        engine.record_buy("iron_sword", 100)   # 100 -> 150
+        engine.tick()
+
+        cheap = catalog.query(item_type="weapon", max_cost=130)
+        assert [item['item_id'] for item in cheap['items']] == ["steel_sword"]
+
+        weapons = catalog.query(item_type="weapon")
+        assert [item['item_id'] for item in weapons['items']] == ["steel_sword", "iron_sword", "fire_staff"]
+
+        listing = catalog.query(page_size=len(items))['items']
+        prices = [inventory_system.get_buy_price(item) for item in listing]
+        assert prices == sorted(prices)
+
+        engine.record_sell("iron_sword", 1000) # Re-sorted after the next tick
+        engine.tick()
+        weapons = catalog.query(item_type="weapon", sort="cost_desc")
+        assert [item['item_id'] for item in weapons['items']] == ["fire_staff", "steel_sword", "iron_sword"]
+    finally:
+        inventory_system.set_pricing_engine(previous)
+
+    cheap = catalog.query(item_type="weapon", max_cost=130) # Base costs again
+    assert [item['item_id'] for item in cheap['items']] == ["iron_sword"]
+
+def test_dynamic_shop_pricing():
+    """Test that shop prices follow demand within the floor and ceiling"""
+    import shop_pricing
+    items = game_data.load_items("data/items.txt")
+    engine = shop_pricing.PricingEngine(items, elasticity=0.1, floor=0.5, ceiling=1.5)
+    previous = inventory_system.set_pricing_engine(engine)
+    try:
+        char = character_manager.create_character("PriceTest", "Cleric")
+        char['gold'] = 10000
+        inventory_system.process_transaction(char, items, buys=[("health_potion", 3)])
+        inventory_system.purchase_item(char, "iron_sword", items['iron_sword'])
+        inventory_system.sell_item(char, "iron_sword", items['iron_sword'])
+        engine.record_sell("steel_sword", 100)
+        engine.tick()
+        
+        assert engine.buy_price("health_potion") == round(25 * 1.3)
+        assert engine.buy_price("iron_sword") == 100 # Bought and sold once: no change
+        assert engine.buy_price("steel_sword") == 125 # Clamped at the floor
+        
+        # Purchases read the new price
+        gold = char['gold']
+        inventory_system.purchase_item(char, "health_potion", items['health_potion'])
+        assert char['gold'] == gold - 32
+        assert inventory_system.get_sell_price(items['health_potion']) == 16
+        
+        for _ in range(20):
+            engine.record_buy("health_potion", 10)
+            engine.tick()
+        assert engine.buy_price("health_potion") == round(25 * 1.5)
+    finally:
+        inventory_system.set_pricing_engine(previous)
+
+def test_shop_pricing_numpy_matches_python():
+    """Test that the NumPy tick produces exactly the prices of the pure Python tick"""
+    pytest.importorskip("numpy")
+    import random
+    import shop_pricing
+    items = game_data.load_items("data/items.txt")
+    engines = [shop_pricing.PricingEngine(items, elasticity=0.07, use_numpy=use_numpy)
+               for use_numpy in (True, False)]
+    assert engines[0].use_numpy and not engines[1].use_numpy
+    
+    rng = random.Random(5)
+    for _ in range(50):
+        trades = [(rng.choice(list(items)), rng.randint(1, 20), rng.random() < 0.5) for _ in range(10)]
+        for engine in engines:
+            for item_id, quantity, buying in trades:
+                if buying:
+                    engine.record_buy(item_id, quantity)
+                else:
+                    engine.record_sell(item_id, quantity)
+            engine.tick()
+        
+        for item_id in items:
+            assert engines[0].buy_price(item_id) == engines[1].buy_price(item_id)
+            assert engines[0].sell_price(item_id) == engines[1].sell_price(item_id)
+            assert type(engines[0].buy_price(item_id)) is int
+
 # ============================================================================
 # QUEST INTEGRATION TESTS
 # ============================================================================
@@ -187,6 +639,195 @@ def test_quest_prerequisite_system():
     quest_handler.accept_quest(char, 'second_quest', quests)
     assert 'second_quest' in char['active_quests']
 
+def test_quest_dependency_index():
+    """Test prerequisite chains, unlocks and cycle detection from the quest index"""
+    quests = game_data.load_quests("data/quests.txt")
+    index = quest_handler.build_quest_index(quests)
+    
+    assert quest_handler.get_quest_prerequisite_chain("orc_menace", quests)[0] == "first_steps"
+    assert set(quest_handler.get_quest_unlocks("first_steps", quests)) >= {"goblin_hunter", "equipment_upgrade"}
+    every_unlock = quest_handler.get_quest_unlocks("first_steps", quests, transitive=True)
+    assert len(every_unlock) == len(quests) - 1
+    assert index.requires("orc_menace", "first_steps") and not index.requires("first_steps", "orc_menace")
+    for quest_id in index.order: # Prerequisites come first
+        if index.parent[quest_id] is not None:
+            assert index.position[index.parent[quest_id]] < index.position[quest_id]
+            assert index.depth[quest_id] == index.depth[index.parent[quest_id]] + 1
+    assert quest_handler.get_quest_index(quests) is index # Reused, not rebuilt
+    
+    looped = {
+        'a': {'quest_id': 'a', 'required_level': 1, 'prerequisite': 'c'},
+        'b': {'quest_id': 'b', 'required_level': 1, 'prerequisite': 'a'},
+        'c': {'quest_id': 'c', 'required_level': 1, 'prerequisite': 'b'}
+    }
+    from custom_exceptions import InvalidDataFormatError
+    with pytest.raises(InvalidDataFormatError):
+        quest_handler.get_quest_prerequisite_chain('a', looped)
+
+def test_available_quests_update_incrementally():
+    """Test the available quest set follows accepts, completions and level-ups"""
+    quests = game_data.load_quests("data/quests.txt")
+    char = character_manager.create_character("AvailTest", "Mage")
+    
+    def brute_force():
+        return sorted(quest_id for quest_id, quest in quests.items()
+                      if char['level'] >= quest['required_level']
+                      and (quest['prerequisite'] == "NONE" or quest['prerequisite'] in char['completed_quests'])
+                      and quest_id not in char['completed_quests'] and quest_id not in char['active_quests'])
+    
+    def available():
+        return sorted(quest['quest_id'] for quest in quest_handler.get_available_quests(char, quests))
+    
+    assert available() == brute_force() == ["first_steps"]
+    availability = char['quest_availability']
+    
+    quest_handler.accept_quest(char, "first_steps", quests)
+    assert available() == [] and not quest_handler.can_accept_quest(char, "first_steps", quests)
+    quest_handler.complete_quest(char, "first_steps", quests)
+    assert available() == brute_force() == [] # Unlocked quests need level 2
+    
+    character_manager.gain_experience(char, 100)
+    assert available() == brute_force() == ["equipment_upgrade", "goblin_hunter"]
+    assert quest_handler.can_accept_quest(char, "goblin_hunter", quests) is True
+    quest_handler.accept_quest(char, "goblin_hunter", quests)
+    quest_handler.abandon_quest(char, "goblin_hunter")
+    assert available() == brute_force()
+    assert char['quest_availability'] is availability # Updated in place, never rebuilt
+    
+    char['completed_quests'].append("goblin_hunter") # Changed behind the module's back
+    char['level'] = 10
+    assert available() == brute_force()
+    
+    # A hand-edited save already holds a quest that completing its prerequisite unlocks
+    char = character_manager.create_character("EditedSave", "Mage")
+    char['level'] = 2
+    char['active_quests'] = ["first_steps", "goblin_hunter"]
+    assert available() == brute_force()
+    quest_handler.complete_quest(char, "first_steps", quests)
+    assert "goblin_hunter" not in available()
+    assert available() == brute_force()
+    assert quest_handler.can_accept_quest(char, "goblin_hunter", quests) is False
+
+def test_quest_state_bitsets_and_compact_save(tmp_path):
+    """Test quest lists become bitsets over interned IDs and save compactly"""
+    quests = game_data.load_quests("data/quests.txt")
+    char = character_manager.create_character("BitsTest", "Cleric")
+    char['completed_quests'].append("first_steps")
+    char['level'] = 3
+    
+    quest_handler.accept_quest(char, "goblin_hunter", quests)
+    quest_handler.complete_quest(char, "goblin_hunter", quests)
+    quest_handler.accept_quest(char, "orc_menace", quests)
+    completed = char['completed_quests']
+    assert isinstance(completed, quest_handler.QuestSet)
+    assert completed == ["first_steps", "goblin_hunter"] and len(completed) == 2
+    assert quest_handler.is_quest_completed(char, "goblin_hunter") is True
+    assert quest_handler.is_quest_active(char, "goblin_hunter") is False
+    assert completed.bits & char['active_quests'].bits == 0
+    
+    character_manager.save_character(char, str(tmp_path))
+    save_file = os.path.join(str(tmp_path), "BitsTest_save.txt")
+    with open(save_file) as f:
+        saved = f.read()
+    assert "COMPLETED_QUESTS: ~" in saved and "QUEST_IDS: " in saved
+    loaded = character_manager.load_character("BitsTest", str(tmp_path))
+    assert loaded['completed_quests'] == completed and loaded['active_quests'] == ["orc_menace"]
+    
+    # A quest inserted at the top of the file renumbers everything in the next run
+    original = (list(game_data.quest_ids), dict(game_data.quest_numbers))
+    try:
+        game_data.quest_ids.clear()
+        game_data.quest_numbers.clear()
+        for quest_id in ["new_first_quest"] + original[0]:
+            game_data.intern_quest_id(quest_id)
+        
+        loaded = character_manager.load_character("BitsTest", str(tmp_path))
+        assert loaded['completed_quests'] == ["first_steps", "goblin_hunter"]
+        assert loaded['active_quests'] == ["orc_menace"]
+        
+        # Without the saved IDs (or with the wrong ones) the save cannot be mapped
+        from custom_exceptions import InvalidSaveDataError
+        table = saved.split("QUEST_IDS: ", 1)[1].split("\n", 1)[0]
+        for replacement in ("", table.replace("goblin_hunter", "goblin_hunted")):
+            with open(save_file, "w") as f:
+                f.write(saved.replace(f"QUEST_IDS: {table}", f"QUEST_IDS: {replacement}"))
+            with pytest.raises(InvalidSaveDataError):
+                character_manager.load_character("BitsTest", str(tmp_path))
+    finally:
+        game_data.quest_ids[:] = original[0]
+        game_data.quest_numbers.clear()
+        game_data.quest_numbers.update(original[1])
+
+def test_quests_by_level_index_and_hot_reload(tmp_path):
+    """Test level range queries use the index and follow a hot reload"""
+    from custom_exceptions import InvalidDataFormatError
+    quest_file = tmp_path / "quests.txt"
+    with open("data/quests.txt") as f:
+        original = f.read()
+    quest_file.write_text(original)
+    quests = game_data.load_quests(str(quest_file))
+    
+    def levels(min_level, max_level):
+        return [quest['required_level'] for quest in quest_handler.get_quests_by_level(quests, min_level, max_level)]
+    
+    expected = sorted(quest['required_level'] for quest in quests.values() if 2 <= quest['required_level'] <= 5)
+    assert levels(2, 5) == expected
+    assert levels(2, 2) == [2, 2] and levels(50, 60) == []
+    
+    char = character_manager.create_character("ReloadTest", "Rogue")
+    char['level'] = 99
+    before = len(quest_handler.get_available_quests(char, quests))
+    
+    quest_file.write_text(original + "\n\nQUEST_ID: late_quest\nTITLE: Late\nDESCRIPTION: New\n"
+                          "REWARD_XP: 1\nREWARD_GOLD: 1\nREQUIRED_LEVEL: 2\nPREREQUISITE: NONE\n")
+    changes = quest_handler.reload_quests(quests, str(quest_file))
+    assert changes == {'added': ['late_quest'], 'removed': [], 'changed': []}
+    assert "late_quest" in quests and levels(2, 2) == [2, 2, 2]
+    assert len(quest_handler.get_available_quests(char, quests)) == before + 1
+    
+    quest_file.write_text(original.replace("PREREQUISITE: NONE", "PREREQUISITE: first_steps", 1))
+    with pytest.raises(InvalidDataFormatError): # Cycle: the old data stays in place
+        quest_handler.reload_quests(quests, str(quest_file))
+    assert "late_quest" in quests and levels(2, 2) == [2, 2, 2]
+
+def test_quest_reward_totals_and_audit(tmp_path):
+    """Test running quest totals, their audit, saving and the leaderboard"""
+    quests = game_data.load_quests("data/quests.txt")
+    hero = character_manager.create_character("TotalsHero", "Warrior")
+    rookie = character_manager.create_character("TotalsRookie", "Mage")
+    hero['level'] = 10
+    
+    for quest_id in ["first_steps", "goblin_hunter", "orc_menace"]:
+        quest_handler.accept_quest(hero, quest_id, quests)
+        quest_handler.complete_quest(hero, quest_id, quests)
+    expected_xp = sum(quests[quest_id]['reward_xp'] for quest_id in ["first_steps", "goblin_hunter", "orc_menace"])
+    
+    totals = quest_handler.get_total_quest_rewards_earned(hero, quests)
+    assert totals['total_xp'] == expected_xp
+    assert hero['quest_stats']['by_band'] == {"1-5": 3}
+    assert quest_handler.audit_quest_stats(hero, quests) == {}
+    
+    hero['quest_stats']['total_gold'] += 999 # Tampered totals are caught and repaired
+    mismatches = quest_handler.audit_quest_stats(hero, quests, repair=True)
+    assert list(mismatches) == ['total_gold']
+    assert quest_handler.audit_quest_stats(hero, quests) == {}
+    
+    character_manager.save_character(hero, str(tmp_path))
+    loaded = character_manager.load_character("TotalsHero", str(tmp_path))
+    assert loaded['quest_stats'] == hero['quest_stats']
+    
+    board = quest_handler.get_quest_leaderboard([rookie, loaded], quests, stat="completed")
+    assert board == [("TotalsHero", 3), ("TotalsRookie", 0)]
+    
+    # Reloaded rewards are picked up by running and saved totals alike
+    quest_file = tmp_path / "quests.txt"
+    with open("data/quests.txt") as f:
+        quest_file.write_text(f.read().replace("REWARD_XP: 50\n", "REWARD_XP: 80\n", 1))
+    quest_handler.reload_quests(quests, str(quest_file))
+    for character in (hero, loaded):
+        assert quest_handler.get_total_quest_rewards_earned(character, quests)['total_xp'] == expected_xp + 30
+        assert quest_handler.audit_quest_stats(character, quests) == {}
+
 # ============================================================================
 # COMBAT INTEGRATION TESTS
 # ============================================================================
@@ -222,6 +863,335 @@ def test_combat_victory_rewards():
     assert rewards['xp'] == expected_xp
     assert rewards['gold'] == expected_gold
 
+def test_spawn_tables_by_level():
+    """Test that spawn tables only pick enemies listed for the level band"""
+    import random
+    rng = random.Random(163)
+    
+    for level in [1, 2, 4, 6, 50]:
+        band = [b for b in combat_system.SPAWN_TABLES
+                if b[0] <= level and (b[1] is None or level <= b[1])][0]
+        allowed = {enemy_type for enemy_type, weight in band[2]}
+        
+        for _ in range(200):
+            assert combat_system.pick_enemy_type_for_level(level, rng) in allowed
+    
+    enemy = combat_system.get_random_enemy_for_level(1, rng)
+    assert enemy['name'] in ("Goblin", "Orc")
+
+def test_alias_table_matches_weights():
+    """Test that the alias sampler reproduces the configured weights"""
+    probabilities, aliases = combat_system.build_alias_table([1, 3])
+    
+    # Column 0 keeps half its mass and hands the rest to column 1
+    assert probabilities == [0.5, 1.0]
+    assert aliases[0] == 1
+
+def test_battle_log_batches_events(tmp_path):
+    """Test that the battle log buffers events and flushes them in batches"""
+    log_file = tmp_path / "battle.jsonl"
+    log = combat_system.BattleLog(combat_system.JsonLinesSink(str(log_file)), capacity=8, flush_every=3)
+    
+    log.record(1, "Hero", "attack", "Goblin", 12, 38)
+    log.record(1, "Goblin", "attack", "Hero", 5, 115)
+    assert not log_file.exists()  # Nothing written until a batch fills
+    
+    log.record(2, "Hero", "attack", "Goblin", 12, 26)
+    log.record(2, "Goblin", "attack", "Hero", 5, 110)
+    log.close()
+    
+    lines = log_file.read_text().splitlines()
+    assert len(lines) == 4
+    assert '"hp_after": 26' in lines[2]
+    assert len(log.events()) == 4
+
+def test_seeded_battles_are_reproducible(monkeypatch):
+    """Test that two battles with the same seed play out identically"""
+    monkeypatch.setattr("builtins.input", lambda prompt="": "2")  # Always use the special ability
+    
+    outcomes = []
+    for _ in range(2):
+        char = character_manager.create_character("SeedTest", "Rogue")
+        enemy = combat_system.create_enemy("orc")
+        log = combat_system.BattleLog(combat_system.NullSink())
+        
+        result = combat_system.SimpleBattle(char, enemy, log=log, seed=2025).start_battle()
+        outcomes.append((result, log.events(), char['health']))
+    
+    assert outcomes[0] == outcomes[1]
+    assert outcomes[0][0]['seed'] == 2025
+
+def test_battle_replay_round_trip(tmp_path):
+    """Test that a recorded battle replays to the same final state"""
+    char = character_manager.create_character("ReplayTest", "Rogue")
+    enemy = combat_system.create_enemy("orc")
+    actions = iter("1212121212121212")
+    
+    battle = combat_system.SimpleBattle(char, enemy, log=combat_system.BattleLog(), seed=7,
+                                        action_provider=lambda b: next(actions), record=True)
+    battle.start_battle()
+    replay = battle.replay
+    
+    assert combat_system.replay_battle(replay)['ok']
+    
+    # Save a good and a tampered copy, then replay the whole directory
+    combat_system.save_replay(replay, str(tmp_path / "good.json"))
+    replay['final']['gold'] += 1
+    combat_system.save_replay(replay, str(tmp_path / "tampered.json"))
+    
+    summary = combat_system.replay_directory(str(tmp_path))
+    assert summary['total'] == 2
+    assert summary['passed'] == 1
+    assert summary['failed'] == ["tampered.json"]
+    
+    # An injected rng has no seed to replay from
+    import random
+    with pytest.raises(ValueError):
+        combat_system.SimpleBattle(char, enemy, log=combat_system.BattleLog(),
+                                   rng=random.Random(7), record=True)
+
+def test_battle_scheduler_runs_concurrent_battles():
+    """Test that the asyncio scheduler finishes battles and auto-attacks on timeout"""
+    import asyncio
+    import battle_scheduler
+    
+    async def run_battles():
+        scheduler = battle_scheduler.BattleScheduler(turn_timeout=0.01)
+        for i in range(3):
+            char = character_manager.create_character(f"Async{i}", "Warrior")
+            scheduler.start_battle(i, char, combat_system.create_enemy("goblin"), seed=i)
+        
+        assert scheduler.get_metrics()['active_battles'] == 3
+        for _ in range(5):
+            scheduler.submit_action(0, '2')  # Battle 0 gets actions, the rest time out
+        
+        results = await scheduler.wait_all()
+        return results, scheduler.get_metrics()
+    
+    results, metrics = asyncio.run(run_battles())
+    
+    assert all(result['winner'] == 'player' for result in results.values())
+    assert metrics['active_battles'] == 0
+    assert metrics['completed_battles'] == 3
+    assert metrics['timeouts'] > 0
+    assert metrics['average_turn_latency'] > 0
+
+def test_registered_ability_is_dispatched():
+    """Test that a newly registered class ability is used without dispatcher changes"""
+    def smite(character, enemy, rng):
+        enemy['health'] -= 7
+        return "Smite!"
+    
+    slots_before = len(combat_system.new_cooldown_state())
+    combat_system.register_ability("Paladin", combat_system.Ability("Smite", smite, cooldown=1))
+    try:
+        char = {'name': 'Pal', 'class': 'Paladin', 'health': 100, 'max_health': 100}
+        enemy = combat_system.create_enemy("goblin")
+        
+        assert combat_system.use_special_ability(char, enemy) == "Smite!"
+        assert enemy['health'] == 43
+        assert len(combat_system.new_cooldown_state()) == slots_before + 1
+    finally:
+        combat_system.unregister_ability("Paladin")
+    
+    # Nothing leaks into later battles
+    assert "Paladin" not in combat_system.ABILITY_REGISTRY
+    assert len(combat_system.new_cooldown_state()) == slots_before
+
+def test_group_battle_party_vs_horde():
+    """Test that a party can fight several enemies and split the rewards"""
+    party = [character_manager.create_character("Tank", "Warrior"),
+             character_manager.create_character("Caster", "Mage")]
+    enemies = [combat_system.create_enemy("goblin") for _ in range(3)]
+    
+    battle = combat_system.GroupBattle(party, enemies, seed=11, party_policy="weakest")
+    result = battle.start_battle()
+    
+    assert result['winner'] == 'party'
+    assert all(enemy['health'] == 0 for enemy in enemies)
+    survivors = [c for c in party if c['health'] > 0]
+    assert result['xp_gained'] == 75 // len(survivors)
+    assert all(c['experience'] == result['xp_gained'] for c in survivors)
+
+def test_group_battle_rejects_oversized_party():
+    """Test that parties larger than MAX_PARTY_SIZE are refused"""
+    from custom_exceptions import CombatError
+    party = [character_manager.create_character(f"P{i}", "Rogue")
+             for i in range(combat_system.MAX_PARTY_SIZE + 1)]
+    
+    with pytest.raises(CombatError):
+        combat_system.GroupBattle(party, [combat_system.create_enemy("orc")])
+
+def test_balance_sweep_recomputes_only_changed_enemy(tmp_path, monkeypatch):
+    """Test that the sweep cache only recomputes cells whose enemy changed"""
+    import balance_sweep
+    cache_file = str(tmp_path / "cache.json")
+    grid = (["Warrior", "Mage"], [1, 2], ["goblin", "orc"], [0, 5])
+    
+    rows, stats = balance_sweep.run_sweep(*grid, simulations=5, workers=1, cache_file=cache_file)
+    assert len(rows) == 16
+    assert stats == {'computed': 16, 'cached': 0}
+    assert all(0.0 <= row['win_rate'] <= 1.0 for row in rows)
+    
+    # Buff goblins: only the 8 goblin cells need new simulations
+    goblin = dict(combat_system.ENEMY_TYPES["goblin"], strength=30)
+    monkeypatch.setitem(combat_system.ENEMY_TYPES, "goblin", goblin)
+    
+    rows, stats = balance_sweep.run_sweep(*grid, simulations=5, workers=1, cache_file=cache_file)
+    assert stats == {'computed': 8, 'cached': 8}
+    
+    # Ability damage formulas and crit flags are part of the formula hash
+    warrior = combat_system.ABILITY_REGISTRY["Warrior"]
+    formula_hash = balance_sweep.get_formula_hash()
+    monkeypatch.setattr(warrior, "crits", True)
+    assert balance_sweep.get_formula_hash() != formula_hash
+    monkeypatch.setattr(warrior, "crits", False)
+    monkeypatch.setattr(warrior, "damage", lambda character, enemy: (1, 1))
+    assert balance_sweep.get_formula_hash() != formula_hash
+    
+    report = tmp_path / "report.csv"
+    balance_sweep.write_csv_report(rows, str(report))
+    assert report.read_text().startswith("class,level,enemy,gear")
+
+def test_balance_sweep_gear_changes_outcome():
+    """Test that gear still counts after level-ups have cached effective stats"""
+    import balance_sweep
+    dragon = combat_system.create_enemy("dragon")
+    
+    for level in (1, 3):
+        geared = balance_sweep.build_character("Warrior", level, 50)
+        plain = balance_sweep.build_character("Warrior", level, 0)
+        assert inventory_system.get_effective_stats(geared)['strength'] == \
+            inventory_system.get_effective_stats(plain)['strength'] + 50
+    
+    rows = [balance_sweep.simulate_cell("Warrior", 3, dragon, gear, 5, 0) for gear in (0, 50)]
+    assert rows[0]['avg_turns'] > rows[1]['avg_turns']
+    assert rows[0]['avg_health_left'] != rows[1]['avg_health_left']
+
+def test_damage_table_rebuilds_after_stat_change():
+    """Test that precomputed battle damage follows mid-battle stat changes"""
+    char = character_manager.create_character("TableTest", "Warrior")
+    enemy = combat_system.create_enemy("orc")
+    battle = combat_system.SimpleBattle(char, enemy, log=combat_system.BattleLog(), seed=1)
+    
+    basic, special, crit, enemy_basic = battle.get_damage_table()
+    assert basic == combat_system.calculate_damage(char, enemy)
+    assert special == crit == char['strength'] * 2
+    assert enemy_basic == combat_system.calculate_damage(enemy, char)
+    
+    # Drinking a strength elixir mid-battle must refresh the table
+    inventory_system.add_item_to_inventory(char, "strength_elixir")
+    inventory_system.use_item(char, "strength_elixir", {'type': 'consumable', 'effect': 'strength:3'})
+    assert battle.get_damage_table()[0] == basic + 3
+
+def test_enemy_ai_policies():
+    """Test enemy AI policies: healing when low, focusing, and the expectimax budget"""
+    from custom_exceptions import InvalidTargetError
+    char = character_manager.create_character("AITest", "Rogue")
+    enemy = combat_system.create_enemy("orc")
+    battle = combat_system.SimpleBattle(char, enemy, log=combat_system.BattleLog(), seed=3,
+                                        enemy_ai="heal_when_low")
+    
+    enemy['health'] = 10
+    battle.combat_active = True
+    battle.enemy_turn()
+    assert enemy['health'] == 10 + combat_system.enemy_heal_amount(enemy)
+    assert battle.enemy_heals_left == combat_system.ENEMY_MAX_HEALS - 1
+    
+    # Out of heals: the enemy must attack
+    battle.enemy_heals_left = 0
+    battle.enemy_turn()
+    assert char['health'] < char['max_health']
+    
+    party = [character_manager.create_character("Full", "Warrior"),
+             character_manager.create_character("Hurt", "Mage")]
+    party[1]['health'] = 5
+    focus = combat_system.get_enemy_ai("focus_weakest")
+    assert focus.decide(battle, enemy, party, 0) == ("attack", party[1])
+    
+    # Expectimax must stay within its node budget (speed is measured in benchmarks/)
+    search = combat_system.ExpectimaxAI(node_budget=50)
+    char['health'] = char['max_health']
+    action, target = search.decide(battle, enemy, [char], 2)
+    assert search.nodes <= 51
+    assert action in ("attack", "heal")
+    
+    # Party members that compare equal still use their own cooldowns
+    twins = [character_manager.create_character("Twin", "Warrior") for _ in range(2)]
+    group = combat_system.GroupBattle(twins, [combat_system.create_enemy("orc")],
+                                      log=combat_system.BattleLog(), seed=1)
+    group.cooldowns[1][0] = 5
+    enemy['health'] = 10
+    model = search.build_model(group, enemy, twins[1], 1)
+    assert model['cooldown_left'] == 5 - (group.turn_counter + 1)
+    assert search.build_model(group, enemy, twins[0], 0)['cooldown_left'] == 0
+    
+    with pytest.raises(InvalidTargetError):
+        combat_system.get_enemy_ai("berserk")
+
+def test_replay_restores_enemy_ai():
+    """Test that a recorded battle replays with the enemy AI it was fought with"""
+    char = character_manager.create_character("AIReplay", "Rogue")
+    enemy = combat_system.create_enemy("orc")
+    ai = combat_system.ExpectimaxAI(depth=2, node_budget=40)
+    battle = combat_system.SimpleBattle(char, enemy, log=combat_system.BattleLog(), seed=11,
+                                        action_provider=combat_system.auto_player_action,
+                                        record=True, enemy_ai=ai)
+    battle.start_battle()
+    
+    assert battle.replay['enemy_ai'] == {'policy': 'expectimax', 'target_policy': 'weakest',
+                                         'node_budget': 40, 'depth': 2}
+    assert combat_system.replay_battle(battle.replay)['ok']
+    
+    # Without the policy the enemy never heals, so the replay must notice
+    assert any(event[2] == "heal" for event in battle.log.events())
+    battle.replay['enemy_ai'] = None
+    assert not combat_system.replay_battle(battle.replay)['ok']
+    
+    # Time-budgeted searches depend on machine speed and cannot be recorded
+    with pytest.raises(ValueError):
+        combat_system.SimpleBattle(char, enemy, log=combat_system.BattleLog(), seed=11,
+                                   record=True, enemy_ai=combat_system.ExpectimaxAI(time_budget=0.01))
+
+def test_combat_profiler_merges_threads():
+    """Test that profiled battles on several threads are merged and exported"""
+    import threading
+    import combat_profiler
+    profiler = combat_profiler.CombatProfiler()
+    
+    def fight(seed):
+        char = character_manager.create_character("Prof", "Warrior")
+        battle = combat_system.SimpleBattle(char, combat_system.create_enemy("goblin"),
+                                            log=combat_system.BattleLog(), seed=seed,
+                                            action_provider=combat_system.auto_player_action,
+                                            profiler=profiler)
+        battle.start_battle()
+    
+    threads = [threading.Thread(target=fight, args=(seed,)) for seed in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    summary = profiler.summary()
+    assert summary['battles'] == 4
+    assert len(profiler.shards) == 4
+    phases = summary['phases']
+    assert phases['check_battle_end']['calls'] == phases['player_turn']['calls'] + phases['enemy_turn']['calls']
+    assert sum(count for key, count in summary['actions'].items()
+               if key.startswith("player:")) == phases['player_turn']['calls']
+    assert 'combat_battles_total 4' in profiler.to_prometheus()
+    
+    # A killing blow counts as the attack, never as a 'defeated' action
+    profiler.reset()
+    char = character_manager.create_character("Doomed", "Mage")
+    char['health'] = 1
+    battle = combat_system.SimpleBattle(char, combat_system.create_enemy("orc"),
+                                        log=combat_system.BattleLog(), seed=0,
+                                        action_provider=lambda b: '1', profiler=profiler)
+    assert battle.start_battle()['winner'] == 'enemy'
+    assert profiler.summary()['actions'] == {'player:attack': 1, 'enemy:attack': 1}
+
 # ============================================================================
 # DATA LOADING INTEGRATION TESTS
 # ============================================================================